@@ -7,7 +7,9 @@ from fastapi import FastAPI
 from .config import AuditConfig, configure, get_storage
 from .context import set_audit_action, set_audit_extra, set_audit_resource
 from .middleware import AuditMiddleware
+from .resilience import CircuitBreakerPolicy, RetryPolicy
 from .routes import add_audit_log_routes
+from .sampling import SamplingPolicy
 
 
 def create_audit_lifespan(config: AuditConfig) -> Callable[[FastAPI], Any]:
@@ -32,6 +34,9 @@ __all__ = [
     "configure",
     "get_storage",
     "AuditMiddleware",
+    "SamplingPolicy",
+    "RetryPolicy",
+    "CircuitBreakerPolicy",
     "create_audit_lifespan",
     "set_audit_action",
     "set_audit_resource",
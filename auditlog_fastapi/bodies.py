@@ -0,0 +1,173 @@
+import asyncio
+from collections.abc import Iterable
+from concurrent.futures import Executor
+from typing import Any
+
+from .codec import JSONCodec, get_codec
+from .filters import Masker
+from .models import EntryLike
+
+_TEXTUAL_CONTENT_TYPES = (
+    "application/json",
+    "application/x-www-form-urlencoded",
+    "application/xml",
+    "application/graphql",
+)
+
+
+def is_textual(content_type: str) -> bool:
+    """Whether a body of this content type is worth decoding for the audit log."""
+    media_type = content_type.partition(";")[0].strip().lower()
+    return (
+        not media_type
+        or media_type.startswith("text/")
+        or media_type.endswith(("+json", "+xml"))
+        or media_type in _TEXTUAL_CONTENT_TYPES
+    )
+
+
+class CapturedBody:
+    """
+    Raw body bytes captured by the middleware, not yet decoded or masked.
+
+    Stored on `AuditEntry.request_body`/`response_body` when body processing is
+    deferred; the writer turns it into the final value with `render()` before
+    the entry reaches the storage backend.
+    """
+
+    __slots__ = ("data", "size", "content_type", "masker", "codec")
+
+    def __init__(
+        self,
+        data: bytes | bytearray | None,
+        size: int,
+        content_type: str = "",
+        masker: Masker | None = None,
+        codec: JSONCodec | None = None,
+    ):
+        self.data = data
+        self.size = size
+        self.content_type = content_type
+        self.masker = masker
+        self.codec = codec
+
+    def render(self) -> Any:
+        """Decode and mask the body."""
+        return render_body(
+            self.data, self.size, self.content_type, self.masker, self.codec
+        )
+
+
+def render_body(
+    data: bytes | bytearray | None,
+    size: int,
+    content_type: str = "",
+    masker: Masker | None = None,
+    codec: JSONCodec | None = None,
+) -> Any:
+    """
+    Turn captured body bytes into the value stored on the entry.
+    Module-level so it can run in a process pool.
+    """
+    if not size:
+        return None
+    if not is_textual(content_type):
+        return f"<Binary: {size} bytes>"
+    if data is None:
+        return f"<Truncated: {size} bytes>"
+    try:
+        value = (codec or get_codec()).loads(data)
+    except ValueError:
+        value = data.decode(errors="replace")
+    return masker.mask(value) if masker is not None and value else value
+
+
+class BodyCapture:
+    """
+    Keeps a bounded copy of a body that is streamed in chunks.
+
+    At most `limit` bytes are buffered. Once the body grows past the limit the
+    buffer is released and only the total size is counted. Bodies that are
+    announced as larger than the limit (Content-Length) or as non-textual
+    (multipart, binary) are never buffered at all.
+    """
+
+    __slots__ = ("limit", "size", "content_type", "_buffer")
+
+    def __init__(self, limit: int, content_type: str = "", oversized: bool = False):
+        self.limit = limit
+        self.size = 0
+        self.content_type = content_type
+        self._buffer: bytearray | None = (
+            None if oversized or not is_textual(content_type) else bytearray()
+        )
+
+    @classmethod
+    def from_headers(
+        cls, headers: Iterable[tuple[bytes, bytes]], limit: int
+    ) -> "BodyCapture":
+        """Build a capture using the Content-Type/Content-Length hints."""
+        content_type = ""
+        content_length = 0
+        for key, value in headers:
+            if key == b"content-type":
+                content_type = value.decode("latin-1")
+            elif key == b"content-length" and value.isdigit():
+                content_length = int(value)
+        return cls(limit, content_type, oversized=content_length > limit)
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self._buffer is None:
+            return
+        if self.size > self.limit:
+            self._buffer = None
+        else:
+            self._buffer += chunk
+
+    def freeze(
+        self, masker: Masker | None = None, codec: JSONCodec | None = None
+    ) -> CapturedBody | None:
+        """The raw captured body, once it is complete. None if it was empty."""
+        if not self.size:
+            return None
+        return CapturedBody(self._buffer, self.size, self.content_type, masker, codec)
+
+
+async def prepare_bodies(
+    entries: Iterable[EntryLike],
+    offload_threshold: int | None = None,
+    executor: Executor | None = None,
+) -> None:
+    """
+    Render any deferred `CapturedBody` left on the entries, in place.
+
+    Bodies larger than `offload_threshold` bytes are rendered in `executor`
+    (the loop's default thread pool when None) so a big payload never stalls
+    the event loop; smaller ones are rendered inline.
+    """
+    loop = asyncio.get_running_loop()
+    for entry in entries:
+        for field in ("request_body", "response_body"):
+            body = getattr(entry, field)
+            if not isinstance(body, CapturedBody):
+                continue
+            if (
+                offload_threshold is not None
+                and body.data is not None
+                and len(body.data) > offload_threshold
+            ):
+                value = await loop.run_in_executor(
+                    executor,
+                    render_body,
+                    body.data,
+                    body.size,
+                    body.content_type,
+                    body.masker,
+                    body.codec,
+                )
+            else:
+                value = body.render()
+            setattr(entry, field, value or None)
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable, Iterator
+from typing import Any, Generic, TypeVar
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    Bounded in-memory cache with per-entry expiry and LRU eviction.
+
+    Keeps `hits`/`misses` counters so callers can report cache efficiency.
+    Not thread-safe; intended for use from a single event loop.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> V | None:
+        """Return the cached value or None if missing or expired."""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: V) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        """Keys currently held, including expired ones not yet evicted."""
+        return iter(list(self._data))
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+class SingleFlightCache(Generic[V]):
+    """
+    Async read-through front for a `TTLCache`.
+
+    Concurrent misses for the same key share one load ("single flight")
+    instead of each running it. `invalidate()` drops keys and detaches loads
+    in flight for them, so a value read before a write is never cached after
+    it.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 5.0):
+        self.cache: TTLCache[V] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.coalesced = 0
+        self.invalidations = 0
+        self._inflight: dict[Hashable, asyncio.Task[V]] = {}
+
+    async def get(self, key: Hashable, load: Callable[[], Awaitable[V]]) -> V:
+        """Return the cached value for `key`, calling `load()` on a miss."""
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, load))
+            task.add_done_callback(_retrieve_exception)
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        # A cancelled caller must not cancel the load the others wait on
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, load: Callable[[], Awaitable[V]]) -> V:
+        task = asyncio.current_task()
+        try:
+            value = await load()
+        finally:
+            detached = self._inflight.get(key) is not task
+            if not detached:
+                del self._inflight[key]
+        if not detached:
+            self.cache.set(key, value)
+        return value
+
+    def invalidate(self, predicate: Callable[[Any], bool]) -> int:
+        """Drop every key for which `predicate(key)` is true; return the count."""
+        dropped = 0
+        for key in [key for key in self.cache if predicate(key)]:
+            self.cache.pop(key)
+            dropped += 1
+        for key in [key for key in self._inflight if predicate(key)]:
+            del self._inflight[key]
+        self.invalidations += dropped
+        return dropped
+
+    def clear(self) -> None:
+        self.cache.clear()
+        self._inflight.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            **self.cache.stats(),
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+        }
+
+
+def _retrieve_exception(task: "asyncio.Task[Any]") -> None:
+    # Marks a failed load's exception as retrieved when no caller is left
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,131 @@
+import json
+import warnings
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from functools import cache
+from typing import Any, Literal
+from uuid import UUID
+
+JSONCodecName = Literal["auto", "stdlib", "orjson", "msgspec"]
+
+
+def _default(obj: Any) -> Any:
+    """Fallback encoder for values the JSON libraries don't handle natively."""
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, datetime | date | time):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, bytes | bytearray):
+        return obj.decode(errors="replace")
+    if isinstance(obj, set | frozenset | tuple):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONCodec:
+    """
+    JSON encoder/decoder used by the storage backends and the middleware.
+
+    The base implementation uses the stdlib `json` module with a fallback for
+    UUID, datetime, Decimal and similar values.
+    """
+
+    name = "stdlib"
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj, default=_default)
+
+    def dumpb(self, obj: Any) -> bytes:
+        return JSONCodec.dumps(self, obj).encode()
+
+    def loads(self, data: str | bytes | bytearray) -> Any:
+        return json.loads(data)
+
+    def __reduce__(self) -> tuple[Any, tuple[str]]:
+        # Rebuild from the registry so codecs can be sent to worker processes
+        return get_codec, (self.name,)
+
+
+class OrjsonCodec(JSONCodec):
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson
+
+        self._orjson = orjson
+        self._option = orjson.OPT_NON_STR_KEYS
+
+    def dumpb(self, obj: Any) -> bytes:
+        try:
+            return self._orjson.dumps(obj, default=_default, option=self._option)
+        except TypeError:
+            # e.g. integers wider than 64 bits
+            return super().dumpb(obj)
+
+    def dumps(self, obj: Any) -> str:
+        return self.dumpb(obj).decode()
+
+    def loads(self, data: str | bytes | bytearray) -> Any:
+        return self._orjson.loads(data)
+
+
+class MsgspecCodec(JSONCodec):
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        import msgspec
+
+        self._encoder = msgspec.json.Encoder(enc_hook=_default)
+        self._decoder = msgspec.json.Decoder()
+
+    def dumpb(self, obj: Any) -> bytes:
+        try:
+            return self._encoder.encode(obj)
+        except (TypeError, OverflowError):
+            return super().dumpb(obj)
+
+    def dumps(self, obj: Any) -> str:
+        return self.dumpb(obj).decode()
+
+    def loads(self, data: str | bytes | bytearray) -> Any:
+        return self._decoder.decode(data)
+
+
+_CODECS: dict[str, type[JSONCodec]] = {
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+    "stdlib": JSONCodec,
+}
+
+
+@cache
+def get_codec(name: str = "auto") -> JSONCodec:
+    """
+    Return the JSON codec with the given name.
+    "auto" picks the fastest installed library (orjson, then msgspec, then
+    stdlib). A named library that is not installed falls back to stdlib with a
+    warning.
+    """
+    if name == "auto":
+        for candidate in ("orjson", "msgspec"):
+            try:
+                return _CODECS[candidate]()
+            except ImportError:
+                continue
+        return JSONCodec()
+
+    if name not in _CODECS:
+        raise ValueError(f"Unknown JSON codec: {name!r}")
+    try:
+        return _CODECS[name]()
+    except ImportError:
+        warnings.warn(
+            f"JSON codec {name!r} is not installed, falling back to stdlib json",
+            stacklevel=2,
+        )
+        return JSONCodec()
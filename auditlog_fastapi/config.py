@@ -3,7 +3,13 @@ from typing import TYPE_CHECKING, Any, Literal
 
 from pydantic import BaseModel, ConfigDict, Field
 
+from .codec import JSONCodecName
 from .exceptions import AuditAlreadyConfiguredError, AuditNotConfiguredError
+from .ids import IDStrategy
+from .partitions import PartitionInterval
+from .resilience import CircuitBreakerPolicy, RetryPolicy
+from .sampling import SamplingPolicy
+from .spool import FsyncPolicy
 
 if TYPE_CHECKING:
     from .storage.base import AuditStorage
@@ -29,15 +35,71 @@ class AuditConfig(BaseModel):
     sqlalchemy_echo: bool = False
     expose_metadata: bool = False  # if True, exposes Base.metadata for Alembic
 
+    # asyncpg-specific
+    asyncpg_min_pool_size: int = 2
+    asyncpg_max_pool_size: int = 10
+    asyncpg_statement_cache_size: int = 100  # prepared statements per connection
+    # Batches of at least this many entries are written with binary COPY
+    # through a staging table; None always uses executemany
+    asyncpg_copy_min_batch: int | None = 100
+
+    # PostgreSQL time-range partitioning (asyncpg, and SQLAlchemy on PostgreSQL).
+    # None keeps a single table; only applies when the table is created
+    partition_interval: PartitionInterval | None = None
+    partition_premake: int = 3  # future partitions created ahead of time
+    partition_maintenance_interval: float = 3600.0  # seconds between runs
+
+    # Retention: entries older than retention_days are purged every
+    # retention_interval seconds in chunks of retention_batch_size rows
+    # (a TTL index on Beanie). Partitioned tables also drop whole partitions.
+    # None keeps everything; purge_older_than() can still be called directly
+    retention_days: int | None = None
+    retention_interval: float | None = 3600.0  # None disables the scheduled purge
+    retention_batch_size: int = 5000
+
+    # Hourly rollups (entries per route template, method and status class)
+    # kept up to date by the writer in a "<table_name>_rollups" table and
+    # read by aggregate() when they cover the query. Not for Tortoise
+    rollups: bool = False
+
     # Tortoise-specific
     tortoise_modules: dict[str, list[str]] | None = None
 
     # MongoDB / Beanie-specific
     mongodb_database: str = "audit"
 
+    # Primary key generation for entries built by the middleware. "uuid7" ids
+    # are time-ordered, keeping inserts at the right edge of the primary key
+    # index, and let reads order by id alone
+    id_strategy: IDStrategy = "uuid4"
+
+    # JSON codec used by every backend and the middleware ("auto" picks
+    # orjson, then msgspec, then the stdlib)
+    json_codec: JSONCodecName = "auto"
+
     # Batching (for all backends)
     batch_size: int = 1  # set > 1 to enable batch inserts
     batch_flush_interval: float = 5.0  # seconds, used if batch_size > 1
+    batch_max_queue_size: int = 10_000  # pending entries before writes are rejected
+
+    # On-disk spool for entries the database rejects or the queue cannot hold
+    # (None disables it); replayed through save_batch() on recovery
+    spool_dir: str | None = None
+    spool_max_bytes: int = 1 << 30  # disk budget; further entries are reported lost
+    spool_segment_bytes: int = 16 << 20
+    spool_fsync: FsyncPolicy = "interval"
+    spool_fsync_interval: float = 1.0  # seconds, used with spool_fsync="interval"
+
+    # Retries and circuit breaker around storage writes (None disables them)
+    retry: RetryPolicy | None = None
+    circuit_breaker: CircuitBreakerPolicy | None = None
+
+    # Deferred body processing (AuditMiddleware(defer_body_processing=True))
+    body_offload_threshold: int | None = 64_000  # bytes; larger bodies leave the loop
+    body_offload_executor: Literal["thread", "process"] = "thread"
+
+    # Sampling (None stores every non-skipped request)
+    sampling: SamplingPolicy | None = None
 
     # PII masking
     mask_fields: list[str] = Field(default_factory=list)
@@ -1,33 +1,36 @@
 from contextvars import ContextVar
 from typing import Any
 
-from .models import AuditEntry
+from .models import AuditEntry, AuditRecord
 
-_current_entry: ContextVar[AuditEntry | None] = ContextVar("audit_entry", default=None)
+_current_entry: ContextVar[AuditRecord | None] = ContextVar("audit_entry", default=None)
 
 
 def get_current_audit_entry() -> AuditEntry | None:
-    """Returns the current audit entry from the context."""
-    return _current_entry.get()
+    """
+    Returns the current audit entry from the context.
+    Changes to its user, action, resource and extra fields are recorded.
+    """
+    record = _current_entry.get()
+    return record.view() if record is not None else None
 
 
 def set_audit_action(action: str) -> None:
     """Sets the action field on the current audit entry."""
-    entry = get_current_audit_entry()
-    if entry:
-        entry.action = action
+    record = _current_entry.get()
+    if record:
+        record.annotate(action=action)
 
 
 def set_audit_resource(resource_type: str, resource_id: str) -> None:
     """Sets resource_type and resource_id fields on the current audit entry."""
-    entry = get_current_audit_entry()
-    if entry:
-        entry.resource_type = resource_type
-        entry.resource_id = resource_id
+    record = _current_entry.get()
+    if record:
+        record.annotate(resource_type=resource_type, resource_id=resource_id)
 
 
 def set_audit_extra(key: str, value: Any) -> None:
     """Adds a key-value pair to the extra field of the current audit entry."""
-    entry = get_current_audit_entry()
-    if entry:
-        entry.extra[key] = value
+    record = _current_entry.get()
+    if record:
+        record.extra[key] = value
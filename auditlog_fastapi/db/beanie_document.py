@@ -1,9 +1,44 @@
 import uuid
 from datetime import datetime
+from functools import lru_cache
 from typing import Any
 
 from beanie import Document
-from pydantic import Field
+from pydantic import BaseModel, Field, create_model
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+# Compound indexes for the common filters, each followed by timestamp so
+# filtered reads come out in time order
+_FILTER_INDEXES = [
+    ("user_id",),
+    ("path",),
+    ("status_code",),
+    ("action",),
+    ("resource_type", "resource_id"),
+]
+
+
+def audit_indexes(ttl_seconds: int | None = None) -> list[Any]:
+    """
+    Index definitions for the audit collection. With `ttl_seconds` the
+    timestamp index is a TTL index and MongoDB removes expired documents.
+    """
+    timestamp: Any = "timestamp"
+    if ttl_seconds is not None:
+        timestamp = IndexModel(
+            [("timestamp", ASCENDING)],
+            name="timestamp_1",
+            expireAfterSeconds=ttl_seconds,
+        )
+    # Serves the (timestamp, _id) sort and keyset pagination
+    sort_key = IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)])
+    filters = [
+        IndexModel(
+            [*((field, ASCENDING) for field in fields), ("timestamp", DESCENDING)]
+        )
+        for fields in _FILTER_INDEXES
+    ]
+    return [timestamp, sort_key, *filters]
 
 
 class AuditLogDocument(Document):
@@ -32,12 +67,20 @@ class AuditLogDocument(Document):
         """Settings for Beanie Document, with collection name set dynamically at runtime."""  # noqa: E501
 
         name = "audit_logs"  # overridden by config at runtime
-        indexes = [
-            "timestamp",
-            "user_id",
-            "path",
-            "status_code",
-            "action",
-            "resource_type",
-            "resource_id",
-        ]
+        indexes = audit_indexes()  # replaced at startup when retention is set
+
+
+@lru_cache(maxsize=64)
+def projection_model(fields: tuple[str, ...]) -> type[BaseModel]:
+    """
+    Model reading only `fields` of an audit document; passed to Beanie's
+    `.project()`, which turns its fields into a MongoDB projection.
+    """
+    definitions: dict[str, Any] = {}
+    for name in fields:
+        annotation = AuditLogDocument.model_fields[name].annotation
+        if name == "id":
+            definitions[name] = (annotation, Field(alias="_id"))
+        else:
+            definitions[name] = (annotation | None, None)
+    return create_model("AuditLogProjection", **definitions)
@@ -1,23 +1,64 @@
 import uuid
+from collections.abc import Sequence
 from datetime import datetime
 from typing import Any
 
-from sqlalchemy import DateTime, Float, Index, Integer, String, Text
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Delete,
+    Float,
+    Index,
+    Insert,
+    Integer,
+    MetaData,
+    Select,
+    SmallInteger,
+    String,
+    Table,
+    Text,
+    case,
+    delete,
+    func,
+    insert,
+    literal_column,
+    select,
+    tuple_,
+)
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
+from ..query import EQUALITY_FILTERS, AuditFilters, prefix_upper_bound
+from ..rollups import (
+    COUNTER_COLUMNS,
+    HISTOGRAM_COLUMNS,
+    MAX_ROUTE_LENGTH,
+    ROLLUP_KEY,
+    rollup_table_name,
+)
+from ..stats import BUCKET_FORMATS, PERCENTILES, GroupBy, StatsRow, TimeBucket
+
 
 class AuditBase(DeclarativeBase):
     pass
 
 
-def make_audit_table(table_name: str, use_jsonb: bool = False) -> type[AuditBase]:
+def make_audit_table(
+    table_name: str, use_jsonb: bool = False, partitioned: bool = False
+) -> type[AuditBase]:
     """
     Dynamically create the ORM model class with the given table name.
     use_jsonb=True for PostgreSQL (JSONB), False for MySQL/SQLite
     (TEXT + JSON serialization).
+    partitioned=True (PostgreSQL only) declares the table
+    PARTITION BY RANGE (timestamp) with primary key (id, timestamp).
     """
+    options: dict[str, Any] = {"extend_existing": True}
+    if partitioned:
+        options["postgresql_partition_by"] = "RANGE (timestamp)"
     # Use a unique class name to avoid SQLAlchemy warnings about re-defining models
     class_name = f"AuditLog_{uuid.uuid4().hex}"
     suffix = uuid.uuid4().hex[:8]
@@ -25,14 +66,29 @@ def make_audit_table(table_name: str, use_jsonb: bool = False) -> type[AuditBase
     class AuditLog(AuditBase):
         __tablename__ = table_name
         __table_args__ = (
-            Index(f"ix_{table_name}_timestamp_{suffix}", "timestamp"),
-            Index(f"ix_{table_name}_user_id_{suffix}", "user_id"),
-            Index(f"ix_{table_name}_path_{suffix}", "path"),
-            Index(f"ix_{table_name}_status_code_{suffix}", "status_code"),
-            Index(f"ix_{table_name}_action_{suffix}", "action"),
-            Index(f"ix_{table_name}_resource_type_{suffix}", "resource_type"),
-            Index(f"ix_{table_name}_resource_id_{suffix}", "resource_id"),
-            {"extend_existing": True},
+            # Composite indexes for the common filters, each followed by
+            # timestamp so filtered reads come out in time order.
+            # (timestamp, id) serves the default sort and keyset pagination
+            Index(f"ix_{table_name}_timestamp_id_{suffix}", "timestamp", "id"),
+            Index(f"ix_{table_name}_user_id_ts_{suffix}", "user_id", "timestamp"),
+            Index(
+                f"ix_{table_name}_path_ts_{suffix}",
+                "path",
+                "timestamp",
+                # Lets LIKE 'prefix%' use the index on PostgreSQL
+                postgresql_ops={"path": "text_pattern_ops"},
+            ),
+            Index(
+                f"ix_{table_name}_status_code_ts_{suffix}", "status_code", "timestamp"
+            ),
+            Index(f"ix_{table_name}_action_ts_{suffix}", "action", "timestamp"),
+            Index(
+                f"ix_{table_name}_resource_ts_{suffix}",
+                "resource_type",
+                "resource_id",
+                "timestamp",
+            ),
+            options,
         )
 
         id: Mapped[uuid.UUID] = mapped_column(
@@ -41,7 +97,7 @@ def make_audit_table(table_name: str, use_jsonb: bool = False) -> type[AuditBase
             default=uuid.uuid4,
         )
         timestamp: Mapped[datetime] = mapped_column(
-            DateTime(timezone=True), nullable=False
+            DateTime(timezone=True), nullable=False, primary_key=partitioned
         )
         user_id: Mapped[str | None] = mapped_column(String(255), nullable=True)
         username: Mapped[str | None] = mapped_column(String(255), nullable=True)
@@ -72,3 +128,264 @@ def make_audit_table(table_name: str, use_jsonb: bool = False) -> type[AuditBase
     AuditLog.__name__ = class_name
 
     return AuditLog
+
+
+def make_rollup_table(table_name: str, metadata: MetaData) -> Table:
+    """
+    Core table holding the hourly rollups of the audit table `table_name`,
+    keyed by (bucket, route, method, status_class).
+    """
+    return Table(
+        rollup_table_name(table_name),
+        metadata,
+        Column("bucket", DateTime(timezone=True), primary_key=True),
+        Column("route", String(MAX_ROUTE_LENGTH), primary_key=True),
+        Column("method", String(10), primary_key=True),
+        Column("status_class", SmallInteger, primary_key=True, autoincrement=False),
+        Column("requests", BigInteger, nullable=False),
+        Column("duration_sum", Float, nullable=False),
+        *(Column(name, BigInteger, nullable=False) for name in HISTOGRAM_COLUMNS),
+        extend_existing=True,
+    )
+
+
+def idempotent_insert(
+    table: Any, dialect: str, conflict_columns: tuple[str, ...] = ("id",)
+) -> Insert:
+    """
+    INSERT for the audit table that skips rows whose id already exists, so a
+    retried or replayed batch never writes an entry twice.
+    `conflict_columns` is the primary key ("id", plus "timestamp" when the
+    table is partitioned).
+    """
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing(
+            index_elements=list(conflict_columns)
+        )
+    if dialect == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing(
+            index_elements=list(conflict_columns)
+        )
+    if dialect in ("mysql", "mariadb"):
+        return insert(table).prefix_with("IGNORE")
+    return insert(table)
+
+
+def rollup_upsert(table: Table, dialect: str) -> Insert:
+    """
+    INSERT adding the counters to an existing rollup row with the same key, so
+    writers in several processes can update the same rows.
+    """
+    if dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update(
+            {name: table.c[name] + stmt.inserted[name] for name in COUNTER_COLUMNS}
+        )
+    upsert: postgresql.Insert | sqlite.Insert
+    if dialect == "postgresql":
+        upsert = postgresql.insert(table)
+    elif dialect == "sqlite":
+        upsert = sqlite.insert(table)
+    else:
+        raise ValueError(f"Rollups are not supported on {dialect}")
+    return upsert.on_conflict_do_update(
+        index_elements=list(ROLLUP_KEY),
+        set_={name: table.c[name] + upsert.excluded[name] for name in COUNTER_COLUMNS},
+    )
+
+
+def purge_statement(
+    table: Any,
+    dialect: str,
+    cutoff: datetime,
+    batch_size: int,
+    partitioned: bool = False,
+) -> Delete:
+    """
+    DELETE of at most `batch_size` rows with a timestamp before `cutoff`.
+    PostgreSQL deletes by ctid (by primary key on partitioned tables, where
+    ctids repeat across partitions), MySQL uses DELETE ... LIMIT and other
+    dialects delete by id from a limited subquery.
+    """
+    expired = table.timestamp < cutoff
+    if dialect in ("mysql", "mariadb"):
+        return delete(table).where(expired).with_dialect_options(mysql_limit=batch_size)
+    key: Any
+    if dialect == "postgresql":
+        key = (
+            tuple_(table.id, table.timestamp) if partitioned else literal_column("ctid")
+        )
+    else:
+        key = table.id
+    return delete(table).where(key.in_(select(key).where(expired).limit(batch_size)))
+
+
+def filter_conditions(table: Any, filters: AuditFilters, dialect: str) -> list[Any]:
+    """
+    WHERE conditions for `filters` on the audit table (or SQLModel class).
+    Every condition is sargable, so the composite indexes serve them.
+    """
+    conditions = [
+        getattr(table, name) == getattr(filters, name)
+        for name in EQUALITY_FILTERS
+        if getattr(filters, name) is not None
+    ]
+    if filters.path_prefix:
+        if dialect == "sqlite":
+            # SQLite's LIKE is case-insensitive and never uses the index
+            conditions.append(table.path >= filters.path_prefix)
+            conditions.append(table.path < prefix_upper_bound(filters.path_prefix))
+        else:
+            conditions.append(
+                table.path.startswith(filters.path_prefix, autoescape=True)
+            )
+    if filters.status_min is not None:
+        conditions.append(table.status_code >= filters.status_min)
+    if filters.status_max is not None:
+        conditions.append(table.status_code <= filters.status_max)
+    if filters.since is not None:
+        conditions.append(table.timestamp >= filters.since)
+    if filters.until is not None:
+        conditions.append(table.timestamp < filters.until)
+    return conditions
+
+
+def time_bucket(column: Any, bucket: TimeBucket, dialect: str) -> Any:
+    """Expression truncating a timestamp column to the start of its UTC bucket."""
+    if dialect == "postgresql":
+        return func.date_trunc(bucket, func.timezone("UTC", column))
+    if dialect in ("mysql", "mariadb"):
+        # MySQL spells minutes %i (%M is the month name)
+        return func.date_format(column, BUCKET_FORMATS[bucket].replace("%M", "%i"))
+    return func.strftime(BUCKET_FORMATS[bucket], column)
+
+
+def aggregate_statements(
+    table: Any,
+    filters: AuditFilters,
+    group_by: Sequence[GroupBy],
+    bucket: TimeBucket | None,
+    error_status: int,
+    dialect: str,
+) -> tuple[Select[Any], Select[Any] | None]:
+    """
+    GROUP BY query for `AuditStorage.aggregate()`. Its rows are the group keys
+    (bucket first), then count, errors, avg and, on PostgreSQL, the
+    percentile_cont values. Other dialects have no percentile aggregate: the
+    second statement computes nearest-rank percentiles per group with window
+    functions, as the group keys followed by one value per percentile.
+    """
+    keys = [getattr(table, field) for field in group_by]
+    if bucket is not None:
+        keys.insert(0, time_bucket(table.timestamp, bucket, dialect))
+    conditions = filter_conditions(table, filters, dialect)
+
+    measures: list[Any] = [
+        func.count(),
+        func.sum(case((table.status_code >= error_status, 1), else_=0)),
+        func.avg(table.duration_ms),
+    ]
+    if dialect == "postgresql":
+        measures += [
+            func.percentile_cont(fraction).within_group(table.duration_ms)
+            for fraction in PERCENTILES
+        ]
+    stmt = select(*keys, *measures).where(*conditions).group_by(*keys)
+    if dialect == "postgresql":
+        return stmt, None
+
+    ranked = (
+        select(
+            *(key.label(f"k{i}") for i, key in enumerate(keys)),
+            table.duration_ms.label("duration"),
+            func.row_number()
+            .over(partition_by=keys or None, order_by=table.duration_ms)
+            .label("rank"),
+            func.count(table.duration_ms)
+            .over(partition_by=keys or None)
+            .label("total"),
+        )
+        .where(*conditions, table.duration_ms.is_not(None))
+        .subquery()
+    )
+    ranked_keys = [ranked.c[f"k{i}"] for i in range(len(keys))]
+    percentiles = select(
+        *ranked_keys,
+        *(
+            # Smallest duration whose rank reaches fraction * total
+            func.min(
+                case((ranked.c.rank >= fraction * ranked.c.total, ranked.c.duration))
+            )
+            for fraction in PERCENTILES
+        ),
+    ).group_by(*ranked_keys)
+    return stmt, percentiles
+
+
+def stats_rows(
+    rows: Sequence[Any],
+    percentile_rows: Sequence[Any] | None,
+    group_by: Sequence[GroupBy],
+    bucket: TimeBucket | None,
+) -> list[StatsRow]:
+    """Turn the results of `aggregate_statements()` into `StatsRow`s."""
+    width = len(group_by) + (bucket is not None)
+    percentiles = {
+        tuple(row[:width]): tuple(row[width:]) for row in percentile_rows or ()
+    }
+    result = []
+    for row in rows:
+        key = tuple(row[:width])
+        values = key[1:] if bucket is not None else key
+        count, errors, avg, *cont = row[width:]
+        result.append(
+            StatsRow.build(
+                key[0] if bucket is not None else None,
+                dict(zip(group_by, values, strict=True)),
+                count,
+                errors,
+                avg,
+                cont or percentiles.get(key, (None, None, None)),
+            )
+        )
+    return result
+
+
+def rollup_statement(
+    table: Table,
+    filters: AuditFilters,
+    group_by: Sequence[GroupBy],
+    bucket: TimeBucket | None,
+    error_status: int,
+    dialect: str,
+) -> Select[Any]:
+    """
+    Query summing the rollups for a covered `aggregate()` call; its rows are
+    what `rollup_stats_rows()` expects.
+    """
+    keys = [table.c[field] for field in group_by]
+    if bucket is not None:
+        keys.insert(0, time_bucket(table.c.bucket, bucket, dialect))
+    conditions = []
+    if filters.method is not None:
+        conditions.append(table.c.method == filters.method)
+    if filters.since is not None:
+        conditions.append(table.c.bucket >= filters.since)
+    if filters.until is not None:
+        conditions.append(table.c.bucket < filters.until)
+    return (
+        select(
+            *keys,
+            func.sum(table.c.requests),
+            func.sum(
+                case(
+                    (table.c.status_class >= error_status // 100, table.c.requests),
+                    else_=0,
+                )
+            ),
+            func.sum(table.c.duration_sum),
+            *(func.sum(table.c[name]) for name in HISTOGRAM_COLUMNS),
+        )
+        .where(*conditions)
+        .group_by(*keys)
+    )
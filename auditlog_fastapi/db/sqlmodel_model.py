@@ -1,6 +1,7 @@
 import uuid
 from datetime import datetime
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
@@ -11,22 +12,42 @@ def make_sqlmodel_table(table_name: str) -> type[SQLModel]:
         """SQLModel ORM model for audit logs, with dynamic table name set at runtime."""  # noqa: E501
 
         __tablename__ = table_name
+        # Composite indexes for the common filters, each followed by
+        # timestamp. (timestamp, id) serves the sort and keyset pagination
+        __table_args__ = (
+            Index(f"ix_{table_name}_timestamp_id", "timestamp", "id"),
+            Index(f"ix_{table_name}_user_id_ts", "user_id", "timestamp"),
+            Index(
+                f"ix_{table_name}_path_ts",
+                "path",
+                "timestamp",
+                postgresql_ops={"path": "text_pattern_ops"},
+            ),
+            Index(f"ix_{table_name}_status_code_ts", "status_code", "timestamp"),
+            Index(f"ix_{table_name}_action_ts", "action", "timestamp"),
+            Index(
+                f"ix_{table_name}_resource_ts",
+                "resource_type",
+                "resource_id",
+                "timestamp",
+            ),
+        )
         id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
         timestamp: datetime
-        user_id: str | None = Field(default=None, index=True)
+        user_id: str | None = None
         username: str | None = None
         ip_address: str | None = None
         user_agent: str | None = None
         method: str
-        path: str = Field(index=True)
+        path: str
         query_params: str | None = None  # JSON-serialized
-        status_code: int | None = Field(default=None, index=True)
+        status_code: int | None = None
         request_body: str | None = None  # JSON-serialized
         response_body: str | None = None  # JSON-serialized
         duration_ms: float | None = None
-        action: str | None = Field(default=None, index=True)
-        resource_type: str | None = Field(default=None, index=True)
-        resource_id: str | None = Field(default=None, index=True)
+        action: str | None = None
+        resource_type: str | None = None
+        resource_id: str | None = None
         extra: str | None = None  # JSON-serialized
         error: str | None = None
 
@@ -1,35 +1,67 @@
+import itertools
+import sys
+from types import ModuleType
 from typing import Any
 
 from tortoise import fields
 from tortoise.models import Model
 
+from ..codec import JSONCodec, get_codec
 
-def make_tortoise_model(table_name: str) -> type[Model]:
+_runtime_modules = itertools.count()
+
+
+def make_tortoise_model(table_name: str, codec: JSONCodec | None = None) -> type[Model]:
     """Dynamically create the Tortoise ORM model class with the given table name."""
+    codec = codec or get_codec()
+    json_codec: dict[str, Any] = {"encoder": codec.dumps, "decoder": codec.loads}
 
     class AuditLog(Model):
         """Tortoise ORM model for audit logs, with dynamic table name set at runtime."""
 
         id = fields.UUIDField(pk=True)
-        timestamp = fields.DatetimeField(auto_now_add=True, index=True)
-        user_id = fields.CharField(max_length=255, null=True, index=True)
+        timestamp = fields.DatetimeField(auto_now_add=True)
+        user_id = fields.CharField(max_length=255, null=True)
         username = fields.CharField(max_length=255, null=True)
         ip_address = fields.CharField(max_length=45, null=True)
         user_agent = fields.CharField(max_length=512, null=True)
         method = fields.CharField(max_length=10)
-        path = fields.CharField(max_length=2048, index=True)
-        query_params: Any = fields.JSONField(null=True)
-        status_code = fields.IntField(null=True, index=True)
-        request_body: Any = fields.JSONField(null=True)
-        response_body: Any = fields.JSONField(null=True)
+        path = fields.CharField(max_length=2048)
+        query_params: Any = fields.JSONField(null=True, **json_codec)
+        status_code = fields.IntField(null=True)
+        request_body: Any = fields.JSONField(null=True, **json_codec)
+        response_body: Any = fields.JSONField(null=True, **json_codec)
         duration_ms = fields.FloatField(null=True)
-        action = fields.CharField(max_length=255, null=True, index=True)
-        resource_type = fields.CharField(max_length=255, null=True, index=True)
-        resource_id = fields.CharField(max_length=255, null=True, index=True)
-        extra: Any = fields.JSONField(null=True)
+        action = fields.CharField(max_length=255, null=True)
+        resource_type = fields.CharField(max_length=255, null=True)
+        resource_id = fields.CharField(max_length=255, null=True)
+        extra: Any = fields.JSONField(null=True, **json_codec)
         error = fields.TextField(null=True)
 
         class Meta:
             table = table_name
+            # Composite indexes for the common filters, each followed by
+            # timestamp. (timestamp, id) serves the sort and keyset pagination
+            indexes = (
+                ("timestamp", "id"),
+                ("user_id", "timestamp"),
+                ("path", "timestamp"),
+                ("status_code", "timestamp"),
+                ("action", "timestamp"),
+                ("resource_type", "resource_id", "timestamp"),
+            )
 
     return AuditLog
+
+
+def models_module(*models: type[Model]) -> str:
+    """
+    Import path of a module holding `models`, for `Tortoise.init(modules=...)`.
+    Tortoise binds only the models it discovers by importing modules, and the
+    audit model is built at runtime rather than defined at import time.
+    """
+    name = f"{__name__}._runtime{next(_runtime_modules)}"
+    module = ModuleType(name)
+    module.__models__ = list(models)  # type: ignore[attr-defined]
+    sys.modules[name] = module
+    return name
@@ -6,6 +6,22 @@ class StorageError(AuditError):
     """Raised when a storage backend fails to save an entry."""
 
 
+class SpoolFullError(StorageError):
+    """Raised when the on-disk spool has reached its disk budget."""
+
+
+class CircuitOpenError(StorageError):
+    """Raised when a write is short-circuited because the storage is failing."""
+
+
+class RollupError(StorageError):
+    """Reported when the rollup counters of written entries could not be updated."""
+
+
+class InvalidCursorError(AuditError, ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
 class AuditConfigurationError(AuditError):
     """Raised when the audit storage configuration is invalid."""
 
@@ -0,0 +1,90 @@
+import csv
+import io
+from collections.abc import AsyncIterable, AsyncIterator, Callable
+from functools import partial
+from typing import Any, Literal
+
+from .codec import JSONCodec, get_codec
+from .models import ENTRY_FIELDS, AuditEntry
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES: dict[ExportFormat, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Leading characters that make spreadsheets read a cell as a formula
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def ndjson_row(entry: AuditEntry) -> str:
+    return entry.model_dump_json() + "\n"
+
+
+def csv_row(values: list[Any]) -> str:
+    out = io.StringIO()
+    csv.writer(out).writerow(values)
+    return out.getvalue()
+
+
+def csv_cell(value: Any) -> Any:
+    """Quote text a spreadsheet would run as a formula with a leading `'`."""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_entry_row(entry: AuditEntry, codec: JSONCodec | None = None) -> str:
+    """
+    One CSV line in `ENTRY_FIELDS` order; JSON fields are embedded as JSON
+    encoded with `codec`. Cells are neutralized with `csv_cell()`, since paths,
+    user agents and bodies come from clients.
+    """
+    codec = codec or get_codec()
+    data = entry.model_dump(mode="json")
+    return csv_row(
+        [
+            csv_cell(codec.dumps(value) if isinstance(value, dict | list) else value)
+            for value in (data[field] for field in ENTRY_FIELDS)
+        ]
+    )
+
+
+async def export_chunks(
+    entries: AsyncIterable[AuditEntry],
+    fmt: ExportFormat = "ndjson",
+    limit: int | None = None,
+    rows_per_chunk: int = 500,
+    codec: JSONCodec | None = None,
+) -> AsyncIterator[str]:
+    """
+    Encode `entries` as NDJSON or CSV (with a header row), yielding text
+    chunks of `rows_per_chunk` rows so a streaming response sends few, large
+    writes. Memory stays bounded by the chunk size. `codec` encodes the JSON
+    fields of CSV rows. `entries` is closed once the export ends, early or not.
+    """
+    encode: Callable[[AuditEntry], str] = (
+        ndjson_row
+        if fmt == "ndjson"
+        else partial(csv_entry_row, codec=codec or get_codec())
+    )
+    buffer = [csv_row(list(ENTRY_FIELDS))] if fmt == "csv" else []
+    count = 0
+    try:
+        async for entry in entries:
+            if limit is not None and count >= limit:
+                break
+            buffer.append(encode(entry))
+            count += 1
+            if len(buffer) >= rows_per_chunk:
+                yield "".join(buffer)
+                buffer.clear()
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        # Stopping early (limit reached, client gone) must still close the
+        # stream so it releases its server-side cursor and connection
+        aclose = getattr(entries, "aclose", None)
+        if aclose is not None:
+            await aclose()
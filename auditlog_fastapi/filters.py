@@ -1,3 +1,6 @@
+import re
+from collections.abc import Iterable
+from functools import lru_cache
 from typing import Any
 from urllib.parse import parse_qsl, urlencode
 
@@ -14,27 +17,139 @@ DEFAULT_SENSITIVE_FIELDS = [
 
 MASK_VALUE = "***REDACTED***"
 
+# Marks a JSON-path rule that ends at this node of the rule tree. A string
+# (not a sentinel object) so compiled maskers survive pickling to a process pool
+_MATCH = "\0"
 
-def mask_sensitive_fields(data: Any, fields: list[str]) -> Any:
+_PATH_TOKEN = re.compile(r"\[([^\]]*)\]|([^.\[\]]+)")
+
+
+def _parse_path(rule: str) -> list[str]:
+    """Split `user.card.number` / `items[*].cvv` into lowercase segments."""
+    rule = rule.removeprefix("$.")
+    return [
+        (index or name).strip("'\"").lower()
+        for index, name in _PATH_TOKEN.findall(rule)
+    ]
+
+
+class Masker:
     """
-    Recursively walk dicts and lists to mask sensitive fields.
-    Replaces matched field values with `MASK_VALUE`.
-    Also handles URL-encoded strings (query strings).
+    Masks sensitive values in decoded request/response data.
+
+    Built once from a list of rules:
+      - plain names (`password`) match a key at any depth, case-insensitively;
+      - JSON-path rules (`user.card.number`, `items[*].cvv`, `items[0].pin`)
+        match from the top of the document, `*` matching any key or index.
+
+    Masking is copy-on-write: containers with nothing to mask are returned by
+    reference, only the path down to a masked value is copied. Strings that
+    look like query strings with a sensitive key are re-encoded with the value
+    masked.
     """
-    if isinstance(data, dict):
-        masked_dict = {}
+
+    def __init__(self, fields: Iterable[str]):
+        names: set[str] = set()
+        tree: dict[Any, Any] = {}
+        for field in fields:
+            if "." in field or "[" in field:
+                node = tree
+                for segment in _parse_path(field):
+                    node = node.setdefault(segment, {})
+                node[_MATCH] = True
+            else:
+                names.add(field.lower())
+
+        self._names = frozenset(names)
+        self._roots: tuple[dict[Any, Any], ...] = (tree,) if tree else ()
+        self._query_hint = (
+            re.compile(
+                r"(?:^|[&;])(?:"
+                + "|".join(re.escape(name) for name in sorted(names))
+                + r")=",
+                re.IGNORECASE,
+            )
+            if names
+            else None
+        )
+
+    def mask(self, data: Any) -> Any:
+        """Return `data` with sensitive values replaced by `MASK_VALUE`."""
+        return self._mask(data, self._roots)
+
+    def _mask(self, data: Any, nodes: tuple[dict[Any, Any], ...]) -> Any:
+        if isinstance(data, dict):
+            return self._mask_dict(data, nodes)
+        if isinstance(data, list):
+            return self._mask_list(data, nodes)
+        if isinstance(data, str) and "=" in data:
+            return self._mask_query_string(data)
+        return data
+
+    def _mask_dict(
+        self, data: dict[Any, Any], nodes: tuple[dict[Any, Any], ...]
+    ) -> dict[Any, Any]:
+        names = self._names
+        result: dict[Any, Any] | None = None
         for key, value in data.items():
-            if any(field.lower() == key.lower() for field in fields):
-                masked_dict[key] = MASK_VALUE
+            lowered = key.lower() if isinstance(key, str) else str(key)
+            if lowered in names:
+                masked: Any = MASK_VALUE
+            elif nodes:
+                children = self._children(nodes, lowered)
+                masked = MASK_VALUE if children is None else self._mask(value, children)
+            elif isinstance(value, dict | list | str):
+                masked = self._mask(value, nodes)
+            else:
+                continue
+            if masked is not value:
+                if result is None:
+                    result = dict(data)
+                result[key] = masked
+        return data if result is None else result
+
+    def _mask_list(
+        self, data: list[Any], nodes: tuple[dict[Any, Any], ...]
+    ) -> list[Any]:
+        result: list[Any] | None = None
+        for index, value in enumerate(data):
+            if nodes:
+                children = self._children(nodes, str(index))
+                masked = MASK_VALUE if children is None else self._mask(value, children)
+            elif isinstance(value, dict | list | str):
+                masked = self._mask(value, nodes)
             else:
-                masked_dict[key] = mask_sensitive_fields(value, fields)
-        return masked_dict
+                continue
+            if masked is not value:
+                if result is None:
+                    result = list(data)
+                result[index] = masked
+        return data if result is None else result
 
-    if isinstance(data, list):
-        return [mask_sensitive_fields(item, fields) for item in data]
+    @staticmethod
+    def _children(
+        nodes: tuple[dict[Any, Any], ...], segment: str
+    ) -> tuple[dict[Any, Any], ...] | None:
+        """
+        Rule-tree nodes that apply below `segment`.
+        Returns None when a rule ends exactly here (the value must be masked).
+        """
+        children = []
+        for node in nodes:
+            for child in (node.get(segment), node.get("*")):
+                if child is None:
+                    continue
+                if _MATCH in child:
+                    return None
+                children.append(child)
+        return tuple(children)
 
-    if isinstance(data, str) and "=" in data:
-        # Potential query string
+    def _mask_query_string(self, data: str) -> str:
+        # Cheap pre-check so ordinary strings containing "=" are not parsed
+        if self._query_hint is None:
+            return data
+        if not self._query_hint.search(data) and "%" not in data and "+" not in data:
+            return data
         try:
             pairs = parse_qsl(data, keep_blank_values=True)
             if not pairs:
@@ -43,7 +158,7 @@ def mask_sensitive_fields(data: Any, fields: list[str]) -> Any:
             masked_pairs = []
             changed = False
             for key, value in pairs:
-                if any(field.lower() == key.lower() for field in fields):
+                if key.lower() in self._names:
                     masked_pairs.append((key, MASK_VALUE))
                     changed = True
                 else:
@@ -53,4 +168,19 @@ def mask_sensitive_fields(data: Any, fields: list[str]) -> Any:
         except Exception:
             return data
 
-    return data
+
+@lru_cache(maxsize=32)
+def compile_masker(fields: tuple[str, ...]) -> Masker:
+    """Return a cached `Masker` for the given rules."""
+    return Masker(fields)
+
+
+def mask_sensitive_fields(data: Any, fields: list[str]) -> Any:
+    """
+    Recursively walk dicts and lists to mask sensitive fields.
+    Replaces matched field values with `MASK_VALUE`.
+    Also handles URL-encoded strings (query strings).
+
+    Prefer building a `Masker` once when masking repeatedly with the same rules.
+    """
+    return compile_masker(tuple(fields)).mask(data)
@@ -0,0 +1,65 @@
+import re
+from collections.abc import Iterable
+
+from starlette.routing import compile_path
+
+_ANY_SEGMENT = ""
+
+
+def _first_segment(path: str) -> str:
+    return path[1:].partition("/")[0] if path.startswith("/") else path
+
+
+class PathMatcher:
+    """
+    Matches request paths against skip rules compiled once at construction.
+
+    - `paths`: exact paths, looked up in a set.
+    - `prefixes`: path prefixes, grouped by length so a lookup costs one set
+      probe per distinct prefix length instead of one `startswith` per rule.
+    - `routes`: route templates such as `/users/{id}` or `/files/{p:path}`,
+      compiled with Starlette's `compile_path` (the same regex the router uses)
+      and indexed by their first literal segment.
+
+    The cost of `matches()` depends on the shape of the rules, not their count.
+    """
+
+    def __init__(
+        self,
+        paths: Iterable[str] = (),
+        prefixes: Iterable[str] = (),
+        routes: Iterable[str] = (),
+    ):
+        self._exact = frozenset(paths)
+
+        by_length: dict[int, set[str]] = {}
+        for prefix in prefixes:
+            by_length.setdefault(len(prefix), set()).add(prefix)
+        self._prefixes = tuple(
+            (length, frozenset(group)) for length, group in sorted(by_length.items())
+        )
+
+        by_segment: dict[str, list[re.Pattern[str]]] = {}
+        for template in routes:
+            regex, _, _ = compile_path(template)
+            segment = _first_segment(template)
+            key = _ANY_SEGMENT if "{" in segment else segment
+            by_segment.setdefault(key, []).append(regex)
+        self._routes = {key: tuple(group) for key, group in by_segment.items()}
+        self._wildcard_routes = self._routes.pop(_ANY_SEGMENT, ())
+
+    def matches(self, path: str) -> bool:
+        if path in self._exact:
+            return True
+
+        for length, group in self._prefixes:
+            if length > len(path):
+                break
+            if path[:length] in group:
+                return True
+
+        if self._routes:
+            for regex in self._routes.get(_first_segment(path), ()):
+                if regex.match(path):
+                    return True
+        return any(regex.match(path) for regex in self._wildcard_routes)
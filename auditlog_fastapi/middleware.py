@@ -1,46 +1,87 @@
-import json
+import hashlib
 import sys
 import time
 from collections.abc import Awaitable, Callable
 from typing import Any, cast
+from urllib.parse import parse_qsl
+from uuid import UUID
 
-from fastapi import Request, Response
-from starlette.background import BackgroundTasks
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from fastapi import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from .bodies import BodyCapture
+from .cache import TTLCache
+from .codec import JSONCodec, get_codec
 from .config import get_storage
 from .context import _current_entry
-from .filters import DEFAULT_SENSITIVE_FIELDS, mask_sensitive_fields
-from .models import AuditEntry
+from .filters import DEFAULT_SENSITIVE_FIELDS, Masker
+from .ids import get_id_factory
+from .matching import PathMatcher
+from .models import AuditEntry, AuditRecord
+from .sampling import SAMPLE_RATE_KEY, SamplingPolicy
 from .storage.base import AuditStorage
 
 
-class AuditMiddleware(BaseHTTPMiddleware):
+class AuditMiddleware:
+    """
+    Pure ASGI middleware that records an `AuditEntry` for every HTTP request.
+
+    The entry is built directly from the ASGI scope as a slotted `AuditRecord`
+    (no Pydantic model per request), the status code is read from
+    `http.response.start` and the entry is handed to the storage once the last
+    body chunk has been sent. The route's response (including its background
+    tasks) is passed through untouched.
+    """
+
     def __init__(
         self,
-        app: Any,
+        app: ASGIApp,
         storage: AuditStorage | None = None,
         get_user: Callable[[Request], Awaitable[dict[str, Any]]] | None = None,
         skip_paths: list[str] | None = None,
         skip_path_prefixes: list[str] | None = None,
         skip_methods: list[str] | None = None,
+        skip_routes: list[str] | None = None,
         log_request_body: bool = False,
         log_response_body: bool = False,
         max_body_size: int = 10_000,
         mask_fields: list[str] | None = None,
         on_error: Callable[[Exception, AuditEntry], None] | None = None,
+        sampling: SamplingPolicy | None = None,
+        resolve_user_early: bool = False,
+        user_cache_ttl: float | None = None,
+        user_cache_size: int = 1024,
+        user_cache_header: str = "authorization",
+        defer_body_processing: bool = False,
     ):
-        super().__init__(app)
+        self.app = app
         self._explicit_storage = storage
         self.get_user = get_user
         self.skip_paths = skip_paths or []
         self.skip_path_prefixes = skip_path_prefixes or []
         self.skip_methods = skip_methods or []
+        self.skip_routes = skip_routes or []
+        self._skip_methods = frozenset(self.skip_methods)
+        self._skip_matcher = PathMatcher(
+            self.skip_paths, self.skip_path_prefixes, self.skip_routes
+        )
         self.log_request_body = log_request_body
         self.log_response_body = log_response_body
         self.max_body_size = max_body_size
+        self.defer_body_processing = defer_body_processing
         self.mask_fields = mask_fields or DEFAULT_SENSITIVE_FIELDS
+        self._masker = Masker(self.mask_fields)
         self.on_error = on_error
+        self.sampling = sampling
+        self.resolve_user_early = resolve_user_early
+        # Optional cache of get_user() results keyed by a hash of the
+        # credential header; None disables caching
+        self.user_cache: TTLCache[dict[str, Any]] | None = (
+            TTLCache(maxsize=user_cache_size, ttl=user_cache_ttl)
+            if get_user and user_cache_ttl
+            else None
+        )
+        self._user_cache_header = user_cache_header.lower().encode("latin-1")
 
     @property
     def storage(self) -> AuditStorage:
@@ -67,6 +108,29 @@ class AuditMiddleware(BaseHTTPMiddleware):
             pass
         return self._default_on_error
 
+    def _get_storage_config(self) -> Any:
+        try:
+            return self.storage.config
+        except Exception:
+            # Unconfigured storage is reported by _safe_save
+            return None
+
+    def _get_codec(self) -> JSONCodec:
+        config = self._get_storage_config()
+        return get_codec(getattr(config, "json_codec", "auto"))
+
+    def _get_id_factory(self) -> Callable[[], UUID]:
+        config = self._get_storage_config()
+        return get_id_factory(getattr(config, "id_strategy", "uuid4"))
+
+    def _get_sampling(self) -> SamplingPolicy | None:
+        if self.sampling is not None:
+            return self.sampling
+        from .config import _registry
+
+        config = _registry.get("config")
+        return getattr(config, "sampling", None)
+
     def _default_on_error(
         self,
         exc: Exception,
@@ -74,33 +138,33 @@ class AuditMiddleware(BaseHTTPMiddleware):
     ) -> None:
         print(f"Audit log storage failure: {exc}", file=sys.stderr)  # noqa: T201
 
-    async def _resolve_user(self, request: Request) -> dict[str, Any]:
+    async def _resolve_user(self, scope: Scope) -> dict[str, Any]:
         """
         Try all known patterns to extract user identity from the request.
         Priority order:
           1. Caller-provided get_user callable (most explicit)
-          2. Starlette's built-in AuthenticationMiddleware (request.scope['user'])
+          2. Starlette's built-in AuthenticationMiddleware (scope['user'])
           3. Common convention: request.state.user set by app middleware
         Returns a dict with 'user_id' and/or 'username', empty dict on failure.
         """
         # Pattern 1: caller-provided async callable
         if self.get_user:
             try:
-                return await self.get_user(request)
+                return await self._get_user_cached(scope)
             except Exception as e:
                 print(f"[audit] get_user() raised: {e}", file=sys.stderr)  # noqa: T201
 
         # Pattern 2: Starlette's built-in AuthenticationMiddleware
         # Direct scope check avoids AssertionError if middleware is missing
-        starlette_user = request.scope.get("user")
+        starlette_user = scope.get("user")
         if starlette_user and getattr(starlette_user, "is_authenticated", False):
             return {
                 "user_id": str(getattr(starlette_user, "identity", "") or ""),
                 "username": getattr(starlette_user, "display_name", None),
             }
 
-        # Pattern 3: request.state.user set by app middleware or dependency
-        state_user = getattr(request.state, "user", None)
+        # Pattern 3: request.state.user, stored by Starlette in scope['state']
+        state_user = (scope.get("state") or {}).get("user")
         if state_user:
             if isinstance(state_user, dict):
                 return state_user
@@ -125,101 +189,197 @@ class AuditMiddleware(BaseHTTPMiddleware):
 
         return {}
 
-    def _apply_user(self, entry: AuditEntry, user_info: dict[str, Any]) -> None:
+    async def _get_user_cached(self, scope: Scope) -> dict[str, Any]:
+        """Call get_user(), going through the TTL cache when it is enabled."""
+        assert self.get_user is not None
+        if self.user_cache is None:
+            return await self.get_user(Request(scope))
+
+        credential = None
+        for key, value in scope["headers"]:
+            if key == self._user_cache_header:
+                credential = value
+                break
+        if not credential:
+            return await self.get_user(Request(scope))
+
+        # Only a digest of the credential is kept in memory
+        cache_key = hashlib.sha256(credential).digest()
+        user_info = self.user_cache.get(cache_key)
+        if user_info is None:
+            user_info = await self.get_user(Request(scope))
+            self.user_cache.set(cache_key, user_info)
+        return user_info
+
+    def _apply_user(self, entry: AuditRecord, user_info: dict[str, Any]) -> None:
         """Apply user info to entry, never overwriting an already-set value."""
         if not entry.user_id and user_info.get("user_id"):
             entry.user_id = str(user_info["user_id"])
         if not entry.username and user_info.get("username"):
             entry.username = str(user_info["username"])
 
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> Response:
-        if self._should_skip(request):
-            return await call_next(request)
-
-        start_time = time.perf_counter()
-
-        entry = AuditEntry(
-            method=request.method,
-            path=request.url.path,
-            query_params=dict(request.query_params),
-            ip_address=request.client.host if request.client else None,
-            user_agent=request.headers.get("user-agent"),
+    def _build_entry(self, scope: Scope) -> AuditRecord:
+        """Build the entry straight from the ASGI scope."""
+        user_agent = None
+        for key, value in scope["headers"]:
+            if key == b"user-agent":
+                user_agent = value.decode("latin-1")
+                break
+
+        query_string = scope.get("query_string", b"")
+        client = scope.get("client")
+
+        return AuditRecord(
+            method=scope["method"],
+            path=scope["path"],
+            query_params=(
+                dict(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True))
+                if query_string
+                else {}
+            ),
+            ip_address=client[0] if client else None,
+            user_agent=user_agent,
+            entry_id=self._get_id_factory()(),
         )
 
-        # Attempt 1: capture user BEFORE call_next
-        # Works when auth middleware runs before AuditMiddleware
-        self._apply_user(entry, await self._resolve_user(request))
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._should_skip(scope):
+            await self.app(scope, receive, send)
+            return
 
-        if self.log_request_body:
-            body = await self._get_request_body(request)
-            if body:
-                entry.request_body = mask_sensitive_fields(body, self.mask_fields)
+        start_time = time.perf_counter()
+        entry = self._build_entry(scope)
+
+        # Head sampling is decided before any body capture so dropped requests
+        # never buffer or mask anything
+        # (sample_rate is None for requests dropped by head sampling)
+        sampling = self._get_sampling()
+        sample_rate: float | None = 1.0
+        if sampling is not None:
+            rate = sampling.head_rate(entry.method, entry.path)
+            sample_rate = rate if sampling.sample(rate) else None
+        sampled = sample_rate is not None
+
+        request_body: BodyCapture | None = None
+        if self.log_request_body and sampled:
+            request_body = BodyCapture.from_headers(
+                scope["headers"], self.max_body_size
+            )
+            receive = self._tee_receive(receive, request_body)
+
+        response_body: BodyCapture | None = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_body
+            if message["type"] == "http.response.start":
+                entry.status_code = message["status"]
+                if self.log_response_body and sampled:
+                    response_body = BodyCapture.from_headers(
+                        message.get("headers", ()), self.max_body_size
+                    )
+            await send(message)
+            if message["type"] == "http.response.body":
+                # Tee after the chunk has gone out so capture never delays it
+                if response_body is not None:
+                    response_body.feed(message.get("body", b""))
+                if not message.get("more_body", False):
+                    entry.duration_ms = (time.perf_counter() - start_time) * 1000
+
+        if self.resolve_user_early and sampled:
+            self._apply_user(entry, await self._resolve_user(scope))
 
         token = _current_entry.set(entry)
-        response: Response | None = None
-
         try:
-            response = await call_next(request)
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
             entry.error = str(e)
-            entry.duration_ms = (time.perf_counter() - start_time) * 1000
             _current_entry.reset(token)
-            await self._safe_save(entry)
+            await self._finalize(
+                entry, scope, start_time, request_body, response_body, sample_rate
+            )
             raise
 
         _current_entry.reset(token)
+        await self._finalize(
+            entry, scope, start_time, request_body, response_body, sample_rate
+        )
 
-        # Attempt 2: capture user AFTER call_next
-        # Works when auth is handled inside route dependencies that set request.state.user  # noqa: E501
-        # _apply_user will not overwrite values already set in Attempt 1
-        self._apply_user(entry, await self._resolve_user(request))
-
-        entry.duration_ms = (time.perf_counter() - start_time) * 1000
-        entry.status_code = response.status_code
+    async def _finalize(
+        self,
+        entry: AuditRecord,
+        scope: Scope,
+        start: float,
+        request_body: BodyCapture | None = None,
+        response_body: BodyCapture | None = None,
+        sample_rate: float | None = 1.0,
+    ) -> None:
+        """Complete the entry once the response is over and hand it off."""
+        entry.sync_view()
+        # Set by the router once a route matched
+        route = scope.get("route")
+        entry.route = getattr(route, "path", None)
+        if not entry.duration_ms:
+            entry.duration_ms = (time.perf_counter() - start) * 1000
+
+        sampling = self._get_sampling()
+        if sampling is not None and sampling.keep(entry):
+            sample_rate = 1.0
+        if sample_rate is None:
+            return
+        if sample_rate < 1.0:
+            entry.extra[SAMPLE_RATE_KEY] = sample_rate
+
+        # Resolved once, after the response, so auth handled inside route
+        # dependencies (request.state.user) is visible as well as outer auth
+        # middleware. Early resolution only gets a second try if it found nothing
+        if not (entry.user_id or entry.username):
+            self._apply_user(entry, await self._resolve_user(scope))
+
+        if entry.query_params:
+            entry.query_params = self._masker.mask(entry.query_params)
+
+        # Deferred bodies keep only the raw bytes and content type; the storage
+        # writer decodes and masks them off the request path
+        codec = self._get_codec()
+        if request_body is not None:
+            body = request_body.freeze(self._masker, codec)
+            if body is not None:
+                entry.request_body = (
+                    body if self.defer_body_processing else body.render() or None
+                )
 
-        background_tasks = BackgroundTasks()
-        background_tasks.add_task(self._safe_save, entry)
-        response.background = background_tasks
+        if response_body is not None:
+            body = response_body.freeze(self._masker, codec)
+            if body is not None:
+                entry.response_body = (
+                    body if self.defer_body_processing else body.render() or None
+                )
 
-        return response
+        await self._safe_save(entry)
 
-    async def _safe_save(self, entry: AuditEntry) -> None:
+    async def _safe_save(self, entry: AuditRecord) -> None:
         try:
-            await self.storage.save(entry)
+            await self.storage.write(entry)
         except Exception as e:
             on_error = self._get_on_error()
-            on_error(e, entry)
+            on_error(e, entry.to_entry())
 
-    def _should_skip(self, request: Request) -> bool:
-        if request.method in self.skip_methods:
-            return True
-        if request.url.path in self.skip_paths:
-            return True
-        if any(request.url.path.startswith(p) for p in self.skip_path_prefixes):
+    def _should_skip(self, scope: Scope) -> bool:
+        if scope["method"] in self._skip_methods:
             return True
-        return False
+        return self._skip_matcher.matches(scope["path"])
 
-    async def _get_request_body(self, request: Request) -> Any:
-        try:
-            body_bytes = await request.body()
-            if not body_bytes:
-                return None
-
-            # Reconstruct the receive channel so the route handler
-            # can still read the body after we consumed it
-            async def receive() -> dict[str, Any]:
-                return {"type": "http.request", "body": body_bytes}
-
-            request._receive = receive
+    @staticmethod
+    def _tee_receive(receive: Receive, capture: BodyCapture) -> Receive:
+        """
+        Wrap `receive` so request body chunks stream through to the app untouched
+        while a bounded copy is kept for the audit entry.
+        """
 
-            if len(body_bytes) > self.max_body_size:
-                return f"<Truncated: {len(body_bytes)} bytes>"
+        async def wrapped() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                capture.feed(message.get("body", b""))
+            return message
 
-            try:
-                return json.loads(body_bytes)
-            except json.JSONDecodeError:
-                return body_bytes.decode(errors="replace")
-        except Exception:
-            return None
+        return wrapped
@@ -1,3 +1,4 @@
+from collections.abc import Iterable
 from datetime import UTC, datetime
 from typing import Any
 from uuid import UUID, uuid4
@@ -46,3 +47,181 @@ class AuditEntry(BaseModel):
         default_factory=dict, examples=[{"browser": "Chrome", "version": "122.0"}]
     )
     error: str | None = Field(None, examples=["ValueError: Invalid input"])
+
+
+# Column order shared by every backend's row conversion
+ENTRY_FIELDS: tuple[str, ...] = tuple(AuditEntry.model_fields)
+
+# Left out by get_entries(exclude_bodies=True)
+BODY_FIELDS = ("request_body", "response_body")
+
+# Always read by projections: identity and the keyset pagination sort key
+_KEY_FIELDS = ("id", "timestamp")
+_REQUIRED_PLACEHOLDERS = {"method": "", "path": ""}
+
+# Fields an application may change on the entry it gets from
+# get_current_audit_entry(); copied back onto the record when the request ends
+_ANNOTATION_FIELDS = (
+    "user_id",
+    "username",
+    "action",
+    "resource_type",
+    "resource_id",
+    "extra",
+)
+
+
+class AuditRecord:
+    """
+    Compact mutable form of an `AuditEntry` used on the request and write path.
+
+    The middleware builds one per request and the batching writer queues it,
+    so no validation runs and no model is allocated until an entry crosses a
+    public boundary (`get_current_audit_entry()`, error callbacks). Backends
+    read the same attribute names from records and `AuditEntry` alike.
+    """
+
+    # `route` is the matched route template, used for rollups but not stored
+    __slots__ = (*ENTRY_FIELDS, "route", "_entry")
+
+    id: UUID
+    timestamp: datetime
+    user_id: str | None
+    username: str | None
+    ip_address: str | None
+    user_agent: str | None
+    method: str
+    path: str
+    query_params: dict[str, Any]
+    status_code: int | None
+    request_body: Any
+    response_body: Any
+    duration_ms: float
+    action: str | None
+    resource_type: str | None
+    resource_id: str | None
+    extra: dict[str, Any]
+    error: str | None
+    route: str | None
+
+    def __init__(
+        self,
+        method: str,
+        path: str,
+        query_params: dict[str, Any] | None = None,
+        ip_address: str | None = None,
+        user_agent: str | None = None,
+        entry_id: UUID | None = None,
+    ):
+        self.id = entry_id or uuid4()
+        self.timestamp = datetime.now(UTC)
+        self.user_id = None
+        self.username = None
+        self.ip_address = ip_address
+        self.user_agent = user_agent
+        self.method = method
+        self.path = path
+        self.query_params = query_params if query_params is not None else {}
+        self.status_code = None
+        self.request_body = None
+        self.response_body = None
+        self.duration_ms = 0.0
+        self.action = None
+        self.resource_type = None
+        self.resource_id = None
+        self.extra = {}
+        self.error = None
+        self.route = None
+        self._entry: AuditEntry | None = None
+
+    @classmethod
+    def from_entry(cls, entry: AuditEntry) -> "AuditRecord":
+        record = cls.__new__(cls)
+        for field in ENTRY_FIELDS:
+            setattr(record, field, getattr(entry, field))
+        record.route = None
+        record._entry = None
+        return record
+
+    def to_entry(self) -> AuditEntry:
+        """A detached `AuditEntry` snapshot, built without validation."""
+        return AuditEntry.model_construct(**self.as_dict())
+
+    def as_dict(self) -> dict[str, Any]:
+        """Field values keyed by name, like a shallow `model_dump()`."""
+        return {field: getattr(self, field) for field in ENTRY_FIELDS}
+
+    def view(self) -> AuditEntry:
+        """
+        The `AuditEntry` handed to application code for this request.
+        Created on first use; changes to its annotation fields are copied back
+        by `sync_view()`.
+        """
+        if self._entry is None:
+            self._entry = self.to_entry()
+        return self._entry
+
+    def annotate(self, **values: Any) -> None:
+        """Set fields on the record and on its view, if one was handed out."""
+        for name, value in values.items():
+            setattr(self, name, value)
+            if self._entry is not None:
+                setattr(self._entry, name, value)
+
+    def sync_view(self) -> None:
+        """Copy annotation fields back from the view, if one was handed out."""
+        if self._entry is None:
+            return
+        for field in _ANNOTATION_FIELDS:
+            setattr(self, field, getattr(self._entry, field))
+        self._entry = None
+
+
+# Anything the storage backends accept for writing
+EntryLike = AuditEntry | AuditRecord
+
+
+def entry_values(entry: EntryLike) -> dict[str, Any]:
+    """Field values of an entry or record, without Pydantic serialization."""
+    if isinstance(entry, AuditRecord):
+        return entry.as_dict()
+    return {field: getattr(entry, field) for field in ENTRY_FIELDS}
+
+
+def as_entry(entry: EntryLike) -> AuditEntry:
+    """Return a public `AuditEntry` for an entry or record."""
+    if isinstance(entry, AuditRecord):
+        return entry.to_entry()
+    return entry
+
+
+def select_fields(
+    fields: Iterable[str] | None = None, exclude_bodies: bool = False
+) -> tuple[str, ...] | None:
+    """
+    Columns to read for a `get_entries()` projection, in `ENTRY_FIELDS` order
+    and always including id and timestamp. None means every column.
+    Raises ValueError for unknown field names.
+    """
+    if fields is None and not exclude_bodies:
+        return None
+    wanted = set(ENTRY_FIELDS if fields is None else fields)
+    unknown = wanted.difference(ENTRY_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown audit entry fields: {', '.join(sorted(unknown))}")
+    if exclude_bodies:
+        wanted.difference_update(BODY_FIELDS)
+    wanted.update(_KEY_FIELDS)
+    return tuple(field for field in ENTRY_FIELDS if field in wanted)
+
+
+def partial_entry(data: dict[str, Any]) -> AuditEntry:
+    """
+    An `AuditEntry` holding only the projected fields in `data`, validated.
+    Other fields are unset: `model_dump(exclude_unset=True)` returns just the
+    projection, and required fields that were not read raise AttributeError.
+    """
+    validated = AuditEntry.model_validate({**_REQUIRED_PLACEHOLDERS, **data})
+    return AuditEntry.model_construct(
+        _fields_set=set(data), **{name: getattr(validated, name) for name in data}
+    )
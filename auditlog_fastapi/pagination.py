@@ -0,0 +1,51 @@
+import base64
+import binascii
+from collections.abc import Iterable
+from datetime import datetime
+from uuid import UUID
+
+from .exceptions import InvalidCursorError
+from .models import AuditEntry
+
+
+class EntryPage(list[AuditEntry]):
+    """
+    A page of entries returned by `get_entries()`.
+
+    `next_cursor` resumes right after the last entry and is None on the last
+    page. It is a plain list otherwise, so callers that ignore cursors are
+    unaffected.
+    """
+
+    def __init__(
+        self, entries: Iterable[AuditEntry] = (), next_cursor: str | None = None
+    ):
+        super().__init__(entries)
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(entry: AuditEntry) -> str:
+    """Opaque cursor over the (timestamp, id) sort key of `entry`."""
+    raw = f"{entry.timestamp.isoformat()}|{entry.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Inverse of `encode_cursor()`. Raises InvalidCursorError on garbage."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, entry_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), UUID(entry_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}") from e
+
+
+def make_page(rows: list[AuditEntry], limit: int) -> EntryPage:
+    """
+    Build a page from a query that fetched up to `limit + 1` rows; the extra
+    row only tells whether another page exists.
+    """
+    if len(rows) > limit:
+        page = rows[:limit]
+        return EntryPage(page, encode_cursor(page[-1]))
+    return EntryPage(rows)
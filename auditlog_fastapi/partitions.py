@@ -0,0 +1,169 @@
+import asyncio
+import contextlib
+import sys
+from collections.abc import Awaitable, Callable
+from datetime import UTC, date, datetime, timedelta
+from typing import Literal
+
+PartitionInterval = Literal["day", "month"]
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+class PartitionManager:
+    """
+    Plans the time-range partitions of a PostgreSQL audit table.
+
+    The parent table is `PARTITION BY RANGE (timestamp)` with one partition per
+    day or month, named `<table>_pYYYYMMDD` / `<table>_pYYYYMM`, plus a default
+    partition catching rows outside every range. `premake` future partitions
+    are kept ready so inserts never land in the default partition, and
+    partitions whose range ended more than `retention_days` ago are detached
+    and dropped, which is far cheaper than deleting rows.
+
+    Only builds SQL; `PartitionMaintainer` runs it.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        interval: PartitionInterval = "month",
+        premake: int = 3,
+        retention_days: int | None = None,
+    ):
+        self.table = table
+        self.interval = interval
+        self.premake = premake
+        self.retention_days = retention_days
+
+    def start_of(self, day: date) -> date:
+        """First day of the partition containing `day`."""
+        return day if self.interval == "day" else day.replace(day=1)
+
+    def next_start(self, start: date) -> date:
+        if self.interval == "day":
+            return start + timedelta(days=1)
+        return _add_months(start, 1)
+
+    def name(self, start: date) -> str:
+        suffix = start.strftime("%Y%m%d" if self.interval == "day" else "%Y%m")
+        return f"{self.table}_p{suffix}"
+
+    def parse_name(self, name: str) -> date | None:
+        """Start of the partition with this name, None for foreign tables."""
+        prefix = f"{self.table}_p"
+        suffix = name.removeprefix(prefix)
+        expected = 8 if self.interval == "day" else 6
+        if suffix == name or len(suffix) != expected or not suffix.isdigit():
+            return None
+        try:
+            return date(int(suffix[:4]), int(suffix[4:6]), int(suffix[6:] or 1))
+        except ValueError:
+            return None
+
+    def create_partition_sql(self, start: date) -> str:
+        end = self.next_start(start)
+        return (
+            f"CREATE TABLE IF NOT EXISTS {self.name(start)} "
+            f"PARTITION OF {self.table} "
+            f"FOR VALUES FROM ('{start.isoformat()} 00:00:00+00') "
+            f"TO ('{end.isoformat()} 00:00:00+00')"
+        )
+
+    def create_default_sql(self) -> str:
+        return (
+            f"CREATE TABLE IF NOT EXISTS {self.table}_default "
+            f"PARTITION OF {self.table} DEFAULT"
+        )
+
+    def list_partitions_sql(self) -> str:
+        return (
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            f"WHERE p.relname = '{self.table}'"
+        )
+
+    def drop_partition_sql(self, name: str) -> list[str]:
+        return [
+            f"ALTER TABLE {self.table} DETACH PARTITION {name}",
+            f"DROP TABLE {name}",
+        ]
+
+    def upcoming(self, today: date) -> list[date]:
+        """Starts of the current partition and the `premake` after it."""
+        starts = [self.start_of(today)]
+        for _ in range(self.premake):
+            starts.append(self.next_start(starts[-1]))
+        return starts
+
+    def expired(self, names: list[str], today: date) -> list[str]:
+        """Partitions whose whole range is older than the retention window."""
+        if self.retention_days is None:
+            return []
+        cutoff = today - timedelta(days=self.retention_days)
+        expired = []
+        for name in names:
+            start = self.parse_name(name)
+            if start is not None and self.next_start(start) <= cutoff:
+                expired.append(name)
+        return sorted(expired)
+
+
+class PartitionMaintainer:
+    """
+    Keeps partitions of an audit table up to date in the background.
+
+    `execute(sql)` runs a statement and `fetch_names(sql)` returns the first
+    column of a query, so any driver can be plugged in. `run_once()` should be
+    awaited at startup, before the first insert.
+    """
+
+    def __init__(
+        self,
+        manager: PartitionManager,
+        execute: Callable[[str], Awaitable[object]],
+        fetch_names: Callable[[str], Awaitable[list[str]]],
+        interval: float = 3600.0,
+    ):
+        self.manager = manager
+        self.execute = execute
+        self.fetch_names = fetch_names
+        self.interval = interval
+        self._task: asyncio.Task[None] | None = None
+
+    async def run_once(self, today: date | None = None) -> list[str]:
+        """Create upcoming partitions and drop expired ones. Returns dropped names."""
+        today = today or datetime.now(UTC).date()
+        await self.execute(self.manager.create_default_sql())
+        for start in self.manager.upcoming(today):
+            await self.execute(self.manager.create_partition_sql(start))
+
+        names = await self.fetch_names(self.manager.list_partitions_sql())
+        dropped = self.manager.expired(names, today)
+        for name in dropped:
+            for sql in self.manager.drop_partition_sql(name):
+                await self.execute(sql)
+        return dropped
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Audit partition maintenance failed: {e}", file=sys.stderr)  # noqa: T201
@@ -0,0 +1,88 @@
+from datetime import UTC, datetime
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict, field_validator
+
+# Filters that match a column by equality
+EQUALITY_FILTERS = (
+    "method",
+    "path",
+    "status_code",
+    "user_id",
+    "action",
+    "resource_type",
+    "resource_id",
+)
+
+
+class AuditFilters(BaseModel):
+    """
+    Filters understood by every storage backend.
+
+    Unset (None) filters are ignored. `since` is inclusive and `until`
+    exclusive; `status_min`/`status_max` are inclusive, so
+    `status_min=500, status_max=599` selects 5xx responses.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    method: str | None = None
+    path: str | None = None
+    path_prefix: str | None = None
+    status_code: int | None = None
+    status_min: int | None = None
+    status_max: int | None = None
+    user_id: str | None = None
+    action: str | None = None
+    resource_type: str | None = None
+    resource_id: str | None = None
+    since: datetime | None = None
+    until: datetime | None = None
+
+    @field_validator("since", "until")
+    @classmethod
+    def _to_utc(cls, value: datetime | None) -> datetime | None:
+        # Entries are stored in UTC; naive values are taken as UTC already
+        if value is not None and value.tzinfo is not None:
+            return value.astimezone(UTC)
+        return value
+
+    def matches(self, entry: Any) -> bool:
+        """
+        Whether `entry` passes these filters, evaluated in Python with
+        case-sensitive comparisons.
+        """
+        for name in EQUALITY_FILTERS:
+            value = getattr(self, name)
+            if value is not None and getattr(entry, name) != value:
+                return False
+        if self.path_prefix is not None and not entry.path.startswith(self.path_prefix):
+            return False
+        status = entry.status_code
+        if self.status_min is not None and (status is None or status < self.status_min):
+            return False
+        if self.status_max is not None and (status is None or status > self.status_max):
+            return False
+        timestamp = _naive_utc(entry.timestamp)
+        if self.since is not None and timestamp < _naive_utc(self.since):
+            return False
+        return self.until is None or timestamp < _naive_utc(self.until)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(UTC).replace(tzinfo=None) if value.tzinfo else value
+
+
+def like_prefix(prefix: str) -> str:
+    """LIKE pattern (escape character backslash) for values starting with `prefix`."""
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """
+    Smallest string greater than every string starting with `prefix` in
+    code point (binary) order, so a prefix match becomes a range scan:
+    `prefix <= value < prefix_upper_bound(prefix)`.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
@@ -34,6 +34,8 @@ def validate_dsn(orm: str, dsn: str) -> None:
 def resolve_storage(config: "AuditConfig") -> "AuditStorage":
     """Instantiate and return the correct storage backend for the given config."""
     validate_dsn(config.orm, config.dsn)
+    if config.rollups and config.orm == "tortoise":
+        raise AuditConfigurationError("Rollups are not supported with Tortoise ORM")
 
     if config.orm == "sqlalchemy":
         from .storage.sqlalchemy_storage import SQLAlchemyStorage
@@ -0,0 +1,101 @@
+import random
+import time
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class RetryPolicy(BaseModel):
+    """
+    Retries of failed storage writes.
+
+    Each write is tried up to `attempts` times, sleeping an exponentially
+    growing, fully jittered delay between tries (`base_delay * 2**n`, capped
+    at `max_delay`). Retries draw from a budget that earns `budget_ratio`
+    tokens per successful write (at most `budget_max`), so during an outage
+    retries stop instead of multiplying the load on the database.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    attempts: int = Field(3, ge=1)
+    base_delay: float = Field(0.05, ge=0.0)
+    max_delay: float = Field(2.0, ge=0.0)
+    budget_ratio: float = Field(0.2, ge=0.0)
+    budget_max: float = Field(10.0, ge=0.0)
+
+    def delay(self, retry: int) -> float:
+        """Seconds to sleep before retry number `retry` (0-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+
+class RetryBudget:
+    """Token bucket limiting retries to a fraction of successful writes."""
+
+    def __init__(self, ratio: float, maximum: float):
+        self.ratio = ratio
+        self.maximum = maximum
+        self.tokens = maximum
+
+    def deposit(self) -> None:
+        self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreakerPolicy(BaseModel):
+    """
+    Stop calling the storage after `failure_threshold` consecutive failures.
+
+    While open, writes are diverted to the fallback (the batch queue or the
+    spool) without touching the database. After `reset_timeout` seconds a
+    single trial write is let through; its outcome closes or re-opens the
+    circuit.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    failure_threshold: int = Field(5, ge=1)
+    reset_timeout: float = Field(30.0, ge=0.0)
+
+
+class CircuitBreaker:
+    """Runtime state of a `CircuitBreakerPolicy`."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state: Literal["closed", "open", "half_open"] = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+
+    @classmethod
+    def from_policy(cls, policy: CircuitBreakerPolicy) -> "CircuitBreaker":
+        return cls(policy.failure_threshold, policy.reset_timeout)
+
+    def allow(self) -> bool:
+        """Whether a write may be attempted now."""
+        if self.state == "closed":
+            return True
+        if (
+            self.state == "open"
+            and time.monotonic() - self._opened_at >= self.reset_timeout
+        ):
+            # Let exactly one trial write through
+            self.state = "half_open"
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self._opened_at = time.monotonic()
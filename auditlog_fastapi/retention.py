@@ -0,0 +1,64 @@
+import asyncio
+import contextlib
+import sys
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime, timedelta
+
+from pydantic import BaseModel
+
+
+class PurgeResult(BaseModel):
+    """Outcome of `AuditStorage.purge_older_than()`."""
+
+    deleted: int = 0  # rows (documents) removed
+    batches: int = 0  # chunks that removed at least one row
+    duration_ms: float = 0.0
+
+
+class RetentionTask:
+    """
+    Periodically purges entries older than `retention_days`.
+
+    `purge(cutoff, batch_size)` is normally `AuditStorage.purge_older_than`,
+    which deletes in bounded chunks so no run holds long locks.
+    """
+
+    def __init__(
+        self,
+        purge: Callable[[datetime, int], Awaitable[PurgeResult]],
+        retention_days: int,
+        interval: float = 3600.0,
+        batch_size: int = 5000,
+    ):
+        self.purge = purge
+        self.retention_days = retention_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.last_result: PurgeResult | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def cutoff(self, now: datetime | None = None) -> datetime:
+        return (now or datetime.now(UTC)) - timedelta(days=self.retention_days)
+
+    async def run_once(self, now: datetime | None = None) -> PurgeResult:
+        self.last_result = await self.purge(self.cutoff(now), self.batch_size)
+        return self.last_result
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Audit retention purge failed: {e}", file=sys.stderr)  # noqa: T201
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,142 @@
+import bisect
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+from .models import EntryLike
+from .query import AuditFilters
+from .stats import PERCENTILES, GroupBy, StatsRow, TimeBucket, truncate
+
+# Rollup rows are keyed by hour, route template, method and status class
+# (2 for 2xx, ...; 0 when the status is unknown)
+ROLLUP_KEY = ("bucket", "route", "method", "status_class")
+
+# Upper bounds (ms) of the duration histogram; a last counter holds the rest
+DURATION_BOUNDS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+HISTOGRAM_COLUMNS = tuple(f"h{i}" for i in range(len(DURATION_BOUNDS) + 1))
+
+# Counters added together when rows with the same key are upserted
+COUNTER_COLUMNS = ("requests", "duration_sum", *HISTOGRAM_COLUMNS)
+ROLLUP_COLUMNS = (*ROLLUP_KEY, *COUNTER_COLUMNS)
+
+# group_by fields and filters the rollups can answer
+ROLLUP_GROUP_BY: frozenset[str] = frozenset({"route", "method"})
+_ROLLUP_FILTERS = frozenset({"method", "since", "until"})
+
+MAX_ROUTE_LENGTH = 512
+
+# Route key of requests no route matched (404s, probes). One shared key keeps
+# arbitrary client paths from adding rollup rows
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def rollup_table_name(table_name: str) -> str:
+    return f"{table_name}_rollups"
+
+
+def route_of(entry: EntryLike) -> str:
+    """The route template the middleware matched, or `UNMATCHED_ROUTE`."""
+    route = getattr(entry, "route", None) or UNMATCHED_ROUTE
+    return route[:MAX_ROUTE_LENGTH]
+
+
+def rollup_rows(entries: Iterable[EntryLike]) -> list[dict[str, Any]]:
+    """
+    Counters for a batch of entries, one row per rollup key.
+    Rows come sorted by key so concurrent upserts from several workers lock
+    rows in the same order.
+    """
+    rows: dict[tuple[Any, ...], dict[str, Any]] = {}
+    for entry in entries:
+        status = entry.status_code
+        key = (
+            truncate(entry.timestamp, "hour"),
+            route_of(entry),
+            entry.method,
+            status // 100 if status is not None else 0,
+        )
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = dict(zip(ROLLUP_KEY, key, strict=True))
+            row.update(dict.fromkeys(COUNTER_COLUMNS, 0))
+        duration = entry.duration_ms or 0.0
+        row["requests"] += 1
+        row["duration_sum"] += duration
+        row[HISTOGRAM_COLUMNS[bisect.bisect_left(DURATION_BOUNDS, duration)]] += 1
+    return [rows[key] for key in sorted(rows)]
+
+
+def rollups_cover(
+    filters: AuditFilters,
+    group_by: Sequence[GroupBy],
+    bucket: TimeBucket | None,
+    error_status: int,
+) -> bool:
+    """Whether the rollups can answer an `aggregate()` query exactly."""
+    if bucket == "minute" or error_status % 100:
+        return False
+    if not ROLLUP_GROUP_BY.issuperset(group_by):
+        return False
+    for name, value in filters:
+        if value is None:
+            continue
+        if name not in _ROLLUP_FILTERS:
+            return False
+        # Rollup rows cover whole hours
+        if name in ("since", "until") and (
+            value.minute or value.second or value.microsecond
+        ):
+            return False
+    return True
+
+
+def histogram_percentile(counts: Sequence[int], fraction: float) -> float | None:
+    """
+    Estimate a percentile from histogram counts, interpolating linearly within
+    the bucket it falls in. Values above the last bound report that bound.
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = fraction * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if not count or seen + count < rank:
+            seen += count
+            continue
+        if i == len(DURATION_BOUNDS):
+            break
+        lower = DURATION_BOUNDS[i - 1] if i else 0.0
+        return lower + (DURATION_BOUNDS[i] - lower) * (rank - seen) / count
+    return float(DURATION_BOUNDS[-1])
+
+
+def rollup_stats_rows(
+    rows: Iterable[Sequence[Any]],
+    group_by: Sequence[GroupBy],
+    bucket: TimeBucket | None,
+) -> list[StatsRow]:
+    """
+    Turn rollup query results into `StatsRow`s. Each row holds the group keys
+    (bucket first), then the summed requests, errors, duration_sum and
+    histogram counters.
+    """
+    width = len(group_by) + (bucket is not None)
+    result = []
+    for row in rows:
+        values = tuple(row)
+        key = values[:width]
+        requests, errors, duration_sum, *histogram = values[width:]
+        counts = [int(count) for count in histogram]
+        result.append(
+            StatsRow.build(
+                key[0] if bucket is not None else None,
+                dict(
+                    zip(group_by, key[1:] if bucket is not None else key, strict=True)
+                ),
+                int(requests),
+                int(errors or 0),
+                float(duration_sum) / int(requests) if requests else None,
+                [histogram_percentile(counts, p) for p in PERCENTILES],
+            )
+        )
+    return result
@@ -1,42 +1,216 @@
-from collections.abc import Sequence
-from typing import Any
+from collections.abc import Callable, Sequence
+from datetime import datetime
+from typing import Annotated, Any
+from uuid import UUID
 
-from fastapi import APIRouter, FastAPI, Query
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 
+from .cache import SingleFlightCache
+from .codec import get_codec
 from .config import get_storage
+from .exceptions import InvalidCursorError
+from .export import MEDIA_TYPES, ExportFormat, export_chunks
+from .models import EntryLike, select_fields
+from .query import AuditFilters
+from .stats import GroupBy, TimeBucket
+
+# Rows fetched per round trip by the export route
+EXPORT_BATCH_SIZE = 1000
+
+# A page of serialized entries and the cursor of the next one
+CachedPage = tuple[list[dict[str, Any]], str | None]
+
+
+def _audit_filters(
+    method: str | None = Query(None, description="Filter by HTTP method"),
+    path: str | None = Query(None, description="Filter by request path"),
+    status_code: int | None = Query(None, description="Filter by status code"),
+    user_id: str | None = Query(None, description="Filter by user ID"),
+    action: str | None = Query(None, description="Filter by action name"),
+    since: Annotated[
+        datetime | None, Query(description="Only entries at or after this time")
+    ] = None,
+    until: Annotated[
+        datetime | None, Query(description="Only entries before this time")
+    ] = None,
+    path_prefix: str | None = Query(None, description="Filter by request path prefix"),
+    status_min: int | None = Query(
+        None, ge=100, le=599, description="Minimum status code (inclusive)"
+    ),
+    status_max: int | None = Query(
+        None, ge=100, le=599, description="Maximum status code (inclusive)"
+    ),
+    resource_type: str | None = Query(None, description="Filter by resource type"),
+    resource_id: str | None = Query(None, description="Filter by resource ID"),
+) -> AuditFilters:
+    """Query parameters shared by the audit log routes."""
+    return AuditFilters(
+        method=method,
+        path=path,
+        path_prefix=path_prefix,
+        status_code=status_code,
+        status_min=status_min,
+        status_max=status_max,
+        user_id=user_id,
+        action=action,
+        resource_type=resource_type,
+        resource_id=resource_id,
+        since=since,
+        until=until,
+    )
+
+
+def _invalidate_latest(
+    cache: SingleFlightCache[CachedPage],
+) -> Callable[[Sequence[EntryLike]], None]:
+    """
+    Writer listener dropping the cached pages new entries change: first pages
+    (no cursor) whose filters match one of them. Cursor pages only reach back
+    in time, so new entries never appear on them. Filters are matched
+    case-sensitively, while MySQL and SQLite compare strings case-insensitively:
+    a page such an entry joins there stays cached until its TTL expires.
+    """
+
+    def listener(entries: Sequence[EntryLike]) -> None:
+        def changed(key: tuple[Any, ...]) -> bool:
+            filters, _limit, _offset, cursor, _columns = key
+            return cursor is None and any(filters.matches(e) for e in entries)
+
+        if entries:
+            cache.invalidate(changed)
+
+    return listener
 
 
 def add_audit_log_routes(
     app: FastAPI,
     path: str = "/audit-logs",
     tags: Sequence[str] | None = None,
-) -> None:
+    cache_ttl: float | None = None,
+    cache_size: int = 256,
+) -> SingleFlightCache[CachedPage] | None:
     """
-    Automatically adds a GET route to the FastAPI application for retrieving
+    Automatically adds GET routes to the FastAPI application for retrieving
     and filtering audit logs.
+    When more entries exist, `path` responds with an `X-Next-Cursor` header;
+    pass it back as `cursor` to fetch the next page. `{path}/export` streams
+    every matching entry as NDJSON or CSV, and `{path}/stats` returns counts,
+    error rates and latency percentiles per group and time bucket.
+    `fields` and `exclude_bodies` make `path` read only some columns, and
+    `{path}/{entry_id}` returns one complete entry.
+
+    With `cache_ttl` (seconds), `path` serves repeated queries from a cache of
+    up to `cache_size` pages, and identical concurrent queries share one
+    database read. Pages new entries can change are dropped whenever this
+    process's writer stores entries, so the storage must be configured
+    (`create_audit_lifespan()` or `configure()`) before the routes are added.
+    Returns the cache, whose `stats()` reports hits, misses and coalesced
+    reads.
     """
     router = APIRouter(tags=list(tags) if tags else ["Audit Logs"])
+    cache: SingleFlightCache[CachedPage] | None = (
+        SingleFlightCache(maxsize=cache_size, ttl=cache_ttl) if cache_ttl else None
+    )
+    if cache is not None:
+        get_storage().writer.add_listener(_invalidate_latest(cache))
 
     @router.get(path)
     async def get_audit_logs(
+        response: Response,
+        filters: Annotated[AuditFilters, Depends(_audit_filters)],
         limit: int = Query(100, ge=1, le=1000),
         offset: int = Query(0, ge=0),
-        method: str | None = Query(None, description="Filter by HTTP method"),
-        path: str | None = Query(None, description="Filter by request path"),
-        status_code: int | None = Query(None, description="Filter by status code"),
-        user_id: str | None = Query(None, description="Filter by user ID"),
-        action: str | None = Query(None, description="Filter by action name"),
+        cursor: str | None = Query(
+            None, description="Resume after a previous page (X-Next-Cursor header)"
+        ),
+        fields: Annotated[
+            list[str] | None,
+            Query(description="Only return these fields (id and timestamp always)"),
+        ] = None,
+        exclude_bodies: bool = Query(
+            False, description="Leave out request and response bodies"
+        ),
     ) -> list[dict[str, Any]]:
         storage = get_storage()
-        entries = await storage.get_entries(
-            limit=limit,
-            offset=offset,
-            method=method,
-            path=path,
-            status_code=status_code,
-            user_id=user_id,
-            action=action,
+        try:
+            columns = select_fields(fields, exclude_bodies)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+
+        async def load() -> CachedPage:
+            entries = await storage.get_entries(
+                limit=limit,
+                offset=offset,
+                cursor=cursor,
+                fields=columns,
+                **filters.model_dump(),
+            )
+            # Projected entries only have the selected fields set
+            rows = [
+                entry.model_dump(exclude_unset=columns is not None) for entry in entries
+            ]
+            return rows, getattr(entries, "next_cursor", None)
+
+        try:
+            if cache is None:
+                rows, next_cursor = await load()
+            else:
+                rows, next_cursor = await cache.get(
+                    (filters, limit, offset, cursor, columns), load
+                )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return rows
+
+    @router.get(f"{path}/export")
+    async def export_audit_logs(
+        filters: Annotated[AuditFilters, Depends(_audit_filters)],
+        fmt: Annotated[
+            ExportFormat, Query(alias="format", description="ndjson or csv")
+        ] = "ndjson",
+        limit: int | None = Query(None, ge=1, description="Maximum entries"),
+    ) -> StreamingResponse:
+        storage = get_storage()
+        entries = storage.iter_entries(filters, batch_size=EXPORT_BATCH_SIZE)
+        codec = get_codec(storage.config.json_codec if storage.config else "auto")
+        return StreamingResponse(
+            export_chunks(entries, fmt, limit=limit, codec=codec),
+            media_type=MEDIA_TYPES[fmt],
+            headers={"Content-Disposition": f'attachment; filename="audit-logs.{fmt}"'},
         )
-        return [entry.model_dump() for entry in entries]
+
+    @router.get(f"{path}/stats")
+    async def audit_log_stats(
+        filters: Annotated[AuditFilters, Depends(_audit_filters)],
+        group_by: Annotated[
+            list[GroupBy] | None, Query(description="Fields to group by")
+        ] = None,
+        bucket: Annotated[
+            TimeBucket | None, Query(description="minute, hour or day")
+        ] = None,
+        error_status: int = Query(
+            500, ge=100, le=599, description="Status codes counted as errors"
+        ),
+    ) -> list[dict[str, Any]]:
+        storage = get_storage()
+        try:
+            rows = await storage.aggregate(
+                filters, group_by or (), bucket, error_status
+            )
+        except ValueError as e:
+            # e.g. grouping by route without rollups that cover the query
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        return [row.model_dump() for row in rows]
+
+    @router.get(f"{path}/{{entry_id}}")
+    async def get_audit_log(entry_id: UUID) -> dict[str, Any]:
+        entry = await get_storage().get_entry(entry_id)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Audit log entry not found")
+        return entry.model_dump()
 
     app.include_router(router)
+    return cache
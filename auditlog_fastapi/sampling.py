@@ -0,0 +1,83 @@
+import random
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
+
+from .matching import PathMatcher
+from .models import EntryLike
+
+# Key under AuditEntry.extra holding the head-sampling rate of a kept entry.
+# Only written when the rate is below 1.0; weight counts by 1 / sample_rate.
+SAMPLE_RATE_KEY = "sample_rate"
+
+MUTATING_METHODS = ["POST", "PUT", "PATCH", "DELETE"]
+
+
+class SamplingPolicy(BaseModel):
+    """
+    Decides which requests become stored audit entries.
+
+    Head sampling picks a rate per request before any body is captured:
+    `keep_methods` always get 1.0, then the first matching `route_rates` rule,
+    then `method_rates`, then `default_rate`. Requests dropped by head sampling
+    skip body buffering and masking entirely.
+
+    Tail rules run once the response is known and keep an entry regardless of
+    the head decision: error status codes, slow requests and raised errors.
+    Entries matching a tail rule are stored with an effective rate of 1.0.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    default_rate: float = Field(1.0, ge=0.0, le=1.0)
+    method_rates: dict[str, float] = Field(default_factory=dict)
+    # Keys are route templates ("/users/{id}") or prefixes ending in "*"
+    route_rates: dict[str, float] = Field(default_factory=dict)
+    keep_methods: list[str] = Field(default_factory=lambda: list(MUTATING_METHODS))
+
+    # Tail rules
+    keep_status_at_least: int | None = 400
+    keep_slower_than_ms: float | None = None
+    keep_errors: bool = True
+
+    _route_rules: tuple[tuple[PathMatcher, float], ...] = PrivateAttr(default=())
+    _keep_methods: frozenset[str] = PrivateAttr(default=frozenset())
+
+    def model_post_init(self, __context: Any) -> None:
+        rules = []
+        for pattern, rate in self.route_rates.items():
+            if pattern.endswith("*"):
+                matcher = PathMatcher(prefixes=[pattern[:-1]])
+            else:
+                matcher = PathMatcher(routes=[pattern])
+            rules.append((matcher, rate))
+        self._route_rules = tuple(rules)
+        self._keep_methods = frozenset(m.upper() for m in self.keep_methods)
+
+    def head_rate(self, method: str, path: str) -> float:
+        """Sampling rate for a request, decided from its method and path only."""
+        if method in self._keep_methods:
+            return 1.0
+        for matcher, rate in self._route_rules:
+            if matcher.matches(path):
+                return rate
+        return self.method_rates.get(method, self.default_rate)
+
+    def sample(self, rate: float) -> bool:
+        """Head decision for a request with the given rate."""
+        return rate >= 1.0 or random.random() < rate
+
+    def keep(self, entry: EntryLike) -> bool:
+        """Whether a tail rule forces the finished entry to be stored."""
+        if self.keep_errors and entry.error:
+            return True
+        if (
+            self.keep_status_at_least is not None
+            and entry.status_code is not None
+            and entry.status_code >= self.keep_status_at_least
+        ):
+            return True
+        return (
+            self.keep_slower_than_ms is not None
+            and entry.duration_ms >= self.keep_slower_than_ms
+        )
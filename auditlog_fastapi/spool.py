@@ -0,0 +1,215 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import BinaryIO, Literal
+
+from .codec import JSONCodec, get_codec
+from .exceptions import SpoolFullError
+from .models import AuditEntry, AuditRecord, EntryLike, entry_values
+
+FsyncPolicy = Literal["always", "interval", "never"]
+
+# Record header: payload length and CRC32 of the payload, big-endian
+_HEADER = struct.Struct(">II")
+_SUFFIX = ".seg"
+
+
+class Spool:
+    """
+    Durable on-disk buffer for audit entries the database could not take.
+
+    Entries are appended to numbered segment files as length-prefixed,
+    checksummed JSON records using buffered I/O. A segment is closed once it
+    reaches `segment_bytes`. To replay, `segments()` lists closed segments
+    oldest first, `read()` returns their entries, `mark_drained()` records
+    progress within one and `remove()` deletes it once written to the database.
+
+    `fsync` controls durability: "always" syncs after every append, "interval"
+    at most every `fsync_interval` seconds (a timer syncs the last appends of
+    a burst), "never" leaves it to the OS. `close()` syncs unless "never".
+    Appends that would grow the spool past `max_bytes` raise `SpoolFullError`.
+    A torn record at the end of a segment (crash mid-write) is ignored.
+
+    Thread-safe, so appends can run in a worker thread.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike[str],
+        max_bytes: int = 1 << 30,
+        segment_bytes: int = 16 << 20,
+        fsync: FsyncPolicy = "interval",
+        fsync_interval: float = 1.0,
+        codec: JSONCodec | None = None,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.codec = codec or get_codec()
+
+        self._lock = threading.Lock()
+        self._file: BinaryIO | None = None
+        self._file_size = 0
+        self._last_sync = time.monotonic()
+        self._sync_timer: threading.Timer | None = None
+        # Records of the oldest segment already written by an interrupted drain
+        self._drained: dict[Path, int] = {}
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segments = self._segments()
+        self._size = sum(path.stat().st_size for path in segments)
+        self._next_seq = int(segments[-1].stem) + 1 if segments else 0
+
+    @property
+    def size(self) -> int:
+        """Bytes currently held on disk."""
+        return self._size
+
+    @property
+    def pending(self) -> bool:
+        """Whether any entries are waiting to be replayed."""
+        return self._size > 0
+
+    def append(self, entries: Iterable[EntryLike]) -> None:
+        """Append entries; raises SpoolFullError when over the disk budget."""
+        data = b"".join(self._encode(entry) for entry in entries)
+        if not data:
+            return
+        with self._lock:
+            if self._size + len(data) > self.max_bytes:
+                raise SpoolFullError(
+                    f"Audit spool is full ({self._size} of {self.max_bytes} bytes)"
+                )
+            if self._file is None or self._file_size >= self.segment_bytes:
+                self._rotate()
+            assert self._file is not None
+            self._file.write(data)
+            self._file.flush()
+            self._file_size += len(data)
+            self._size += len(data)
+            self._maybe_sync()
+
+    def segments(self) -> list[Path]:
+        """Closed segments ready to replay, oldest first."""
+        with self._lock:
+            # Close the active segment so everything written so far is visible
+            if self._file is not None and self._file_size:
+                self._close_file()
+            return self._segments()
+
+    def read(self, segment: Path) -> list[EntryLike]:
+        """
+        Entries of a segment, skipping those an earlier drain already wrote.
+        Entries spooled with a matched route come back as `AuditRecord`s that
+        carry it.
+        """
+        return list(self._iter_records(segment, self._drained.get(segment, 0)))
+
+    def _iter_records(self, segment: Path, skip: int) -> Iterator[EntryLike]:
+        with segment.open("rb") as f:
+            data = f.read()
+        offset = 0
+        index = 0
+        while offset + _HEADER.size <= len(data):
+            length, checksum = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size
+            payload = data[start : start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            offset = start + length
+            if index >= skip:
+                yield self._decode(payload)
+            index += 1
+
+    def mark_drained(self, segment: Path, count: int) -> None:
+        """Remember that the first `count` records of a segment were written."""
+        self._drained[segment] = self._drained.get(segment, 0) + count
+
+    def remove(self, segment: Path) -> None:
+        """Delete a fully replayed segment."""
+        with self._lock:
+            self._drained.pop(segment, None)
+            try:
+                size = segment.stat().st_size
+                segment.unlink()
+            except FileNotFoundError:
+                return
+            self._size = max(self._size - size, 0)
+
+    def sync(self) -> None:
+        """Flush appended entries to disk now (unless fsync is "never")."""
+        with self._lock:
+            self._sync_timer = None
+            if self.fsync != "never" and self._file is not None:
+                os.fsync(self._file.fileno())
+                self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+            self._close_file()
+
+    def _encode(self, entry: EntryLike) -> bytes:
+        values = entry_values(entry)
+        # Not a stored column, but replayed entries must roll up under it
+        route = getattr(entry, "route", None)
+        if route is not None:
+            values["route"] = route
+        payload = self.codec.dumpb(values)
+        return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def _decode(self, payload: bytes) -> EntryLike:
+        values = self.codec.loads(payload)
+        route = values.pop("route", None)
+        entry = AuditEntry.model_validate(values)
+        if route is None:
+            return entry
+        record = AuditRecord.from_entry(entry)
+        record.route = route
+        return record
+
+    def _segments(self) -> list[Path]:
+        active = Path(self._file.name) if self._file is not None else None
+        return sorted(
+            path
+            for path in self.directory.glob(f"*{_SUFFIX}")
+            if path != active and path.stem.isdigit()
+        )
+
+    def _rotate(self) -> None:
+        self._close_file()
+        path = self.directory / f"{self._next_seq:020d}{_SUFFIX}"
+        self._next_seq += 1
+        self._file = path.open("ab")
+        self._file_size = 0
+
+    def _close_file(self) -> None:
+        if self._file is None:
+            return
+        if self.fsync != "never":
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        self._file_size = 0
+
+    def _maybe_sync(self) -> None:
+        if self.fsync == "never" or self._file is None:
+            return
+        now = time.monotonic()
+        if self.fsync == "always" or now - self._last_sync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_sync = now
+        elif self._sync_timer is None:
+            # Without another append the tail of a burst would never be synced
+            delay = self.fsync_interval - (now - self._last_sync)
+            self._sync_timer = threading.Timer(delay, self.sync)
+            self._sync_timer.daemon = True
+            self._sync_timer.start()
@@ -0,0 +1,168 @@
+import math
+from collections.abc import AsyncIterable, Sequence
+from datetime import UTC, datetime
+from typing import Any, Literal, cast
+
+from pydantic import BaseModel
+
+from .models import AuditEntry
+
+# "route" (the matched route template) is only recorded in the rollups
+GroupBy = Literal["path", "route", "status_code", "method", "user_id", "action"]
+TimeBucket = Literal["minute", "hour", "day"]
+
+GROUP_BY_FIELDS: tuple[GroupBy, ...] = (
+    "path",
+    "route",
+    "status_code",
+    "method",
+    "user_id",
+    "action",
+)
+PERCENTILES = (0.5, 0.95, 0.99)
+
+# strftime patterns that truncate a timestamp to the start of its bucket
+BUCKET_FORMATS: dict[TimeBucket, str] = {
+    "minute": "%Y-%m-%d %H:%M:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+
+
+class StatsRow(BaseModel):
+    """One group of `AuditStorage.aggregate()` results."""
+
+    bucket: datetime | None = None  # start of the time bucket (UTC)
+    group: dict[str, Any] = {}  # values of the group_by fields
+    count: int = 0
+    errors: int = 0  # entries with status_code >= error_status
+    error_rate: float = 0.0
+    avg_duration_ms: float | None = None
+    p50_duration_ms: float | None = None
+    p95_duration_ms: float | None = None
+    p99_duration_ms: float | None = None
+
+    @classmethod
+    def build(
+        cls,
+        bucket: Any,
+        group: dict[str, Any],
+        count: int,
+        errors: int | None,
+        avg: float | None,
+        percentiles: Sequence[float | None] = (None, None, None),
+    ) -> "StatsRow":
+        errors = int(errors or 0)
+        p50, p95, p99 = percentiles
+        return cls(
+            bucket=normalize_bucket(bucket),
+            group=group,
+            count=count,
+            errors=errors,
+            error_rate=errors / count if count else 0.0,
+            avg_duration_ms=avg,
+            p50_duration_ms=p50,
+            p95_duration_ms=p95,
+            p99_duration_ms=p99,
+        )
+
+
+def check_aggregate(group_by: Sequence[str], bucket: str | None) -> tuple[GroupBy, ...]:
+    """Validate `aggregate()` arguments; they end up as column names in SQL."""
+    for field in group_by:
+        if field not in GROUP_BY_FIELDS:
+            raise ValueError(f"Cannot group audit entries by {field!r}")
+    if bucket is not None and bucket not in BUCKET_FORMATS:
+        raise ValueError(f"Unknown time bucket {bucket!r}")
+    return tuple(cast(GroupBy, field) for field in dict.fromkeys(group_by))
+
+
+def normalize_bucket(value: Any) -> datetime | None:
+    """Bucket values come back as datetimes or strings, with or without tz."""
+    if value is None:
+        return None
+    start = datetime.fromisoformat(value) if isinstance(value, str) else value
+    assert isinstance(start, datetime)
+    if start.tzinfo is None:
+        return start.replace(tzinfo=UTC)
+    return start.astimezone(UTC)
+
+
+def truncate(timestamp: datetime, bucket: TimeBucket) -> datetime:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(UTC)
+    timestamp = timestamp.replace(second=0, microsecond=0, tzinfo=UTC)
+    if bucket == "minute":
+        return timestamp
+    timestamp = timestamp.replace(minute=0)
+    return timestamp if bucket == "hour" else timestamp.replace(hour=0)
+
+
+def percentile_cont(values: Sequence[float], fraction: float) -> float | None:
+    """Linearly interpolated percentile of sorted `values`, like SQL percentile_cont."""
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    low, high = math.floor(position), math.ceil(position)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def sort_rows(rows: list[StatsRow]) -> list[StatsRow]:
+    """Oldest bucket first, then by group values (None first)."""
+
+    def key(row: StatsRow) -> tuple[Any, ...]:
+        bucket = row.bucket or datetime.min.replace(tzinfo=UTC)
+        return (bucket, *((v is not None, str(v)) for v in row.group.values()))
+
+    return sorted(rows, key=key)
+
+
+class _Group:
+    __slots__ = ("start", "values", "count", "errors", "durations")
+
+    def __init__(self, start: datetime | None, values: dict[str, Any]):
+        self.start = start
+        self.values = values
+        self.count = 0
+        self.errors = 0
+        self.durations: list[float] = []
+
+
+async def aggregate_entries(
+    entries: AsyncIterable[AuditEntry],
+    group_by: Sequence[GroupBy] = (),
+    bucket: TimeBucket | None = None,
+    error_status: int = 500,
+) -> list[StatsRow]:
+    """
+    Aggregate a stream of entries in Python. Used by backends whose query
+    layer cannot group by time buckets; keeps only durations per group.
+    """
+    groups: dict[tuple[Any, ...], _Group] = {}
+    async for entry in entries:
+        start = truncate(entry.timestamp, bucket) if bucket else None
+        values: dict[str, Any] = {field: getattr(entry, field) for field in group_by}
+        key = (start, *values.values())
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = _Group(start, values)
+        group.count += 1
+        if entry.status_code is not None and entry.status_code >= error_status:
+            group.errors += 1
+        if entry.duration_ms is not None:
+            group.durations.append(entry.duration_ms)
+
+    rows = []
+    for group in groups.values():
+        durations = sorted(group.durations)
+        rows.append(
+            StatsRow.build(
+                group.start,
+                group.values,
+                group.count,
+                group.errors,
+                sum(durations) / len(durations) if durations else None,
+                [percentile_cont(durations, p) for p in PERCENTILES],
+            )
+        )
+    return sort_rows(rows)
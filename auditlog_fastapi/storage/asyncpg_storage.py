@@ -1,30 +1,137 @@
-import json
+from collections.abc import AsyncIterator, Sequence
+from datetime import datetime
 from typing import Any
+from uuid import UUID
 
 import asyncpg  # type: ignore
 
+from ..codec import get_codec
 from ..exceptions import AuditStorageConnectionError
-from ..models import AuditEntry
+from ..models import (
+    ENTRY_FIELDS,
+    AuditEntry,
+    EntryLike,
+    partial_entry,
+    select_fields,
+)
+from ..pagination import EntryPage, decode_cursor, make_page
+from ..partitions import PartitionMaintainer, PartitionManager
+from ..query import EQUALITY_FILTERS, AuditFilters, like_prefix
+from ..rollups import (
+    COUNTER_COLUMNS,
+    HISTOGRAM_COLUMNS,
+    MAX_ROUTE_LENGTH,
+    ROLLUP_COLUMNS,
+    ROLLUP_KEY,
+    rollup_stats_rows,
+    rollup_table_name,
+)
+from ..stats import GroupBy, StatsRow, TimeBucket, sort_rows
 from .base import AuditStorage
 
+# Composite indexes for the common filters, each followed by timestamp so
+# filtered reads come out in time order. (timestamp, id) serves the default
+# sort and keyset pagination; text_pattern_ops lets path LIKE 'prefix%' use
+# the path index
+_INDEXES = (
+    ("ts_id", "timestamp, id"),
+    ("uid_ts", "user_id, timestamp"),
+    ("path_ts", "path text_pattern_ops, timestamp"),
+    ("status_ts", "status_code, timestamp"),
+    ("action_ts", "action, timestamp"),
+    ("resource_ts", "resource_type, resource_id, timestamp"),
+)
+
+
+def _quote_ident(name: str) -> str:
+    """`name` as a quoted (case-sensitive) PostgreSQL identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
 
 class AsyncpgStorage(AuditStorage):
     def __init__(self, config: Any):
         self.config = config
+        self.codec = get_codec(config.json_codec)
+        # Newest first. Not by id alone even with uuid7: older rows (or ids
+        # generated elsewhere) may be random uuid4 values
+        self._order_by = "timestamp DESC, id DESC"
         self._pool: asyncpg.Pool | None = None
+        self._copy_min_batch: int | None = config.asyncpg_copy_min_batch
+
+        self._partitions = (
+            PartitionManager(
+                config.table_name,
+                config.partition_interval,
+                premake=config.partition_premake,
+                retention_days=config.retention_days,
+            )
+            if config.partition_interval
+            else None
+        )
+        self._maintainer: PartitionMaintainer | None = None
+        # Unique constraints of a partitioned table must include the
+        # partition key
+        conflict = "(id, timestamp)" if self._partitions else "(id)"
+        # ctids repeat across partitions, so those purge by primary key
+        purge_key = "(id, timestamp)" if self._partitions else "ctid"
+
+        # Built once; asyncpg prepares each statement on first use and keeps it
+        # in the per-connection statement cache
+        table = config.table_name
+        columns = ", ".join(ENTRY_FIELDS)
+        placeholders = ", ".join(f"${i}" for i in range(1, len(ENTRY_FIELDS) + 1))
+        # Temp tables live in pg_temp: name the staging table after the bare
+        # relation (a schema-qualified table_name cannot be reused) and quote
+        # it, as copy_records_to_table() quotes the name it is given
+        self._staging_table = f"{table.rpartition('.')[2]}_staging"
+        staging = f"pg_temp.{_quote_ident(self._staging_table)}"
+        self._insert_sql = (
+            f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT {conflict} DO NOTHING"
+        )
+        self._create_staging_sql = (
+            f"CREATE TEMP TABLE IF NOT EXISTS {staging} "
+            f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        self._move_staging_sql = (
+            f"INSERT INTO {table} ({columns}) "
+            f"SELECT {columns} FROM {staging} "
+            f"ON CONFLICT {conflict} DO NOTHING"
+        )
+        # Adds the counters to an existing row, so writers in several
+        # processes can update the same rollups
+        self._rollup_table = rollup_table_name(table)
+        self._rollup_sql = (
+            f"INSERT INTO {self._rollup_table} ({', '.join(ROLLUP_COLUMNS)}) "
+            f"VALUES ({', '.join(f'${i}' for i in range(1, len(ROLLUP_COLUMNS) + 1))}) "
+            f"ON CONFLICT ({', '.join(ROLLUP_KEY)}) DO UPDATE SET "
+            + ", ".join(
+                f"{name} = {self._rollup_table}.{name} + EXCLUDED.{name}"
+                for name in COUNTER_COLUMNS
+            )
+        )
+        self._purge_sql = (
+            f"DELETE FROM {table} WHERE {purge_key} IN "
+            f"(SELECT {purge_key} FROM {table} WHERE timestamp < $1 LIMIT $2)"
+        )
 
     async def startup(self) -> None:
         try:
             self._pool = await asyncpg.create_pool(
-                self.config.dsn, min_size=2, max_size=self.config.sqlalchemy_pool_size
+                self.config.dsn,
+                min_size=self.config.asyncpg_min_pool_size,
+                max_size=self.config.asyncpg_max_pool_size,
+                statement_cache_size=self.config.asyncpg_statement_cache_size,
+                init=self._init_connection,
             )
 
             if self.config.auto_create_table:
                 assert self._pool is not None
+                partitioned = self._partitions is not None
                 async with self._pool.acquire() as conn:
                     await conn.execute(f"""
                         CREATE TABLE IF NOT EXISTS {self.config.table_name} (
-                            id UUID PRIMARY KEY,
+                            id UUID {"NOT NULL" if partitioned else "PRIMARY KEY"},
                             timestamp TIMESTAMPTZ NOT NULL,
                             user_id VARCHAR(255),
                             username VARCHAR(255),
@@ -42,30 +149,92 @@ class AsyncpgStorage(AuditStorage):
                             resource_id VARCHAR(255),
                             extra JSONB,
                             error TEXT
-                        )
+                            {", PRIMARY KEY (id, timestamp)" if partitioned else ""}
+                        ) {"PARTITION BY RANGE (timestamp)" if partitioned else ""}
                     """)
-                    await conn.execute(
-                        f"CREATE INDEX IF NOT EXISTS idx_{self.config.table_name}_ts "
-                        f"ON {self.config.table_name} (timestamp)"
-                    )
-                    await conn.execute(
-                        f"CREATE INDEX IF NOT EXISTS idx_{self.config.table_name}_uid "
-                        f"ON {self.config.table_name} (user_id)"
-                    )
-                    await conn.execute(
-                        f"CREATE INDEX IF NOT EXISTS idx_{self.config.table_name}_path "
-                        f"ON {self.config.table_name} (path)"
-                    )
+                    for suffix, columns in _INDEXES:
+                        await conn.execute(
+                            "CREATE INDEX IF NOT EXISTS "
+                            f"idx_{self.config.table_name}_{suffix} "
+                            f"ON {self.config.table_name} ({columns})"
+                        )
+                    if self.config.rollups:
+                        histogram = ", ".join(
+                            f"{name} BIGINT NOT NULL" for name in HISTOGRAM_COLUMNS
+                        )
+                        await conn.execute(f"""
+                            CREATE TABLE IF NOT EXISTS {self._rollup_table} (
+                                bucket TIMESTAMPTZ NOT NULL,
+                                route VARCHAR({MAX_ROUTE_LENGTH}) NOT NULL,
+                                method VARCHAR(10) NOT NULL,
+                                status_class SMALLINT NOT NULL,
+                                requests BIGINT NOT NULL,
+                                duration_sum FLOAT NOT NULL,
+                                {histogram},
+                                PRIMARY KEY ({", ".join(ROLLUP_KEY)})
+                            )
+                        """)
+
+            if self._partitions is not None:
+                # Partitions for the current period must exist before inserts
+                pool = self._pool
+                self._maintainer = PartitionMaintainer(
+                    self._partitions,
+                    execute=pool.execute,
+                    fetch_names=self._fetch_names,
+                    interval=self.config.partition_maintenance_interval,
+                )
+                await self._maintainer.run_once()
+                self._maintainer.start()
         except Exception as e:
             raise AuditStorageConnectionError(
                 f"Failed to connect to asyncpg backend: {e}"
             ) from e
 
+        await self.writer.start()
+        self.start_retention()
+
     async def shutdown(self) -> None:
+        await self.stop_retention()
+        await self.writer.close()
+        if self._maintainer is not None:
+            await self._maintainer.stop()
         if self._pool:
             await self._pool.close()
 
-    def _to_db_tuple(self, entry: AuditEntry) -> tuple[Any, ...]:
+    async def _fetch_names(self, sql: str) -> list[str]:
+        assert self._pool is not None
+        return [row[0] for row in await self._pool.fetch(sql)]
+
+    async def _init_connection(self, conn: asyncpg.Connection) -> None:
+        """
+        Let the driver encode and decode JSON columns with the configured
+        codec, in binary format, so dicts go over the wire without an extra
+        text round trip.
+        """
+        await conn.set_type_codec(
+            "jsonb",
+            schema="pg_catalog",
+            encoder=self._encode_jsonb,
+            decoder=self._decode_jsonb,
+            format="binary",
+        )
+        await conn.set_type_codec(
+            "json",
+            schema="pg_catalog",
+            encoder=self.codec.dumpb,
+            decoder=self.codec.loads,
+            format="binary",
+        )
+
+    def _encode_jsonb(self, value: Any) -> bytes:
+        # Binary jsonb is a version byte (1) followed by the JSON text
+        return b"\x01" + self.codec.dumpb(value)
+
+    def _decode_jsonb(self, data: bytes) -> Any:
+        return self.codec.loads(data[1:])
+
+    def _to_db_tuple(self, entry: EntryLike) -> tuple[Any, ...]:
         return (
             entry.id,
             entry.timestamp,
@@ -75,58 +244,100 @@ class AsyncpgStorage(AuditStorage):
             entry.user_agent,
             entry.method,
             entry.path,
-            json.dumps(entry.query_params) if entry.query_params else None,
+            entry.query_params or None,
             entry.status_code,
-            json.dumps(entry.request_body) if entry.request_body else None,
-            json.dumps(entry.response_body) if entry.response_body else None,
+            entry.request_body or None,
+            entry.response_body or None,
             entry.duration_ms,
             entry.action,
             entry.resource_type,
             entry.resource_id,
-            json.dumps(entry.extra) if entry.extra else None,
+            entry.extra or None,
             entry.error,
         )
 
-    def _from_row(self, row: asyncpg.Record) -> AuditEntry:
+    def _from_row(self, row: asyncpg.Record, partial: bool = False) -> AuditEntry:
         data = dict(row)
-        for field in ["query_params", "request_body", "response_body", "extra"]:
-            if isinstance(data.get(field), str):
-                data[field] = json.loads(data[field])
-        return AuditEntry.model_validate(data)
+        # JSON columns arrive decoded by the connection's type codecs
+        for field in ("query_params", "extra"):
+            if field in data and data[field] is None:
+                data[field] = {}
+        return partial_entry(data) if partial else AuditEntry.model_validate(data)
 
-    async def save(self, entry: AuditEntry) -> None:
-        sql = f"""
-            INSERT INTO {self.config.table_name} (
-                id, timestamp, user_id, username, ip_address, user_agent,
-                method, path, query_params, status_code, request_body,
-                response_body, duration_ms, action, resource_type,
-                resource_id, extra, error
-            ) VALUES (
-                $1, $2, $3, $4, $5, $6, $7, $8, $9,
-                $10, $11, $12, $13, $14, $15, $16, $17, $18
-            )
-        """
+    async def save(self, entry: EntryLike) -> None:
         assert self._pool is not None
         async with self._pool.acquire() as conn:
-            await conn.execute(sql, *self._to_db_tuple(entry))
+            await conn.execute(self._insert_sql, *self._to_db_tuple(entry))
 
-    async def save_batch(self, entries: list[AuditEntry]) -> None:
+    async def save_batch(self, entries: list[EntryLike]) -> None:
         if not entries:
             return
-        sql = f"""
-            INSERT INTO {self.config.table_name} (
-                id, timestamp, user_id, username, ip_address, user_agent,
-                method, path, query_params, status_code, request_body,
-                response_body, duration_ms, action, resource_type,
-                resource_id, extra, error
-            ) VALUES (
-                $1, $2, $3, $4, $5, $6, $7, $8, $9,
-                $10, $11, $12, $13, $14, $15, $16, $17, $18
-            )
-        """
+        records = [self._to_db_tuple(e) for e in entries]
         assert self._pool is not None
         async with self._pool.acquire() as conn:
-            await conn.executemany(sql, [self._to_db_tuple(e) for e in entries])
+            if (
+                self._copy_min_batch is not None
+                and len(records) >= self._copy_min_batch
+            ):
+                try:
+                    await self._copy_batch(conn, records)
+                    return
+                except (
+                    asyncpg.InsufficientPrivilegeError,
+                    asyncpg.FeatureNotSupportedError,
+                ):
+                    # No temp tables for this role (or a proxy without COPY)
+                    self._copy_min_batch = None
+            await conn.executemany(self._insert_sql, records)
+
+    async def _copy_batch(
+        self, conn: asyncpg.Connection, records: list[tuple[Any, ...]]
+    ) -> None:
+        """
+        Bulk insert with binary COPY. COPY cannot skip conflicting rows, so the
+        rows go to a per-session temp table first and are moved with
+        INSERT ... SELECT ... ON CONFLICT (id) DO NOTHING.
+        """
+        async with conn.transaction():
+            await conn.execute(self._create_staging_sql)
+            await conn.copy_records_to_table(
+                self._staging_table,
+                records=records,
+                columns=ENTRY_FIELDS,
+                schema_name="pg_temp",
+            )
+            await conn.execute(self._move_staging_sql)
+
+    async def _purge_batch(self, cutoff: datetime, batch_size: int) -> int:
+        assert self._pool is not None
+        status = await self._pool.execute(self._purge_sql, cutoff, batch_size)
+        # Command tag is "DELETE <count>"
+        return int(status.split()[-1])
+
+    def _conditions(self, filters: AuditFilters, params: list[Any]) -> list[str]:
+        """SQL conditions for `filters`; values are appended to `params`."""
+        conditions = []
+
+        def add(condition: str, value: Any) -> None:
+            params.append(value)
+            conditions.append(condition.format(f"${len(params)}"))
+
+        for name in EQUALITY_FILTERS:
+            value = getattr(filters, name)
+            if value is not None:
+                add(f"{name} = {{}}", value)
+        if filters.path_prefix:
+            # Served by the (path text_pattern_ops, timestamp) index
+            add("path LIKE {}", like_prefix(filters.path_prefix))
+        if filters.status_min is not None:
+            add("status_code >= {}", filters.status_min)
+        if filters.status_max is not None:
+            add("status_code <= {}", filters.status_max)
+        if filters.since is not None:
+            add("timestamp >= {}", filters.since)
+        if filters.until is not None:
+            add("timestamp < {}", filters.until)
+        return conditions
 
     async def get_entries(
         self,
@@ -137,36 +348,187 @@ class AsyncpgStorage(AuditStorage):
         status_code: int | None = None,
         user_id: str | None = None,
         action: str | None = None,
-    ) -> list[AuditEntry]:
-        conditions = []
+        cursor: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        path_prefix: str | None = None,
+        status_min: int | None = None,
+        status_max: int | None = None,
+        resource_type: str | None = None,
+        resource_id: str | None = None,
+        fields: Sequence[str] | None = None,
+        exclude_bodies: bool = False,
+    ) -> EntryPage:
+        columns = select_fields(fields, exclude_bodies)
+        filters = AuditFilters(
+            method=method,
+            path=path,
+            path_prefix=path_prefix,
+            status_code=status_code,
+            status_min=status_min,
+            status_max=status_max,
+            user_id=user_id,
+            action=action,
+            resource_type=resource_type,
+            resource_id=resource_id,
+            since=since,
+            until=until,
+        )
         params: list[Any] = []
-
-        if method:
-            params.append(method)
-            conditions.append(f"method = ${len(params)}")
-        if path:
-            params.append(path)
-            conditions.append(f"path = ${len(params)}")
-        if status_code:
-            params.append(status_code)
-            conditions.append(f"status_code = ${len(params)}")
-        if user_id:
-            params.append(user_id)
-            conditions.append(f"user_id = ${len(params)}")
-        if action:
-            params.append(action)
-            conditions.append(f"action = ${len(params)}")
+        conditions = self._conditions(filters, params)
+        if cursor is not None:
+            # Keyset pagination: continue right after the cursor's sort key
+            params.extend(decode_cursor(cursor))
+            conditions.append(f"(timestamp, id) < (${len(params) - 1}, ${len(params)})")
 
         where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
 
         sql = f"""
-            SELECT * FROM {self.config.table_name}
+            SELECT {", ".join(columns) if columns else "*"}
+            FROM {self.config.table_name}
             {where_clause}
-            ORDER BY timestamp DESC
+            ORDER BY {self._order_by}
             LIMIT ${len(params) + 1} OFFSET ${len(params) + 2}
         """
 
         assert self._pool is not None
         async with self._pool.acquire() as conn:
-            rows = await conn.fetch(sql, *params, limit, offset)
-            return [self._from_row(row) for row in rows]
+            # One extra row tells whether there is a next page
+            rows = await conn.fetch(sql, *params, limit + 1, offset)
+            partial = columns is not None
+            return make_page([self._from_row(row, partial) for row in rows], limit)
+
+    async def get_entry(self, entry_id: UUID) -> AuditEntry | None:
+        assert self._pool is not None
+        async with self._pool.acquire() as conn:
+            row = await conn.fetchrow(
+                f"SELECT * FROM {self.config.table_name} WHERE id = $1", entry_id
+            )
+        return self._from_row(row) if row is not None else None
+
+    async def iter_entries(
+        self, filters: AuditFilters | None = None, batch_size: int = 1000
+    ) -> AsyncIterator[AuditEntry]:
+        params: list[Any] = []
+        conditions = self._conditions(filters or AuditFilters(), params)
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = (
+            f"SELECT * FROM {self.config.table_name} {where_clause} "
+            f"ORDER BY {self._order_by}"
+        )
+
+        assert self._pool is not None
+        # Server-side cursors live inside a transaction; rows are fetched
+        # `batch_size` at a time
+        async with self._pool.acquire() as conn, conn.transaction():
+            async for row in conn.cursor(sql, *params, prefetch=batch_size):
+                yield self._from_row(row)
+
+    async def _aggregate(
+        self,
+        filters: AuditFilters,
+        group_by: Sequence[GroupBy],
+        bucket: TimeBucket | None,
+        error_status: int,
+    ) -> list[StatsRow]:
+        params: list[Any] = []
+        conditions = self._conditions(filters, params)
+        params.append(error_status)
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        keys: list[str] = list(group_by)
+        if bucket is not None:
+            keys.insert(0, f"date_trunc('{bucket}', timestamp AT TIME ZONE 'UTC')")
+        measures = [
+            "count(*)",
+            f"count(*) FILTER (WHERE status_code >= ${len(params)})",
+            "avg(duration_ms)",
+            "percentile_cont(ARRAY[0.5, 0.95, 0.99]) "
+            "WITHIN GROUP (ORDER BY duration_ms)",
+        ]
+        group_clause = f"GROUP BY {', '.join(keys)}" if keys else ""
+        sql = (
+            f"SELECT {', '.join([*keys, *measures])} "
+            f"FROM {self.config.table_name} {where_clause} {group_clause}"
+        )
+
+        assert self._pool is not None
+        async with self._pool.acquire() as conn:
+            rows = await conn.fetch(sql, *params)
+
+        width = len(keys)
+        result = []
+        for row in rows:
+            values = list(row.values())
+            key, (count, errors, avg, percentiles) = values[:width], values[width:]
+            result.append(
+                StatsRow.build(
+                    key.pop(0) if bucket is not None else None,
+                    dict(zip(group_by, key, strict=True)),
+                    count,
+                    errors,
+                    avg,
+                    percentiles or (None, None, None),
+                )
+            )
+        return sort_rows(result)
+
+    async def save_rollups(self, rows: list[dict[str, Any]]) -> None:
+        if not rows:
+            return
+        assert self._pool is not None
+        async with self._pool.acquire() as conn:
+            await conn.executemany(
+                self._rollup_sql,
+                [tuple(row[name] for name in ROLLUP_COLUMNS) for row in rows],
+            )
+
+    async def stored_ids(self, ids: Sequence[UUID]) -> set[UUID]:
+        assert self._pool is not None
+        rows = await self._pool.fetch(
+            f"SELECT id FROM {self.config.table_name} WHERE id = ANY($1::uuid[])",
+            list(ids),
+        )
+        return {row["id"] for row in rows}
+
+    async def _aggregate_rollups(
+        self,
+        filters: AuditFilters,
+        group_by: Sequence[GroupBy],
+        bucket: TimeBucket | None,
+        error_status: int,
+    ) -> list[StatsRow]:
+        params: list[Any] = []
+        conditions = []
+        for condition, value in (
+            ("method =", filters.method),
+            ("bucket >=", filters.since),
+            ("bucket <", filters.until),
+        ):
+            if value is not None:
+                params.append(value)
+                conditions.append(f"{condition} ${len(params)}")
+        params.append(error_status // 100)
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        keys: list[str] = list(group_by)
+        if bucket == "day":
+            keys.insert(0, "date_trunc('day', bucket AT TIME ZONE 'UTC')")
+        elif bucket == "hour":
+            keys.insert(0, "bucket")
+        sums = [
+            "sum(requests)",
+            f"sum(requests) FILTER (WHERE status_class >= ${len(params)})",
+            "sum(duration_sum)",
+            *(f"sum({name})" for name in HISTOGRAM_COLUMNS),
+        ]
+        group_clause = f"GROUP BY {', '.join(keys)}" if keys else ""
+        sql = (
+            f"SELECT {', '.join([*keys, *sums])} "
+            f"FROM {self._rollup_table} {where_clause} {group_clause}"
+        )
+
+        assert self._pool is not None
+        async with self._pool.acquire() as conn:
+            rows = await conn.fetch(sql, *params)
+        return rollup_stats_rows([list(row.values()) for row in rows], group_by, bucket)
@@ -1,14 +1,51 @@
+import time
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Sequence
+from datetime import datetime
+from typing import Any
+from uuid import UUID
 
-from ..models import AuditEntry
+from ..models import AuditEntry, EntryLike
+from ..query import AuditFilters
+from ..retention import PurgeResult, RetentionTask
+from ..rollups import rollups_cover
+from ..stats import (
+    GroupBy,
+    StatsRow,
+    TimeBucket,
+    aggregate_entries,
+    check_aggregate,
+    sort_rows,
+)
+from ..writer import BatchWriter
 
 
 class AuditStorage(ABC):
+    config: Any = None
+    _writer: BatchWriter | None = None
+    _retention: RetentionTask | None = None
+
+    @property
+    def writer(self) -> BatchWriter:
+        """The batching writer that buffers entries in front of `save_batch()`."""
+        if self._writer is None:
+            self._writer = BatchWriter.from_config(self, self.config)
+        return self._writer
+
+    async def write(self, entry: EntryLike) -> None:
+        """
+        Persist an entry through the batching writer.
+        Equivalent to `save()` when batching is disabled (batch_size <= 1).
+        """
+        await self.writer.submit(entry)
+
     @abstractmethod
-    async def save(self, entry: AuditEntry) -> None: ...
+    async def save(self, entry: EntryLike) -> None:
+        """Write one entry. Accepts an `AuditEntry` or an internal `AuditRecord`."""
+        ...
 
     @abstractmethod
-    async def save_batch(self, entries: list[AuditEntry]) -> None: ...
+    async def save_batch(self, entries: list[EntryLike]) -> None: ...
 
     @abstractmethod
     async def get_entries(
@@ -20,10 +57,184 @@ class AuditStorage(ABC):
         status_code: int | None = None,
         user_id: str | None = None,
         action: str | None = None,
+        cursor: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        path_prefix: str | None = None,
+        status_min: int | None = None,
+        status_max: int | None = None,
+        resource_type: str | None = None,
+        resource_id: str | None = None,
+        fields: Sequence[str] | None = None,
+        exclude_bodies: bool = False,
     ) -> list[AuditEntry]:
-        """Retrieve audit entries with filtering."""
+        """
+        Retrieve audit entries with filtering, newest first.
+        Filters combine with AND and mean what `AuditFilters` documents.
+        Built-in backends return an `EntryPage`; pass its `next_cursor` back as
+        `cursor` to fetch the following page at constant cost (keyset
+        pagination over (timestamp, id)). `offset` still works but gets slower
+        the deeper it goes.
+        `fields` reads only the named columns (plus id and timestamp) and
+        `exclude_bodies=True` skips the request and response bodies; the other
+        fields of the returned entries are unset (see `partial_entry()`).
+        """
         ...
 
+    async def get_entry(self, entry_id: UUID) -> AuditEntry | None:
+        """
+        Fetch one complete entry by id, or None if it does not exist.
+        Built-in backends look the id up by primary key; this fallback scans
+        `iter_entries()`, so custom storages should override it.
+        """
+        async for entry in self.iter_entries():
+            if entry.id == entry_id:
+                return entry
+        return None
+
+    async def iter_entries(
+        self, filters: AuditFilters | None = None, batch_size: int = 1000
+    ) -> AsyncIterator[AuditEntry]:
+        """
+        Yield every entry matching `filters`, newest first, with about
+        `batch_size` rows in memory at a time. Built-in backends stream from a
+        server-side cursor; this fallback walks keyset pages of `get_entries()`.
+        """
+        params = (filters or AuditFilters()).model_dump()
+        cursor = None
+        while True:
+            page = await self.get_entries(limit=batch_size, cursor=cursor, **params)
+            for entry in page:
+                yield entry
+            cursor = getattr(page, "next_cursor", None)
+            if cursor is None:
+                return
+
+    async def aggregate(
+        self,
+        filters: AuditFilters | None = None,
+        group_by: Sequence[GroupBy] = (),
+        bucket: TimeBucket | None = None,
+        error_status: int = 500,
+    ) -> list[StatsRow]:
+        """
+        Count entries, errors (status_code >= `error_status`) and duration
+        statistics per `group_by` value and time `bucket`, oldest bucket first.
+        With `rollups` enabled, queries the rollup table can answer (hour or
+        day buckets, grouped by route and/or method) read it instead of the
+        entries; grouping by route requires it.
+        """
+        filters = filters or AuditFilters()
+        group_by = check_aggregate(group_by, bucket)
+        if (
+            self.config is not None
+            and self.config.rollups
+            and rollups_cover(filters, group_by, bucket, error_status)
+        ):
+            return sort_rows(
+                await self._aggregate_rollups(filters, group_by, bucket, error_status)
+            )
+        if "route" in group_by:
+            raise ValueError(
+                "Grouping by route needs rollups enabled and an hour or day "
+                "query they cover"
+            )
+        return await self._aggregate(filters, group_by, bucket, error_status)
+
+    async def _aggregate(
+        self,
+        filters: AuditFilters,
+        group_by: Sequence[GroupBy],
+        bucket: TimeBucket | None,
+        error_status: int,
+    ) -> list[StatsRow]:
+        """
+        Aggregate the entries themselves. Built-in backends compute this in
+        the database (Tortoise only on SQLite, MySQL and PostgreSQL); this
+        fallback aggregates the `iter_entries()` stream in Python.
+        """
+        return await aggregate_entries(
+            self.iter_entries(filters), group_by, bucket, error_status
+        )
+
+    # Rollups: a backend that supports `rollups=True` overrides save_rollups,
+    # _aggregate_rollups and stored_ids; the defaults reject them
+
+    async def save_rollups(self, rows: list[dict[str, Any]]) -> None:
+        """Add the counters of `rollup_rows()` to the rollup table (upsert)."""
+        raise NotImplementedError(f"{type(self).__name__} does not support rollups")
+
+    async def stored_ids(self, ids: Sequence[UUID]) -> set[UUID]:
+        """
+        Which of `ids` are already stored. Spool replays leave those out of
+        the rollups, since the idempotent insert skips them.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support rollups")
+
+    async def _aggregate_rollups(
+        self,
+        filters: AuditFilters,
+        group_by: Sequence[GroupBy],
+        bucket: TimeBucket | None,
+        error_status: int,
+    ) -> list[StatsRow]:
+        """Answer an `aggregate()` query that `rollups_cover()` from the rollups."""
+        raise NotImplementedError(f"{type(self).__name__} does not support rollups")
+
+    async def purge_older_than(
+        self, cutoff: datetime, batch_size: int = 5000
+    ) -> PurgeResult:
+        """
+        Delete entries with a timestamp before `cutoff`.
+        Rows go in chunks of at most `batch_size`, each its own short statement
+        driven by the timestamp index, until a chunk comes back short.
+        """
+        started = time.perf_counter()
+        result = PurgeResult()
+        while True:
+            deleted = await self._purge_batch(cutoff, batch_size)
+            if deleted:
+                result.deleted += deleted
+                result.batches += 1
+            if deleted < batch_size:
+                break
+        result.duration_ms = (time.perf_counter() - started) * 1000
+        return result
+
+    async def _purge_batch(self, cutoff: datetime, batch_size: int) -> int:
+        """
+        Delete at most `batch_size` entries older than `cutoff`; return the count.
+        Backends override it to support `purge_older_than()` and retention;
+        the default rejects them.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support purging")
+
+    def start_retention(self) -> None:
+        """
+        Start the scheduled purge if `retention_days` and `retention_interval`
+        are set.
+        """
+        config = self.config
+        if (
+            config is None
+            or config.retention_days is None
+            or config.retention_interval is None
+            or self._retention is not None
+        ):
+            return
+        self._retention = RetentionTask(
+            self.purge_older_than,
+            config.retention_days,
+            interval=config.retention_interval,
+            batch_size=config.retention_batch_size,
+        )
+        self._retention.start()
+
+    async def stop_retention(self) -> None:
+        retention, self._retention = self._retention, None
+        if retention is not None:
+            await retention.stop()
+
     @abstractmethod
     async def startup(self) -> None:
         """
@@ -31,6 +242,7 @@ class AuditStorage(ABC):
         - Create engine/session/connection pool
         - Run CREATE TABLE IF NOT EXISTS if auto_create_table=True
         - Validate connectivity (run a simple SELECT 1)
+        - Start the batching writer and the scheduled retention purge
         """
         ...
 
@@ -38,7 +250,7 @@ class AuditStorage(ABC):
     async def shutdown(self) -> None:
         """
         Called once at app shutdown.
-        - Flush any pending batch entries
+        - Stop the retention purge and flush any pending batch entries
         - Close connection pool / engine
         """
         ...
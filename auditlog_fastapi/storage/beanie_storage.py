@@ -1,18 +1,47 @@
+import contextlib
+import re
+from collections.abc import AsyncIterator, Sequence
+from datetime import datetime
 from typing import Any, cast
+from uuid import UUID
 
 from beanie import init_beanie
+from beanie.operators import GTE, LTE, And, In, Or, RegEx
 from motor.motor_asyncio import AsyncIOMotorClient
+from pydantic import BaseModel, Field
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 
-from ..db.beanie_document import AuditLogDocument
+from ..db.beanie_document import AuditLogDocument, audit_indexes, projection_model
 from ..exceptions import AuditStorageConnectionError
-from ..models import AuditEntry
+from ..models import AuditEntry, EntryLike, entry_values, partial_entry, select_fields
+from ..pagination import EntryPage, decode_cursor, make_page
+from ..query import EQUALITY_FILTERS, AuditFilters
+from ..rollups import (
+    COUNTER_COLUMNS,
+    HISTOGRAM_COLUMNS,
+    ROLLUP_KEY,
+    rollup_stats_rows,
+    rollup_table_name,
+)
+from ..stats import PERCENTILES, GroupBy, StatsRow, TimeBucket, sort_rows
 from .base import AuditStorage
 
+_DUPLICATE_KEY = 11000
+
+
+class _DocumentId(BaseModel):
+    id: UUID = Field(alias="_id")
+
 
 class BeanieStorage(AuditStorage):
     def __init__(self, config: Any):
         self.config = config
         self.client: AsyncIOMotorClient[Any] | None = None
+        # Newest first. Not by _id alone even with uuid7: older documents (or
+        # ids generated elsewhere) may be random uuid4 values
+        self._ordering = ("-timestamp", "-_id")
+        self._rollups: Any = None
 
     async def startup(self) -> None:
         try:
@@ -22,28 +51,106 @@ class BeanieStorage(AuditStorage):
 
             assert self.client is not None
             db = self.client[self.config.mongodb_database]
+
+            # Retention is a TTL index on timestamp; MongoDB removes expired
+            # documents in the background, so no purge task is scheduled
+            ttl_seconds = (
+                self.config.retention_days * 86400
+                if self.config.retention_days is not None
+                else None
+            )
+            AuditLogDocument.Settings.indexes = audit_indexes(ttl_seconds)
+            if ttl_seconds is not None:
+                # An existing plain (or differently timed) timestamp index is
+                # converted in place; creating it again with new options fails
+                with contextlib.suppress(OperationFailure):
+                    await db.command(
+                        {
+                            "collMod": self.config.table_name,
+                            "index": {
+                                "keyPattern": {"timestamp": 1},
+                                "expireAfterSeconds": ttl_seconds,
+                            },
+                        }
+                    )
             await init_beanie(
                 database=cast(Any, db),
                 document_models=[AuditLogDocument],
             )
+            if self.config.rollups:
+                # Plain collection updated with $inc; the unique key lets
+                # concurrent upserts of a new row from several workers converge
+                self._rollups = db[rollup_table_name(self.config.table_name)]
+                await self._rollups.create_index(
+                    [(name, 1) for name in ROLLUP_KEY], unique=True
+                )
         except Exception as e:
             raise AuditStorageConnectionError(
                 f"Failed to connect to Beanie backend: {e}"
             ) from e
 
+        await self.writer.start()
+
     async def shutdown(self) -> None:
+        await self.writer.close()
         if self.client:
             self.client.close()
 
-    async def save(self, entry: AuditEntry) -> None:
-        doc = AuditLogDocument(**entry.model_dump())
-        await doc.insert()
+    async def save(self, entry: EntryLike) -> None:
+        doc = AuditLogDocument(**entry_values(entry))
+        # An entry that was already written (retry, spool replay) is skipped
+        with contextlib.suppress(DuplicateKeyError):
+            await doc.insert()
 
-    async def save_batch(self, entries: list[AuditEntry]) -> None:
+    async def save_batch(self, entries: list[EntryLike]) -> None:
         if not entries:
             return
-        docs = [AuditLogDocument(**e.model_dump()) for e in entries]
-        await AuditLogDocument.insert_many(docs)
+        docs = [AuditLogDocument(**entry_values(e)) for e in entries]
+        # Unordered so one duplicate id does not stop the rest of the batch;
+        # duplicates (already written by a retry or replay) are ignored
+        try:
+            await AuditLogDocument.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != _DUPLICATE_KEY for error in errors):
+                raise
+
+    async def _purge_batch(self, cutoff: datetime, batch_size: int) -> int:
+        docs = (
+            await AuditLogDocument.find(AuditLogDocument.timestamp < cutoff)
+            .limit(batch_size)
+            .project(_DocumentId)
+            .to_list()
+        )
+        if not docs:
+            return 0
+        result = await AuditLogDocument.find(
+            In(AuditLogDocument.id, [doc.id for doc in docs])
+        ).delete()
+        return result.deleted_count if result is not None else 0
+
+    @staticmethod
+    def _expressions(filters: AuditFilters) -> list[Any]:
+        """Beanie query expressions for `filters`."""
+        expressions: list[Any] = [
+            getattr(AuditLogDocument, name) == getattr(filters, name)
+            for name in EQUALITY_FILTERS
+            if getattr(filters, name) is not None
+        ]
+        if filters.path_prefix:
+            # An anchored, case-sensitive regex is an index range scan
+            expressions.append(
+                RegEx(AuditLogDocument.path, f"^{re.escape(filters.path_prefix)}")
+            )
+        if filters.status_min is not None:
+            expressions.append(GTE(AuditLogDocument.status_code, filters.status_min))
+        if filters.status_max is not None:
+            expressions.append(LTE(AuditLogDocument.status_code, filters.status_max))
+        if filters.since is not None:
+            expressions.append(AuditLogDocument.timestamp >= filters.since)
+        if filters.until is not None:
+            expressions.append(AuditLogDocument.timestamp < filters.until)
+        return expressions
 
     async def get_entries(
         self,
@@ -54,19 +161,194 @@ class BeanieStorage(AuditStorage):
         status_code: int | None = None,
         user_id: str | None = None,
         action: str | None = None,
-    ) -> list[AuditEntry]:
-        query = AuditLogDocument.find_all()
-
-        if method:
-            query = query.find(AuditLogDocument.method == method)
-        if path:
-            query = query.find(AuditLogDocument.path == path)
-        if status_code:
-            query = query.find(AuditLogDocument.status_code == status_code)
-        if user_id:
-            query = query.find(AuditLogDocument.user_id == user_id)
-        if action:
-            query = query.find(AuditLogDocument.action == action)
-
-        docs = await query.sort("-timestamp").skip(offset).limit(limit).to_list()
-        return [AuditEntry.model_validate(doc.model_dump()) for doc in docs]
+        cursor: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        path_prefix: str | None = None,
+        status_min: int | None = None,
+        status_max: int | None = None,
+        resource_type: str | None = None,
+        resource_id: str | None = None,
+        fields: Sequence[str] | None = None,
+        exclude_bodies: bool = False,
+    ) -> EntryPage:
+        columns = select_fields(fields, exclude_bodies)
+        filters = AuditFilters(
+            method=method,
+            path=path,
+            path_prefix=path_prefix,
+            status_code=status_code,
+            status_min=status_min,
+            status_max=status_max,
+            user_id=user_id,
+            action=action,
+            resource_type=resource_type,
+            resource_id=resource_id,
+            since=since,
+            until=until,
+        )
+        query = AuditLogDocument.find(*self._expressions(filters))
+        if cursor is not None:
+            # Keyset pagination: continue right after the cursor's sort key
+            timestamp, entry_id = decode_cursor(cursor)
+            query = query.find(
+                Or(
+                    AuditLogDocument.timestamp < timestamp,
+                    And(
+                        AuditLogDocument.timestamp == timestamp,
+                        AuditLogDocument.id < entry_id,
+                    ),
+                )
+            )
+
+        # One extra document tells whether there is a next page
+        query = query.sort(*self._ordering).skip(offset).limit(limit + 1)
+        if columns:
+            # Unselected fields never leave the server
+            projected = await query.project(projection_model(columns)).to_list()
+            return make_page(
+                [partial_entry(doc.model_dump()) for doc in projected], limit
+            )
+        docs = await query.to_list()
+        return make_page(
+            [AuditEntry.model_validate(doc.model_dump()) for doc in docs], limit
+        )
+
+    async def get_entry(self, entry_id: UUID) -> AuditEntry | None:
+        doc = await AuditLogDocument.get(entry_id)
+        return AuditEntry.model_validate(doc.model_dump()) if doc is not None else None
+
+    async def iter_entries(
+        self, filters: AuditFilters | None = None, batch_size: int = 1000
+    ) -> AsyncIterator[AuditEntry]:
+        query = AuditLogDocument.find(
+            *self._expressions(filters or AuditFilters()), batch_size=batch_size
+        ).sort(*self._ordering)
+        # Iterates the driver cursor, fetching `batch_size` documents per trip
+        async for doc in query:
+            yield AuditEntry.model_validate(doc.model_dump())
+
+    async def _aggregate(
+        self,
+        filters: AuditFilters,
+        group_by: Sequence[GroupBy],
+        bucket: TimeBucket | None,
+        error_status: int,
+    ) -> list[StatsRow]:
+        group_id: dict[str, Any] = {field: f"${field}" for field in group_by}
+        if bucket is not None:
+            group_id["_bucket"] = {"$dateTrunc": {"date": "$timestamp", "unit": bucket}}
+        # $dateTrunc needs MongoDB 5.0 and $percentile 7.0, the floor for stats
+        pipeline = [
+            {
+                "$group": {
+                    "_id": group_id,
+                    "count": {"$sum": 1},
+                    "errors": {
+                        "$sum": {
+                            "$cond": [{"$gte": ["$status_code", error_status]}, 1, 0]
+                        }
+                    },
+                    "avg": {"$avg": "$duration_ms"},
+                    "percentiles": {
+                        "$percentile": {
+                            "input": "$duration_ms",
+                            "p": list(PERCENTILES),
+                            "method": "approximate",
+                        }
+                    },
+                }
+            }
+        ]
+        # The filters become the pipeline's leading $match
+        docs = (
+            await AuditLogDocument.find(*self._expressions(filters))
+            .aggregate(pipeline)
+            .to_list()
+        )
+        return sort_rows(
+            [
+                StatsRow.build(
+                    doc["_id"].get("_bucket"),
+                    {field: doc["_id"].get(field) for field in group_by},
+                    doc["count"],
+                    doc["errors"],
+                    doc["avg"],
+                    doc["percentiles"] or (None, None, None),
+                )
+                for doc in docs
+            ]
+        )
+
+    async def save_rollups(self, rows: list[dict[str, Any]]) -> None:
+        if not rows:
+            return
+        await self._rollups.bulk_write(
+            [
+                UpdateOne(
+                    {name: row[name] for name in ROLLUP_KEY},
+                    {"$inc": {name: row[name] for name in COUNTER_COLUMNS}},
+                    upsert=True,
+                )
+                for row in rows
+            ],
+            ordered=False,
+        )
+
+    async def stored_ids(self, ids: Sequence[UUID]) -> set[UUID]:
+        docs = (
+            await AuditLogDocument.find(In(AuditLogDocument.id, list(ids)))
+            .project(_DocumentId)
+            .to_list()
+        )
+        return {doc.id for doc in docs}
+
+    async def _aggregate_rollups(
+        self,
+        filters: AuditFilters,
+        group_by: Sequence[GroupBy],
+        bucket: TimeBucket | None,
+        error_status: int,
+    ) -> list[StatsRow]:
+        match: dict[str, Any] = {}
+        if filters.method is not None:
+            match["method"] = filters.method
+        if filters.since is not None:
+            match.setdefault("bucket", {})["$gte"] = filters.since
+        if filters.until is not None:
+            match.setdefault("bucket", {})["$lt"] = filters.until
+
+        group_id: dict[str, Any] = {field: f"${field}" for field in group_by}
+        if bucket == "day":
+            group_id["_bucket"] = {"$dateTrunc": {"date": "$bucket", "unit": "day"}}
+        elif bucket == "hour":
+            group_id["_bucket"] = "$bucket"
+        sums: dict[str, Any] = {name: {"$sum": f"${name}"} for name in COUNTER_COLUMNS}
+        sums["errors"] = {
+            "$sum": {
+                "$cond": [
+                    {"$gte": ["$status_class", error_status // 100]},
+                    "$requests",
+                    0,
+                ]
+            }
+        }
+        pipeline = [{"$match": match}, {"$group": {"_id": group_id, **sums}}]
+        docs = await self._rollups.aggregate(pipeline).to_list(None)
+
+        keys = ["_bucket"] if bucket is not None else []
+        keys += group_by
+        return rollup_stats_rows(
+            [
+                [
+                    *(doc["_id"].get(key) for key in keys),
+                    doc["requests"],
+                    doc["errors"],
+                    doc["duration_sum"],
+                    *(doc[name] for name in HISTOGRAM_COLUMNS),
+                ]
+                for doc in docs
+            ],
+            group_by,
+            bucket,
+        )
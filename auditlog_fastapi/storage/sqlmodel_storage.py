@@ -1,24 +1,44 @@
 import contextlib
-import json
+from collections.abc import AsyncIterator, Sequence
+from datetime import datetime
 from typing import Any, cast
+from uuid import UUID
 
-from sqlalchemy import insert, text
+from sqlalchemy import Insert, Table, text, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlmodel import SQLModel, select
 
+from ..codec import get_codec
+from ..db.sqlalchemy_table import (
+    aggregate_statements,
+    filter_conditions,
+    idempotent_insert,
+    make_rollup_table,
+    purge_statement,
+    rollup_statement,
+    rollup_upsert,
+    stats_rows,
+)
 from ..db.sqlmodel_model import make_sqlmodel_table
 from ..exceptions import AuditStorageConnectionError
-from ..models import AuditEntry
+from ..models import AuditEntry, EntryLike, entry_values, partial_entry, select_fields
+from ..pagination import EntryPage, decode_cursor, make_page
+from ..query import AuditFilters
+from ..rollups import rollup_stats_rows
+from ..stats import GroupBy, StatsRow, TimeBucket, sort_rows
 from .base import AuditStorage
 
 
 class SQLModelStorage(AuditStorage):
     def __init__(self, config: Any):
         self.config = config
+        self.codec = get_codec(config.json_codec)
 
         # SQLite doesn't support pool_size, max_overflow, pool_timeout in the same way
         engine_kwargs = {
             "echo": config.sqlalchemy_echo,
+            "json_serializer": self.codec.dumps,
+            "json_deserializer": self.codec.loads,
         }
 
         if not config.dsn.startswith("sqlite"):
@@ -34,6 +54,9 @@ class SQLModelStorage(AuditStorage):
         self.SessionLocal = async_sessionmaker(
             bind=self.engine, expire_on_commit=False, class_=AsyncSession
         )
+        self._insert: Insert | None = None
+        self._rollups: Table | None = None
+        self._rollup_upsert: Insert | None = None
         self.AuditLog: type[SQLModel] | None = None
 
     async def startup(self) -> None:
@@ -42,6 +65,14 @@ class SQLModelStorage(AuditStorage):
                 await conn.execute(text("SELECT 1"))
 
             self.AuditLog = make_sqlmodel_table(self.config.table_name)
+            self._insert = idempotent_insert(self.AuditLog, self.engine.dialect.name)
+            if self.config.rollups:
+                self._rollups = make_rollup_table(
+                    self.config.table_name, SQLModel.metadata
+                )
+                self._rollup_upsert = rollup_upsert(
+                    self._rollups, self.engine.dialect.name
+                )
 
             if self.config.auto_create_table:
                 async with self.engine.begin() as conn:
@@ -51,44 +82,70 @@ class SQLModelStorage(AuditStorage):
                 f"Failed to connect to SQLModel backend: {e}"
             ) from e
 
+        await self.writer.start()
+        self.start_retention()
+
     async def shutdown(self) -> None:
+        await self.stop_retention()
+        await self.writer.close()
         await self.engine.dispose()
 
-    def _to_db_dict(self, entry: AuditEntry) -> dict[str, Any]:
-        data = entry.model_dump()
+    def _to_db_dict(self, entry: EntryLike) -> dict[str, Any]:
+        data = entry_values(entry)
         # SQLModel uses str | None for JSON fields, so we must serialize
         for field in ["query_params", "request_body", "response_body", "extra"]:
             if data.get(field) is not None:
-                data[field] = json.dumps(data[field])
+                data[field] = self.codec.dumps(data[field])
         return data
 
     def _from_db_model(self, db_entry: Any) -> AuditEntry:
-        data = db_entry.model_dump()
+        return self._from_db_dict(db_entry.model_dump())
+
+    def _from_db_dict(self, data: dict[str, Any], partial: bool = False) -> AuditEntry:
         for field in ["query_params", "request_body", "response_body", "extra"]:
             if isinstance(data.get(field), str):
                 with contextlib.suppress(Exception):
-                    data[field] = json.loads(data[field])
-        return AuditEntry.model_validate(data)
+                    data[field] = self.codec.loads(data[field])
+        return partial_entry(data) if partial else AuditEntry.model_validate(data)
 
-    async def save(self, entry: AuditEntry) -> None:
-        assert self.AuditLog is not None
+    def _ordering(self, audit_log_cls: Any) -> tuple[Any, ...]:
+        """Newest first; ids alone are not time-ordered unless every one is uuid7."""
+        return (audit_log_cls.timestamp.desc(), audit_log_cls.id.desc())
+
+    def _after(self, audit_log_cls: Any, cursor: str) -> Any:
+        """Keyset condition selecting the rows that sort after `cursor`."""
+        timestamp, entry_id = decode_cursor(cursor)
+        return tuple_(audit_log_cls.timestamp, audit_log_cls.id) < tuple_(
+            timestamp, entry_id
+        )
+
+    async def save(self, entry: EntryLike) -> None:
+        assert self._insert is not None
         async with self.SessionLocal() as session:
             async with session.begin():
-                db_entry = self.AuditLog(**self._to_db_dict(entry))
-                session.add(db_entry)
+                await session.execute(self._insert, [self._to_db_dict(entry)])
             await session.commit()
 
-    async def save_batch(self, entries: list[AuditEntry]) -> None:
+    async def save_batch(self, entries: list[EntryLike]) -> None:
         if not entries:
             return
-        assert self.AuditLog is not None
+        assert self._insert is not None
         async with self.SessionLocal() as session:
             async with session.begin():
                 await session.execute(
-                    insert(self.AuditLog), [self._to_db_dict(e) for e in entries]
+                    self._insert, [self._to_db_dict(e) for e in entries]
                 )
             await session.commit()
 
+    async def _purge_batch(self, cutoff: datetime, batch_size: int) -> int:
+        assert self.AuditLog is not None
+        stmt = purge_statement(
+            self.AuditLog, self.engine.dialect.name, cutoff, batch_size
+        )
+        async with self.engine.begin() as conn:
+            result = await conn.execute(stmt)
+            return int(result.rowcount)
+
     async def get_entries(
         self,
         limit: int = 100,
@@ -98,23 +155,137 @@ class SQLModelStorage(AuditStorage):
         status_code: int | None = None,
         user_id: str | None = None,
         action: str | None = None,
-    ) -> list[AuditEntry]:
+        cursor: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        path_prefix: str | None = None,
+        status_min: int | None = None,
+        status_max: int | None = None,
+        resource_type: str | None = None,
+        resource_id: str | None = None,
+        fields: Sequence[str] | None = None,
+        exclude_bodies: bool = False,
+    ) -> EntryPage:
         assert self.AuditLog is not None
         audit_log_cls = cast(Any, self.AuditLog)
+        columns = select_fields(fields, exclude_bodies)
+        filters = AuditFilters(
+            method=method,
+            path=path,
+            path_prefix=path_prefix,
+            status_code=status_code,
+            status_min=status_min,
+            status_max=status_max,
+            user_id=user_id,
+            action=action,
+            resource_type=resource_type,
+            resource_id=resource_id,
+            since=since,
+            until=until,
+        )
+        conditions = filter_conditions(audit_log_cls, filters, self.engine.dialect.name)
+        async with self.SessionLocal() as session:
+            stmt: Any = (
+                select(*(getattr(audit_log_cls, name) for name in columns))
+                if columns
+                else select(audit_log_cls)
+            )
+            stmt = stmt.where(*conditions).order_by(*self._ordering(audit_log_cls))
+            if cursor is not None:
+                stmt = stmt.where(self._after(audit_log_cls, cursor))
+
+            # One extra row tells whether there is a next page
+            result = await session.execute(stmt.limit(limit + 1).offset(offset))
+            if columns:
+                rows = result.mappings().all()
+                entries = [self._from_db_dict(dict(row), partial=True) for row in rows]
+            else:
+                entries = [self._from_db_model(e) for e in result.scalars().all()]
+            return make_page(entries, limit)
+
+    async def get_entry(self, entry_id: UUID) -> AuditEntry | None:
+        assert self.AuditLog is not None
         async with self.SessionLocal() as session:
-            stmt = select(audit_log_cls).order_by(audit_log_cls.timestamp.desc())
-
-            if method:
-                stmt = stmt.where(audit_log_cls.method == method)
-            if path:
-                stmt = stmt.where(audit_log_cls.path == path)
-            if status_code:
-                stmt = stmt.where(audit_log_cls.status_code == status_code)
-            if user_id:
-                stmt = stmt.where(audit_log_cls.user_id == user_id)
-            if action:
-                stmt = stmt.where(audit_log_cls.action == action)
-
-            result = await session.execute(stmt.limit(limit).offset(offset))
-            db_entries = result.scalars().all()
-            return [self._from_db_model(e) for e in db_entries]
+            db_entry = await session.get(self.AuditLog, entry_id)
+        return self._from_db_model(db_entry) if db_entry is not None else None
+
+    async def iter_entries(
+        self, filters: AuditFilters | None = None, batch_size: int = 1000
+    ) -> AsyncIterator[AuditEntry]:
+        assert self.AuditLog is not None
+        audit_log_cls = cast(Any, self.AuditLog)
+        conditions = filter_conditions(
+            audit_log_cls, filters or AuditFilters(), self.engine.dialect.name
+        )
+        stmt = (
+            select(audit_log_cls)
+            .where(*conditions)
+            .order_by(*self._ordering(audit_log_cls))
+            # Server-side cursor, fetching `batch_size` rows at a time
+            .execution_options(yield_per=batch_size)
+        )
+        async with self.SessionLocal() as session:
+            result = await session.stream_scalars(stmt)
+            async for db_entry in result:
+                yield self._from_db_model(db_entry)
+
+    async def _aggregate(
+        self,
+        filters: AuditFilters,
+        group_by: Sequence[GroupBy],
+        bucket: TimeBucket | None,
+        error_status: int,
+    ) -> list[StatsRow]:
+        assert self.AuditLog is not None
+        stmt, percentile_stmt = aggregate_statements(
+            cast(Any, self.AuditLog),
+            filters,
+            group_by,
+            bucket,
+            error_status,
+            self.engine.dialect.name,
+        )
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(stmt)).all()
+            percentile_rows = (
+                (await conn.execute(percentile_stmt)).all()
+                if percentile_stmt is not None
+                else None
+            )
+        return sort_rows(stats_rows(rows, percentile_rows, group_by, bucket))
+
+    async def save_rollups(self, rows: list[dict[str, Any]]) -> None:
+        if not rows:
+            return
+        assert self._rollup_upsert is not None
+        async with self.engine.begin() as conn:
+            await conn.execute(self._rollup_upsert, rows)
+
+    async def stored_ids(self, ids: Sequence[UUID]) -> set[UUID]:
+        assert self.AuditLog is not None
+        audit_log_cls = cast(Any, self.AuditLog)
+        async with self.SessionLocal() as session:
+            result = await session.execute(
+                select(audit_log_cls.id).where(audit_log_cls.id.in_(list(ids)))
+            )
+            return {UUID(str(key)) for key in result.scalars()}
+
+    async def _aggregate_rollups(
+        self,
+        filters: AuditFilters,
+        group_by: Sequence[GroupBy],
+        bucket: TimeBucket | None,
+        error_status: int,
+    ) -> list[StatsRow]:
+        assert self._rollups is not None
+        stmt = rollup_statement(
+            self._rollups,
+            filters,
+            group_by,
+            bucket,
+            error_status,
+            self.engine.dialect.name,
+        )
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(stmt)).all()
+        return rollup_stats_rows(rows, group_by, bucket)
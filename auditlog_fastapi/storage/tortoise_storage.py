@@ -1,31 +1,61 @@
-from collections.abc import Iterable
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+from inspect import signature
 from typing import Any
+from uuid import UUID
 
 from tortoise import Tortoise
+from tortoise.expressions import Q
 from tortoise.models import Model
 
-from ..db.tortoise_model import make_tortoise_model
+from ..codec import get_codec
+from ..db.tortoise_model import make_tortoise_model, models_module
 from ..exceptions import AuditStorageConnectionError
-from ..models import AuditEntry
+from ..models import AuditEntry, EntryLike, entry_values, partial_entry, select_fields
+from ..pagination import EntryPage, decode_cursor, make_page
+from ..query import EQUALITY_FILTERS, AuditFilters, like_prefix, prefix_upper_bound
+from ..stats import (
+    BUCKET_FORMATS,
+    PERCENTILES,
+    GroupBy,
+    StatsRow,
+    TimeBucket,
+    sort_rows,
+)
 from .base import AuditStorage
 
 
 class TortoiseStorage(AuditStorage):
     def __init__(self, config: Any):
         self.config = config
+        self.codec = get_codec(config.json_codec)
+        # Newest first. Not by id alone even with uuid7: older rows (or ids
+        # generated elsewhere) may be random uuid4 values
+        self._ordering = ("-timestamp", "-id")
         self.AuditLog: type[Model] | None = None
+        self._dialect = ""
+        self._driver = ""
 
     async def startup(self) -> None:
         try:
+            # The model must exist before init, which binds it to the connection
+            self.AuditLog = make_tortoise_model(self.config.table_name, self.codec)
             # Use Mapping to fix variance issues
             modules: dict[str, Iterable[str | Any]] = {
-                "audit": ["auditlog_fastapi.db.tortoise_model"]
+                "audit": [models_module(self.AuditLog)]
             }
             if self.config.tortoise_modules:
                 modules.update(self.config.tortoise_modules)
 
-            await Tortoise.init(db_url=self.config.dsn, modules=modules)
-            self.AuditLog = make_tortoise_model(self.config.table_name)
+            options: dict[str, Any] = {}
+            if "_enable_global_fallback" in signature(Tortoise.init).parameters:
+                # Tortoise 1.x keeps its connections in a context variable, but
+                # requests and shutdown run in other tasks than startup
+                options["_enable_global_fallback"] = True
+            await Tortoise.init(db_url=self.config.dsn, modules=modules, **options)
+            conn = Tortoise.get_connection("default")
+            self._dialect = conn.capabilities.dialect
+            self._driver = type(conn).__module__
 
             if self.config.auto_create_table:
                 await Tortoise.generate_schemas(safe=True)
@@ -34,21 +64,207 @@ class TortoiseStorage(AuditStorage):
                 f"Failed to connect to Tortoise backend: {e}"
             ) from e
 
+        await self.writer.start()
+        self.start_retention()
+
     async def shutdown(self) -> None:
+        await self.stop_retention()
+        await self.writer.close()
         await Tortoise.close_connections()
 
-    async def save(self, entry: AuditEntry) -> None:
-        assert self.AuditLog is not None
-        await self.AuditLog.create(**entry.model_dump())
+    async def save(self, entry: EntryLike) -> None:
+        await self.save_batch([entry])
 
-    async def save_batch(self, entries: list[AuditEntry]) -> None:
+    async def save_batch(self, entries: list[EntryLike]) -> None:
         if not entries:
             return
         assert self.AuditLog is not None
+        # Skip ids that already exist so retried and replayed batches are safe
         await self.AuditLog.bulk_create(
-            [self.AuditLog(**e.model_dump()) for e in entries]
+            [self.AuditLog(**entry_values(e)) for e in entries],
+            ignore_conflicts=True,
         )
 
+    async def _purge_batch(self, cutoff: datetime, batch_size: int) -> int:
+        assert self.AuditLog is not None
+        # Tortoise has no DELETE ... LIMIT; delete a bounded id list instead
+        ids = await (
+            self.AuditLog.filter(timestamp__lt=cutoff)
+            .limit(batch_size)
+            .values_list("id", flat=True)
+        )
+        if not ids:
+            return 0
+        return await self.AuditLog.filter(id__in=ids).delete()
+
+    @staticmethod
+    def _filter_kwargs(filters: AuditFilters, dialect: str = "") -> dict[str, Any]:
+        """Tortoise lookups for `filters` on the `dialect` database."""
+        kwargs: dict[str, Any] = {
+            name: getattr(filters, name)
+            for name in EQUALITY_FILTERS
+            if getattr(filters, name) is not None
+        }
+        if filters.path_prefix:
+            if dialect == "sqlite":
+                # SQLite's LIKE is case-insensitive and never uses the index
+                kwargs["path__gte"] = filters.path_prefix
+                kwargs["path__lt"] = prefix_upper_bound(filters.path_prefix)
+            else:
+                kwargs["path__startswith"] = filters.path_prefix
+        if filters.status_min is not None:
+            kwargs["status_code__gte"] = filters.status_min
+        if filters.status_max is not None:
+            kwargs["status_code__lte"] = filters.status_max
+        if filters.since is not None:
+            kwargs["timestamp__gte"] = filters.since
+        if filters.until is not None:
+            kwargs["timestamp__lt"] = filters.until
+        return kwargs
+
+    def _placeholder(self, index: int) -> str:
+        """Parameter placeholder number `index` (from 1) of the connection."""
+        if self._dialect == "sqlite":
+            return "?"
+        if self._dialect == "postgres" and "psycopg" not in self._driver:
+            return f"${index}"
+        return "%s"
+
+    def _filtered_sql(
+        self,
+        filters: AuditFilters,
+        group_by: Sequence[GroupBy],
+        bucket: TimeBucket | None,
+        params: list[Any],
+    ) -> str:
+        """
+        SELECT of the group keys (k0, k1, ...; bucket first), duration_ms and
+        status_code of the entries matching `filters`, for use as a derived
+        table. Values are appended to `params`.
+        """
+        assert self.AuditLog is not None
+
+        def add(value: Any) -> str:
+            params.append(value)
+            return self._placeholder(len(params))
+
+        keys: list[str] = list(group_by)
+        if bucket is not None:
+            if self._dialect == "postgres":
+                keys.insert(0, f"date_trunc('{bucket}', timezone('UTC', timestamp))")
+            elif self._dialect == "mysql":
+                # MySQL spells minutes %i (%M is the month name)
+                fmt = BUCKET_FORMATS[bucket].replace("%M", "%i")
+                keys.insert(0, f"date_format(timestamp, {add(fmt)})")
+            else:
+                keys.insert(0, f"strftime({add(BUCKET_FORMATS[bucket])}, timestamp)")
+        columns = [f"{key} AS k{i}" for i, key in enumerate(keys)]
+
+        conditions = []
+        for name in EQUALITY_FILTERS:
+            value = getattr(filters, name)
+            if value is not None:
+                conditions.append(f"{name} = {add(value)}")
+        if filters.path_prefix:
+            if self._dialect == "sqlite":
+                # Same range as _filter_kwargs: SQLite's LIKE ignores case
+                conditions.append(f"path >= {add(filters.path_prefix)}")
+                upper = prefix_upper_bound(filters.path_prefix)
+                conditions.append(f"path < {add(upper)}")
+            else:
+                conditions.append(f"path LIKE {add(like_prefix(filters.path_prefix))}")
+        for condition, value in (
+            ("status_code >=", filters.status_min),
+            ("status_code <=", filters.status_max),
+            ("timestamp >=", filters.since),
+            ("timestamp <", filters.until),
+        ):
+            if value is not None:
+                conditions.append(f"{condition} {add(value)}")
+
+        quote = "`" if self._dialect == "mysql" else '"'
+        table = f"{quote}{self.AuditLog._meta.db_table}{quote}"
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return (
+            f"SELECT {', '.join([*columns, 'duration_ms', 'status_code'])} "
+            f"FROM {table} {where_clause}"
+        )
+
+    async def _aggregate(
+        self,
+        filters: AuditFilters,
+        group_by: Sequence[GroupBy],
+        bucket: TimeBucket | None,
+        error_status: int,
+    ) -> list[StatsRow]:
+        if self._dialect not in ("sqlite", "mysql", "postgres"):
+            return await super()._aggregate(filters, group_by, bucket, error_status)
+        params: list[Any] = []
+        entries = self._filtered_sql(filters, group_by, bucket, params)
+        keys = [f"k{i}" for i in range(len(group_by) + (bucket is not None))]
+        group_clause = f"GROUP BY {', '.join(keys)}" if keys else ""
+        measures = [
+            "count(*) AS n",
+            # An int, inlined so the placeholders stay in text order
+            f"sum(CASE WHEN status_code >= {int(error_status)} THEN 1 ELSE 0 END) "
+            "AS errors",
+            "avg(duration_ms) AS avg_ms",
+        ]
+        if self._dialect == "postgres":
+            measures += [
+                f"percentile_cont({fraction}) WITHIN GROUP (ORDER BY duration_ms) "
+                f"AS p{i}"
+                for i, fraction in enumerate(PERCENTILES)
+            ]
+        sql = (
+            f"SELECT {', '.join([*keys, *measures])} "
+            f"FROM ({entries}) AS f {group_clause}"
+        )
+
+        conn = Tortoise.get_connection("default")
+        rows = percentile_rows = await conn.execute_query_dict(sql, params)
+        if self._dialect != "postgres":
+            # No percentile aggregate: nearest-rank percentiles per group with
+            # window functions, as in aggregate_statements()
+            partition = f"PARTITION BY {', '.join(keys)}" if keys else ""
+            ranked = (
+                f"SELECT {', '.join([*keys, 'duration_ms'])}, "
+                f"row_number() OVER ({partition} ORDER BY duration_ms) AS rn, "
+                f"count(duration_ms) OVER ({partition}) AS total "
+                f"FROM ({entries}) AS f WHERE duration_ms IS NOT NULL"
+            )
+            percentiles = [
+                f"min(CASE WHEN rn >= {fraction} * total THEN duration_ms END) AS p{i}"
+                for i, fraction in enumerate(PERCENTILES)
+            ]
+            percentile_rows = await conn.execute_query_dict(
+                f"SELECT {', '.join([*keys, *percentiles])} "
+                f"FROM ({ranked}) AS r {group_clause}",
+                params,
+            )
+        found = {
+            tuple(row[key] for key in keys): tuple(
+                row[f"p{i}"] for i in range(len(PERCENTILES))
+            )
+            for row in percentile_rows
+        }
+
+        result = []
+        for row in rows:
+            key = [row[name] for name in keys]
+            values = key[1:] if bucket is not None else key
+            result.append(
+                StatsRow.build(
+                    key[0] if bucket is not None else None,
+                    dict(zip(group_by, values, strict=True)),
+                    row["n"],
+                    row["errors"],
+                    row["avg_ms"],
+                    found.get(tuple(key), (None, None, None)),
+                )
+            )
+        return sort_rows(result)
+
     async def get_entries(
         self,
         limit: int = 100,
@@ -58,20 +274,54 @@ class TortoiseStorage(AuditStorage):
         status_code: int | None = None,
         user_id: str | None = None,
         action: str | None = None,
-    ) -> list[AuditEntry]:
+        cursor: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        path_prefix: str | None = None,
+        status_min: int | None = None,
+        status_max: int | None = None,
+        resource_type: str | None = None,
+        resource_id: str | None = None,
+        fields: Sequence[str] | None = None,
+        exclude_bodies: bool = False,
+    ) -> EntryPage:
+        assert self.AuditLog is not None
+        columns = select_fields(fields, exclude_bodies)
+        filters = AuditFilters(
+            method=method,
+            path=path,
+            path_prefix=path_prefix,
+            status_code=status_code,
+            status_min=status_min,
+            status_max=status_max,
+            user_id=user_id,
+            action=action,
+            resource_type=resource_type,
+            resource_id=resource_id,
+            since=since,
+            until=until,
+        )
+        query = self.AuditLog.filter(
+            **self._filter_kwargs(filters, self._dialect)
+        ).order_by(*self._ordering)
+        if cursor is not None:
+            # Keyset pagination: continue right after the cursor's sort key
+            timestamp, entry_id = decode_cursor(cursor)
+            query = query.filter(
+                Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=entry_id)
+            )
+
+        # One extra row tells whether there is a next page
+        query = query.limit(limit + 1).offset(offset)
+        if columns:
+            rows = await query.values(*columns)
+            return make_page([partial_entry(row) for row in rows], limit)
+        db_entries = await query
+        return make_page(
+            [AuditEntry.model_validate(e.__dict__) for e in db_entries], limit
+        )
+
+    async def get_entry(self, entry_id: UUID) -> AuditEntry | None:
         assert self.AuditLog is not None
-        query = self.AuditLog.all().order_by("-timestamp")
-
-        if method:
-            query = query.filter(method=method)
-        if path:
-            query = query.filter(path=path)
-        if status_code:
-            query = query.filter(status_code=status_code)
-        if user_id:
-            query = query.filter(user_id=user_id)
-        if action:
-            query = query.filter(action=action)
-
-        db_entries = await query.limit(limit).offset(offset)
-        return [AuditEntry.model_validate(e.__dict__) for e in db_entries]
+        db_entry = await self.AuditLog.get_or_none(id=entry_id)
+        return AuditEntry.model_validate(db_entry.__dict__) if db_entry else None
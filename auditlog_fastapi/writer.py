@@ -0,0 +1,370 @@
+import asyncio
+import contextlib
+import sys
+from collections import deque
+from collections.abc import Awaitable, Callable, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any
+from uuid import UUID
+
+from .bodies import prepare_bodies
+from .codec import get_codec
+from .exceptions import CircuitOpenError, RollupError, StorageError
+from .models import AuditEntry, EntryLike, as_entry
+from .resilience import CircuitBreaker, CircuitBreakerPolicy, RetryBudget, RetryPolicy
+from .rollups import rollup_rows
+from .spool import Spool
+
+if TYPE_CHECKING:
+    from .storage.base import AuditStorage
+
+# Entries per save_batch() call when replaying the spool
+_REPLAY_BATCH_SIZE = 500
+
+
+class BatchWriter:
+    """
+    Buffers audit entries in a bounded in-memory queue and writes them through
+    the storage's `save_batch()`.
+
+    A flush is triggered when `batch_size` entries are pending or when
+    `flush_interval` seconds have passed, whichever comes first. With
+    `batch_size <= 1` batching is disabled and every entry is saved directly.
+
+    With a `Spool`, batches the storage rejects and entries that do not fit in
+    the queue are appended to disk instead of being dropped. Spooled entries
+    are written back through `save_batch()` at startup and after each
+    successful write.
+
+    Storage calls are retried according to `retry` and guarded by an optional
+    circuit breaker. While the circuit is open batches stay queued (or go to
+    the spool once the queue is full) and direct writes go straight to the
+    spool, without waiting on the database.
+
+    Request/response bodies left raw by the middleware (deferred body
+    processing) are decoded and masked here, just before the write. Bodies over
+    `body_offload_threshold` bytes are processed in a thread or process pool.
+
+    With `rollups`, every batch written is also counted into per-hour rollup
+    rows, upserted through `save_rollups()`. Spool replays count only entries
+    the storage did not hold yet (`stored_ids()`), so a replay repeated after a
+    crash never counts an entry twice. A rollup update that fails is reported
+    and skipped; the entries are kept.
+
+    Callbacks registered with `add_listener()` are called with every batch
+    written, e.g. to invalidate cached query results.
+    """
+
+    def __init__(
+        self,
+        storage: "AuditStorage",
+        batch_size: int = 1,
+        flush_interval: float = 5.0,
+        max_queue_size: int = 10_000,
+        on_error: Callable[[Exception, AuditEntry], None] | None = None,
+        body_offload_threshold: int | None = 64_000,
+        body_offload_executor: str = "thread",
+        spool: Spool | None = None,
+        retry: RetryPolicy | None = None,
+        circuit_breaker: CircuitBreakerPolicy | None = None,
+        rollups: bool = False,
+    ):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max(max_queue_size, batch_size)
+        self.on_error = on_error or self._default_on_error
+        self.body_offload_threshold = body_offload_threshold
+        self.body_offload_executor = body_offload_executor
+        self._executor: Executor | None = None
+        self.spool = spool
+        self._replay_task: asyncio.Task[int] | None = None
+        self.retry = retry
+        self._retry_budget = (
+            RetryBudget(retry.budget_ratio, retry.budget_max) if retry else None
+        )
+        self.breaker = (
+            CircuitBreaker.from_policy(circuit_breaker) if circuit_breaker else None
+        )
+
+        self.rollups = rollups
+        self._listeners: list[Callable[[Sequence[EntryLike]], None]] = []
+
+        self._pending: deque[EntryLike] = deque()
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+        self._closing = False
+
+    @classmethod
+    def from_config(cls, storage: "AuditStorage", config: Any) -> "BatchWriter":
+        """Build a writer from the batching options of an `AuditConfig`."""
+        if config is None:
+            return cls(storage)
+        return cls(
+            storage,
+            batch_size=config.batch_size,
+            flush_interval=config.batch_flush_interval,
+            max_queue_size=config.batch_max_queue_size,
+            on_error=config.on_storage_error,
+            body_offload_threshold=config.body_offload_threshold,
+            body_offload_executor=config.body_offload_executor,
+            spool=(
+                Spool(
+                    config.spool_dir,
+                    max_bytes=config.spool_max_bytes,
+                    segment_bytes=config.spool_segment_bytes,
+                    fsync=config.spool_fsync,
+                    fsync_interval=config.spool_fsync_interval,
+                    codec=get_codec(config.json_codec),
+                )
+                if config.spool_dir
+                else None
+            ),
+            retry=config.retry,
+            circuit_breaker=config.circuit_breaker,
+            rollups=config.rollups,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.batch_size > 1
+
+    @property
+    def pending(self) -> int:
+        """Number of entries waiting to be flushed."""
+        return len(self._pending)
+
+    def _default_on_error(
+        self,
+        exc: Exception,
+        entry: AuditEntry,  # noqa: ARG002
+    ) -> None:
+        print(f"Audit log storage failure: {exc}", file=sys.stderr)  # noqa: T201
+
+    async def start(self) -> None:
+        """
+        Start the background flush loop (when batching is enabled) and replay
+        anything left in the spool.
+        """
+        self._closing = False
+        self._schedule_replay()
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, entry: EntryLike) -> None:
+        """
+        Hand an entry to the writer.
+        Saves immediately when batching is disabled or the writer has been
+        closed, otherwise enqueues it. Raises StorageError if the queue is full.
+        """
+        if not self.enabled or self._closing:
+            await self._prepare([entry])
+            try:
+                await self._call(self.storage.save, entry)
+            except Exception:
+                if self.spool is None:
+                    raise
+                await self._spool([entry])
+            else:
+                await self._written([entry])
+                self._schedule_replay()
+            return
+
+        if len(self._pending) >= self.max_queue_size:
+            if self.spool is not None:
+                await self._prepare([entry])
+                await self._spool([entry])
+                return
+            raise StorageError(
+                f"Audit write queue is full ({self.max_queue_size} entries pending)"
+            )
+
+        self._pending.append(entry)
+        if self._task is None:
+            await self.start()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Write every pending entry in chunks of at most `batch_size`."""
+        async with self._lock:
+            while self._pending:
+                size = min(self.batch_size, len(self._pending))
+                batch = [self._pending.popleft() for _ in range(size)]
+                try:
+                    await self._prepare(batch)
+                    await self._call(self.storage.save_batch, batch)
+                except CircuitOpenError as e:
+                    if self._closing:
+                        await self._fallback(batch, e)
+                        continue
+                    # Keep the batch queued until the circuit lets a write through
+                    self._pending.extendleft(reversed(batch))
+                    return
+                except Exception as e:
+                    await self._fallback(batch, e)
+                else:
+                    await self._written(batch)
+                    self._schedule_replay()
+
+    async def close(self) -> None:
+        """Stop the flush loop and write out everything still pending."""
+        self._closing = True
+        task, self._task = self._task, None
+        if task is not None:
+            self._wakeup.set()
+            await task
+        # An interrupted replay resumes from the spool on the next startup
+        replay, self._replay_task = self._replay_task, None
+        if replay is not None:
+            replay.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await replay
+        await self.flush()
+        if self.spool is not None:
+            self.spool.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def replay(self) -> int:
+        """
+        Write spooled entries back through `save_batch()`, oldest first.
+        Stops at the first failure, leaving the rest on disk. Returns the
+        number of entries written.
+        """
+        spool = self.spool
+        if spool is None:
+            return 0
+        size = max(self.batch_size, _REPLAY_BATCH_SIZE)
+        written = 0
+        for segment in await asyncio.to_thread(spool.segments):
+            entries = await asyncio.to_thread(spool.read, segment)
+            for start in range(0, len(entries), size):
+                chunk = entries[start : start + size]
+                try:
+                    # The spool may hold entries already written, e.g. by a
+                    # replay cut short by a crash; the insert skips them and so
+                    # must the rollups
+                    stored = await self._stored_ids(chunk)
+                    await self._call(self.storage.save_batch, list(chunk))
+                except Exception:
+                    return written
+                spool.mark_drained(segment, len(chunk))
+                await self._written(chunk, [e for e in chunk if e.id not in stored])
+                written += len(chunk)
+            await asyncio.to_thread(spool.remove, segment)
+        return written
+
+    def add_listener(self, listener: Callable[[Sequence[EntryLike]], None]) -> None:
+        """Call `listener(entries)` after each successful write."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Sequence[EntryLike]], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    async def _written(
+        self,
+        entries: Sequence[EntryLike],
+        new: Sequence[EntryLike] | None = None,
+    ) -> None:
+        """
+        Update the rollups, when enabled, and notify listeners of a write.
+        `new` narrows the entries counted into the rollups.
+        """
+        if self.rollups:
+            counted = entries if new is None else new
+            try:
+                # Once, outside the retry policy and circuit breaker: the
+                # increments are not idempotent, so retrying after a lost
+                # acknowledgement would count the batch twice
+                await self.storage.save_rollups(rollup_rows(counted))
+            except Exception as e:
+                error = RollupError(f"Audit rollup update failed: {e}")
+                error.__cause__ = e
+                for entry in counted:
+                    self.on_error(error, as_entry(entry))
+        for listener in self._listeners:
+            listener(entries)
+
+    async def _call(self, save: Callable[[Any], Awaitable[None]], payload: Any) -> None:
+        """Run a storage write through the circuit breaker and retry policy."""
+        breaker = self.breaker
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError("Audit storage circuit is open, write skipped")
+        retry = 0
+        while True:
+            try:
+                await save(payload)
+            except Exception:
+                if breaker is not None:
+                    breaker.record_failure()
+                if not self._may_retry(retry):
+                    raise
+                assert self.retry is not None
+                await asyncio.sleep(self.retry.delay(retry))
+                retry += 1
+            except BaseException:
+                # A cancelled write (shutdown, client disconnect) is a failure
+                # too; otherwise a cancelled trial leaves the circuit half open
+                if breaker is not None:
+                    breaker.record_failure()
+                raise
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                if self._retry_budget is not None:
+                    self._retry_budget.deposit()
+                return
+
+    def _may_retry(self, retry: int) -> bool:
+        if self.retry is None or retry + 1 >= self.retry.attempts:
+            return False
+        if self.breaker is not None and self.breaker.state == "open":
+            return False
+        assert self._retry_budget is not None
+        return self._retry_budget.withdraw()
+
+    async def _stored_ids(self, entries: Sequence[EntryLike]) -> set[UUID]:
+        if not self.rollups:
+            return set()
+        return await self.storage.stored_ids([entry.id for entry in entries])
+
+    def _schedule_replay(self) -> None:
+        if self.spool is None or not self.spool.pending or self._closing:
+            return
+        if self._replay_task is not None and not self._replay_task.done():
+            return
+        self._replay_task = asyncio.get_running_loop().create_task(self.replay())
+
+    async def _spool(self, entries: list[EntryLike]) -> None:
+        assert self.spool is not None
+        await asyncio.to_thread(self.spool.append, entries)
+
+    async def _fallback(self, batch: list[EntryLike], exc: Exception) -> None:
+        """Spool a batch the storage rejected, or report it as lost."""
+        if self.spool is not None:
+            try:
+                await self._spool(batch)
+                return
+            except Exception as spool_exc:
+                exc = spool_exc
+        for entry in batch:
+            self.on_error(exc, as_entry(entry))
+
+    async def _prepare(self, entries: list[EntryLike]) -> None:
+        """Render deferred bodies, offloading large ones from the event loop."""
+        if self._executor is None and self.body_offload_executor == "process":
+            self._executor = ProcessPoolExecutor()
+        await prepare_bodies(entries, self.body_offload_threshold, self._executor)
+
+    async def _run(self) -> None:
+        while not self._closing:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            self._wakeup.clear()
+            await self.flush()
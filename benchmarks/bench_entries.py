@@ -0,0 +1,90 @@
+"""
+Per-request cost of the audit entry on the middleware/writer path: a Pydantic
+`AuditEntry` (and `model_dump()` in the backend) versus the slotted
+`AuditRecord` read directly by the backend.
+
+    poetry run python benchmarks/bench_entries.py
+"""
+
+import gc
+import timeit
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+from auditlog_fastapi.models import AuditEntry, AuditRecord, entry_values
+
+QUERY = {"page": "2", "sort": "name"}
+QUEUED = 10_000
+
+
+def build_entry() -> Any:
+    entry = AuditEntry(
+        method="GET",
+        path="/api/v1/items",
+        query_params=dict(QUERY),
+        ip_address="10.0.0.1",
+        user_agent="bench",
+    )
+    entry.status_code = 200
+    entry.duration_ms = 1.5
+    return entry
+
+
+def build_record() -> Any:
+    record = AuditRecord("GET", "/api/v1/items", dict(QUERY), "10.0.0.1", "bench")
+    record.status_code = 200
+    record.duration_ms = 1.5
+    return record
+
+
+def entry_request() -> dict[str, Any]:
+    return build_entry().model_dump()
+
+
+def record_request() -> dict[str, Any]:
+    return entry_values(build_record())
+
+
+def allocated_per_call(func: Callable[[], Any], calls: int = 1_000) -> tuple[int, int]:
+    """(allocated blocks, allocated bytes) per call, freed or not."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = [func() for _ in range(calls)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(s.count_diff for s in stats)
+    size = sum(s.size_diff for s in stats)
+    del keep
+    return blocks // calls, size // calls
+
+
+def held_per_entry(func: Callable[[], Any]) -> int:
+    """Bytes still held per entry while QUEUED entries wait for a flush."""
+    gc.collect()
+    tracemalloc.start()
+    queue = [func() for _ in range(QUEUED)]
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del queue
+    return held // QUEUED
+
+
+def main() -> None:
+    for name, build, request in (
+        ("AuditEntry", build_entry, entry_request),
+        ("AuditRecord", build_record, record_request),
+    ):
+        per_call = timeit.timeit(request, number=50_000) / 50_000 * 1e6
+        blocks, size = allocated_per_call(build)
+        print(
+            f"{name:<12} build+row {per_call:6.2f} us  "
+            f"live blocks/entry {blocks:3d} ({size} B)  "
+            f"held per queued entry {held_per_entry(build)} B"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Masking cost on large nested payloads: the previous `mask_sensitive_fields`
+implementation versus the compiled `Masker`.
+
+    poetry run python benchmarks/bench_masking.py
+"""
+
+import timeit
+from functools import partial
+from typing import Any
+from urllib.parse import parse_qsl, urlencode
+
+from auditlog_fastapi.filters import DEFAULT_SENSITIVE_FIELDS, MASK_VALUE, Masker
+
+
+def legacy_mask(data: Any, fields: list[str]) -> Any:
+    """The implementation Masker replaced, kept here as the baseline."""
+    if isinstance(data, dict):
+        masked_dict = {}
+        for key, value in data.items():
+            if any(field.lower() == key.lower() for field in fields):
+                masked_dict[key] = MASK_VALUE
+            else:
+                masked_dict[key] = legacy_mask(value, fields)
+        return masked_dict
+
+    if isinstance(data, list):
+        return [legacy_mask(item, fields) for item in data]
+
+    if isinstance(data, str) and "=" in data:
+        try:
+            pairs = parse_qsl(data, keep_blank_values=True)
+            if not pairs:
+                return data
+            masked_pairs = []
+            changed = False
+            for key, value in pairs:
+                if any(field.lower() == key.lower() for field in fields):
+                    masked_pairs.append((key, MASK_VALUE))
+                    changed = True
+                else:
+                    masked_pairs.append((key, value))
+            return urlencode(masked_pairs) if changed else data
+        except Exception:
+            return data
+
+    return data
+
+
+def make_payload(items: int, with_secrets: bool) -> dict[str, Any]:
+    return {
+        "order_id": "ord_123",
+        "customer": {"name": "Jane", "email": "jane@example.com", "tier": "gold"},
+        "items": [
+            {
+                "sku": f"sku-{i}",
+                "qty": i,
+                "price": 9.99,
+                "attrs": {"color": "red", "size": "M", "note": "a=b"},
+                **({"cvv": "123"} if with_secrets and i % 10 == 0 else {}),
+            }
+            for i in range(items)
+        ],
+    }
+
+
+def main() -> None:
+    fields = DEFAULT_SENSITIVE_FIELDS + ["email", "phone", "iban", "dob"]
+    masker = Masker(fields)
+    number = 50
+
+    print(f"{'payload':>28} {'legacy (ms)':>12} {'Masker (ms)':>12} {'speedup':>8}")
+    for items, secrets in ((100, False), (1000, False), (1000, True), (5000, True)):
+        payload = make_payload(items, secrets)
+        assert legacy_mask(payload, fields) == masker.mask(payload)
+
+        legacy = timeit.timeit(partial(legacy_mask, payload, fields), number=number)
+        fast = timeit.timeit(partial(masker.mask, payload), number=number)
+        label = f"{items} items, secrets={secrets}"
+        print(
+            f"{label:>28} {legacy * 1000 / number:>12.3f} "
+            f"{fast * 1000 / number:>12.3f} {legacy / fast:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
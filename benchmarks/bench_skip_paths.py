@@ -0,0 +1,57 @@
+"""
+Per-request cost of the skip-path check as the number of rules grows.
+
+Compares the previous linear scan (list membership + `startswith` over every
+prefix) with the compiled `PathMatcher`.
+
+    poetry run python benchmarks/bench_skip_paths.py
+"""
+
+import timeit
+from functools import partial
+
+from auditlog_fastapi.matching import PathMatcher
+
+REQUEST_PATHS = [
+    "/api/v1/users/42",
+    "/api/v1/orders/abc/items",
+    "/static/js/app.js",
+    "/healthz",
+    "/docs",
+]
+
+
+def make_rules(count: int) -> tuple[list[str], list[str], list[str]]:
+    paths = [f"/health/{i}" for i in range(count // 3)] + ["/healthz"]
+    prefixes = [f"/static{i}/" for i in range(count // 3)] + ["/static/"]
+    routes = [f"/tenant{i}/{{id}}" for i in range(count // 3)]
+    return paths, prefixes, routes
+
+
+def naive(paths: list[str], prefixes: list[str]) -> None:
+    for path in REQUEST_PATHS:
+        if path in paths:
+            continue
+        any(path.startswith(p) for p in prefixes)
+
+
+def compiled(matcher: PathMatcher) -> None:
+    for path in REQUEST_PATHS:
+        matcher.matches(path)
+
+
+def main() -> None:
+    number = 20_000
+    print(f"{'rules':>6} {'linear scan (us)':>18} {'PathMatcher (us)':>18}")
+    for count in (10, 50, 150, 500, 2000):
+        paths, prefixes, routes = make_rules(count)
+        matcher = PathMatcher(paths, prefixes, routes)
+
+        linear = timeit.timeit(partial(naive, paths, prefixes), number=number)
+        fast = timeit.timeit(partial(compiled, matcher), number=number)
+        per_request = 1e6 / (number * len(REQUEST_PATHS))
+        print(f"{count:>6} {linear * per_request:>18.3f} {fast * per_request:>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
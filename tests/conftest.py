@@ -1,5 +1,8 @@
 import asyncio
+import contextlib
 from collections.abc import AsyncGenerator
+from types import SimpleNamespace
+from typing import Any
 from uuid import uuid4
 
 import pytest
@@ -13,6 +16,12 @@ from auditlog_fastapi import (
     create_audit_lifespan,
 )
 from auditlog_fastapi.config import _registry
+from auditlog_fastapi.models import EntryLike
+from auditlog_fastapi.registry import resolve_storage
+from auditlog_fastapi.storage import beanie_storage
+from auditlog_fastapi.storage.asyncpg_storage import AsyncpgStorage
+from auditlog_fastapi.storage.base import AuditStorage
+from auditlog_fastapi.storage.beanie_storage import BeanieStorage
 
 
 @pytest.fixture(scope="session")
@@ -22,6 +31,36 @@ def event_loop():
     loop.close()
 
 
+class MemoryStorage(AuditStorage):
+    """In-memory storage used to inspect what the middleware hands off."""
+
+    def __init__(self, config=None):
+        self.config = config
+        self.saved: list[EntryLike] = []
+        self.batches: list[list[EntryLike]] = []
+
+    async def save(self, entry):
+        self.saved.append(entry)
+
+    async def save_batch(self, entries):
+        self.batches.append(list(entries))
+        self.saved.extend(entries)
+
+    async def get_entries(self, limit=100, offset=0, **_filters):
+        return self.saved[offset : offset + limit]
+
+    async def startup(self):
+        await self.writer.start()
+
+    async def shutdown(self):
+        await self.writer.close()
+
+
+@pytest.fixture
+def memory_storage() -> MemoryStorage:
+    return MemoryStorage()
+
+
 @pytest_asyncio.fixture
 async def app() -> FastAPI:
     _registry.clear()
@@ -76,3 +115,259 @@ async def manage_lifespan(app: FastAPI):
 
     async with create_audit_lifespan(config)(app):
         yield
+
+
+# In-memory SQLite DSN of each SQL backend
+SQL_DSNS = {
+    "sqlalchemy": "sqlite+aiosqlite:///:memory:",
+    "sqlmodel": "sqlite+aiosqlite:///:memory:",
+    "tortoise": "sqlite://:memory:",
+}
+
+
+@pytest_asyncio.fixture(params=list(SQL_DSNS))
+async def make_sql_storage(request):
+    """
+    Factory for started SQLAlchemy, SQLModel and Tortoise storages on
+    in-memory SQLite, each with its own table; tests using it run once per ORM.
+    """
+    started: list[AuditStorage] = []
+
+    async def make(**options: Any) -> AuditStorage:
+        if request.param == "tortoise" and options.get("rollups"):
+            pytest.skip("Tortoise does not support rollups")
+        config = AuditConfig(
+            orm=request.param,
+            dsn=SQL_DSNS[request.param],
+            table_name=f"audit_{uuid4().hex[:8]}",
+            **options,
+        )
+        storage = resolve_storage(config)
+        await storage.startup()
+        started.append(storage)
+        return storage
+
+    yield make
+    for storage in started:
+        await storage.shutdown()
+
+
+@pytest_asyncio.fixture
+async def storage(make_sql_storage) -> AuditStorage:
+    return await make_sql_storage()
+
+
+class FakeConnection:
+    """
+    Stands in for an asyncpg connection, so AsyncpgStorage runs without a
+    PostgreSQL server. Every call is recorded as (kind, sql, args) with the
+    SQL whitespace collapsed; fetches return `rows`.
+    """
+
+    def __init__(self, rows=(), copy_error: Exception | None = None):
+        self.rows = list(rows)
+        self.copy_error = copy_error
+        # Command tags returned by execute(), oldest first
+        self.statuses: list[str] = []
+        self.calls: list[tuple[str, Any, Any]] = []
+
+    def _record(self, kind: str, sql: str, args: Any) -> None:
+        self.calls.append((kind, " ".join(sql.split()), args))
+
+    async def execute(self, sql, *args):
+        self._record("execute", sql, args)
+        return self.statuses.pop(0) if self.statuses else "OK"
+
+    async def executemany(self, sql, records):
+        self._record("executemany", sql, list(records))
+
+    async def fetch(self, sql, *args):
+        self._record("fetch", sql, args)
+        return self.rows
+
+    async def fetchrow(self, sql, *args):
+        self._record("fetchrow", sql, args)
+        return self.rows[0] if self.rows else None
+
+    async def cursor(self, sql, *args, prefetch):
+        self._record("cursor", sql, (*args, prefetch))
+        for row in self.rows:
+            yield row
+
+    async def copy_records_to_table(
+        self, table_name, *, records, columns=None, schema_name=None
+    ):
+        if self.copy_error is not None:
+            raise self.copy_error
+        name = f"{schema_name}.{table_name}" if schema_name else table_name
+        self._record("copy", name, (list(records), tuple(columns)))
+
+    def transaction(self):
+        return contextlib.nullcontext()
+
+
+class FakePool:
+    """A pool handing out one `FakeConnection`."""
+
+    def __init__(self, conn: FakeConnection):
+        self.conn = conn
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+    async def execute(self, sql, *args):
+        return await self.conn.execute(sql, *args)
+
+    async def fetch(self, sql, *args):
+        return await self.conn.fetch(sql, *args)
+
+
+@pytest.fixture
+def pg_conn() -> FakeConnection:
+    return FakeConnection()
+
+
+@pytest.fixture
+def make_asyncpg_storage(pg_conn):
+    """Factory for AsyncpgStorages whose pool hands out `pg_conn`."""
+
+    def make(**options: Any) -> AsyncpgStorage:
+        config = AuditConfig(orm="asyncpg", dsn="postgresql://localhost/db", **options)
+        storage = AsyncpgStorage(config)
+        storage._pool = FakePool(pg_conn)
+        return storage
+
+    return make
+
+
+class FakeCursor:
+    """A driver cursor over `docs`; awaiting it yields itself, as aggregate() does."""
+
+    def __init__(self, docs):
+        self.docs = list(docs)
+
+    def __await__(self):
+        async def cursor():
+            return self
+
+        return cursor().__await__()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.docs:
+            raise StopAsyncIteration
+        return self.docs.pop(0)
+
+    async def to_list(self, length=None):
+        return self.docs if length is None else self.docs[:length]
+
+
+class FakeCollection:
+    """
+    Stands in for a MongoDB collection, so BeanieStorage runs without a
+    server. Every call is recorded as (kind, args); reads return the next
+    list in `results`.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.results: list[list[dict[str, Any]]] = []
+        self.insert_error: Exception | None = None
+        self.calls: list[tuple[str, Any]] = []
+
+    def _cursor(self) -> FakeCursor:
+        return FakeCursor(self.results.pop(0) if self.results else [])
+
+    def find(self, filter=None, projection=None, **kwargs):
+        self.calls.append(
+            ("find", {"filter": filter, "projection": projection, **kwargs})
+        )
+        return self._cursor()
+
+    async def find_one(self, filter=None, *_args, **_kwargs):
+        self.calls.append(("find_one", filter))
+        docs = self._cursor().docs
+        return docs[0] if docs else None
+
+    def aggregate(self, pipeline, **_kwargs):
+        self.calls.append(("aggregate", pipeline))
+        return self._cursor()
+
+    async def insert_many(self, documents, **kwargs):
+        self.calls.append(("insert_many", (list(documents), kwargs)))
+        if self.insert_error is not None:
+            raise self.insert_error
+
+    async def delete_many(self, filter, **_kwargs):
+        self.calls.append(("delete_many", filter))
+        return SimpleNamespace(deleted_count=len(filter["_id"]["$in"]))
+
+    async def bulk_write(self, requests, **kwargs):
+        self.calls.append(("bulk_write", (list(requests), kwargs)))
+
+    async def create_index(self, keys, **kwargs):
+        self.calls.append(("create_index", (keys, kwargs)))
+
+    async def create_indexes(self, indexes, **_kwargs):
+        self.calls.append(("create_indexes", indexes))
+        return [index.document["name"] for index in indexes]
+
+    async def index_information(self):
+        return {}
+
+
+class FakeMongoDatabase:
+    """A database of `FakeCollection`s reporting `version` to buildInfo."""
+
+    def __init__(self, version: str = "7.0.0"):
+        self.version = version
+        self.client = SimpleNamespace(append_metadata=lambda _metadata: None)
+        self.collections: dict[str, FakeCollection] = {}
+        self.commands: list[dict[str, Any]] = []
+
+    async def command(self, command):
+        self.commands.append(command)
+        return {"version": self.version, "ok": 1}
+
+    async def list_collection_names(self, **_kwargs):
+        return list(self.collections)
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self.collections.setdefault(name, FakeCollection(name))
+
+
+@pytest.fixture
+def mongo_db() -> FakeMongoDatabase:
+    return FakeMongoDatabase()
+
+
+@pytest_asyncio.fixture
+async def make_beanie_storage(mongo_db, monkeypatch):
+    """Factory for started BeanieStorages backed by `mongo_db`."""
+
+    class FakeClient:
+        def __init__(self, dsn):
+            pass
+
+        def __getitem__(self, name):
+            return mongo_db
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(beanie_storage, "AsyncIOMotorClient", FakeClient)
+    storages: list[BeanieStorage] = []
+
+    async def make(**options: Any) -> BeanieStorage:
+        config = AuditConfig(orm="beanie", dsn="mongodb://localhost/db", **options)
+        storage = BeanieStorage(config)
+        await storage.startup()
+        storages.append(storage)
+        return storage
+
+    yield make
+    for storage in storages:
+        await storage.shutdown()
@@ -0,0 +1,101 @@
+import asyncpg
+
+from auditlog_fastapi.models import ENTRY_FIELDS, AuditEntry
+
+
+def make_entries(count: int) -> list[AuditEntry]:
+    return [AuditEntry(method="GET", path=f"/items/{i}") for i in range(count)]
+
+
+async def test_small_batches_use_executemany(pg_conn, make_asyncpg_storage):
+    storage = make_asyncpg_storage(asyncpg_copy_min_batch=10)
+    await storage.save_batch(make_entries(3))
+
+    [(kind, sql, records)] = pg_conn.calls
+    assert kind == "executemany"
+    assert "ON CONFLICT (id) DO NOTHING" in sql
+    assert len(records) == 3
+
+
+async def test_large_batches_copy_through_staging_table(pg_conn, make_asyncpg_storage):
+    storage = make_asyncpg_storage(asyncpg_copy_min_batch=10)
+    entries = make_entries(10)
+    await storage.save_batch(entries)
+
+    kinds = [kind for kind, _, _ in pg_conn.calls]
+    assert kinds == ["execute", "copy", "execute"]
+    create = pg_conn.calls[0][1]
+    assert create.startswith(
+        'CREATE TEMP TABLE IF NOT EXISTS pg_temp."audit_logs_staging" (LIKE audit_logs '
+    )
+
+    _, table, (records, columns) = pg_conn.calls[1]
+    assert table == "pg_temp.audit_logs_staging"
+    assert columns == ENTRY_FIELDS
+    assert [r[0] for r in records] == [e.id for e in entries]
+
+    insert = pg_conn.calls[2][1]
+    assert insert.startswith("INSERT INTO audit_logs")
+    assert insert.endswith(
+        'FROM pg_temp."audit_logs_staging" ON CONFLICT (id) DO NOTHING'
+    )
+
+
+async def test_staging_table_of_schema_qualified_table(pg_conn, make_asyncpg_storage):
+    storage = make_asyncpg_storage(
+        table_name="audit.AuditLogs", asyncpg_copy_min_batch=2
+    )
+    await storage.save_batch(make_entries(2))
+
+    create, copy, move = pg_conn.calls
+    # The temp table cannot take the schema; COPY quotes the name as given
+    assert 'EXISTS pg_temp."AuditLogs_staging" (LIKE audit.AuditLogs ' in create[1]
+    assert copy[1] == "pg_temp.AuditLogs_staging"
+    assert move[1].startswith("INSERT INTO audit.AuditLogs ")
+    assert 'FROM pg_temp."AuditLogs_staging" ' in move[1]
+
+
+async def test_copy_falls_back_without_temp_table_privilege(
+    pg_conn, make_asyncpg_storage
+):
+    pg_conn.copy_error = asyncpg.InsufficientPrivilegeError()
+    storage = make_asyncpg_storage(asyncpg_copy_min_batch=2)
+
+    await storage.save_batch(make_entries(5))
+    await storage.save_batch(make_entries(5))
+
+    kinds = [kind for kind, _, _ in pg_conn.calls]
+    assert kinds == ["execute", "executemany", "executemany"]
+
+
+async def test_json_columns_use_driver_codecs(make_asyncpg_storage):
+    class CodecConnection:
+        def __init__(self):
+            self.codecs = {}
+
+        async def set_type_codec(self, name, *, schema, encoder, decoder, format):
+            self.codecs[name] = (schema, encoder, decoder, format)
+
+    conn = CodecConnection()
+    storage = make_asyncpg_storage()
+    await storage._init_connection(conn)
+
+    schema, encode, decode, fmt = conn.codecs["jsonb"]
+    assert (schema, fmt) == ("pg_catalog", "binary")
+    assert encode({"a": 1}) == b'\x01{"a":1}'
+    assert decode(b'\x01{"a": [1, 2]}') == {"a": [1, 2]}
+
+    entry = AuditEntry(method="POST", path="/", request_body={"a": 1})
+    row = storage._to_db_tuple(entry)
+    assert row[ENTRY_FIELDS.index("request_body")] == {"a": 1}
+    assert row[ENTRY_FIELDS.index("query_params")] is None
+
+
+async def test_insert_statement_is_built_once(pg_conn, make_asyncpg_storage):
+    storage = make_asyncpg_storage(asyncpg_copy_min_batch=None)
+    await storage.save_batch(make_entries(2))
+    await storage.save_batch(make_entries(2))
+
+    statements = {sql for _, sql, _records in pg_conn.calls}
+    assert statements == {storage._insert_sql}
+    assert storage._insert_sql.count("$") == len(ENTRY_FIELDS)
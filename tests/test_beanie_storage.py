@@ -0,0 +1,275 @@
+from datetime import UTC, datetime
+from uuid import uuid4
+
+import pytest
+from bson import Binary
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from auditlog_fastapi.db.beanie_document import projection_model
+from auditlog_fastapi.models import AuditEntry
+from auditlog_fastapi.pagination import encode_cursor
+from auditlog_fastapi.query import AuditFilters
+from auditlog_fastapi.rollups import COUNTER_COLUMNS, ROLLUP_KEY, rollup_rows
+
+
+def make_entry(**values) -> AuditEntry:
+    return AuditEntry(method="GET", path="/items", status_code=200, **values)
+
+
+def as_document(entry: AuditEntry) -> dict:
+    values = entry.model_dump()
+    return {"_id": values.pop("id"), **values}
+
+
+def bulk_write_error(*codes: int) -> BulkWriteError:
+    return BulkWriteError(
+        {"writeErrors": [{"index": i, "code": code} for i, code in enumerate(codes)]}
+    )
+
+
+async def test_save_batch_inserts_unordered(mongo_db, make_beanie_storage):
+    storage = await make_beanie_storage()
+    entries = [make_entry(), make_entry()]
+
+    await storage.save_batch(entries)
+
+    kind, (documents, options) = mongo_db["audit_logs"].calls[-1]
+    assert kind == "insert_many"
+    assert [doc["_id"] for doc in documents] == [
+        Binary.from_uuid(e.id) for e in entries
+    ]
+    assert options["ordered"] is False
+
+
+async def test_save_batch_ignores_only_duplicate_keys(mongo_db, make_beanie_storage):
+    storage = await make_beanie_storage()
+    collection = mongo_db["audit_logs"]
+
+    collection.insert_error = bulk_write_error(11000, 11000)
+    await storage.save_batch([make_entry(), make_entry()])
+
+    collection.insert_error = bulk_write_error(11000, 121)
+    with pytest.raises(BulkWriteError):
+        await storage.save_batch([make_entry(), make_entry()])
+
+
+async def test_retention_converts_the_timestamp_index_to_ttl(
+    mongo_db, make_beanie_storage
+):
+    await make_beanie_storage(retention_days=30)
+
+    assert {
+        "collMod": "audit_logs",
+        "index": {"keyPattern": {"timestamp": 1}, "expireAfterSeconds": 30 * 86400},
+    } in mongo_db.commands
+    (_, indexes), *_ = mongo_db["audit_logs"].calls
+    timestamp = indexes[0].document
+    assert timestamp["key"] == {"timestamp": 1}
+    assert timestamp["expireAfterSeconds"] == 30 * 86400
+
+
+async def test_purge_reads_only_ids_then_deletes_them(mongo_db, make_beanie_storage):
+    storage = await make_beanie_storage()
+    collection = mongo_db["audit_logs"]
+    ids = [uuid4(), uuid4()]
+    collection.results = [[{"_id": entry_id} for entry_id in ids]]
+    cutoff = datetime(2024, 1, 1, tzinfo=UTC)
+
+    assert await storage._purge_batch(cutoff, 2) == 2
+
+    (_, find), (_, delete) = collection.calls[-2:]
+    assert find["filter"] == {"timestamp": {"$lt": cutoff}}
+    assert find["projection"] == {"_id": 1}
+    assert find["limit"] == 2
+    assert delete == {"_id": {"$in": [Binary.from_uuid(i) for i in ids]}}
+
+
+async def test_cursor_continues_after_timestamp_then_id(mongo_db, make_beanie_storage):
+    storage = await make_beanie_storage()
+    collection = mongo_db["audit_logs"]
+    last, *entries = [make_entry() for _ in range(3)]
+    collection.results = [[as_document(e) for e in entries]]
+
+    page = await storage.get_entries(limit=1, cursor=encode_cursor(last))
+
+    (_, find) = collection.calls[-1]
+    assert find["filter"] == {
+        "$or": [
+            {"timestamp": {"$lt": last.timestamp}},
+            {
+                "$and": [
+                    {"timestamp": last.timestamp},
+                    {"_id": {"$lt": Binary.from_uuid(last.id)}},
+                ]
+            },
+        ]
+    }
+    assert find["sort"] == [("timestamp", -1), ("_id", -1)]
+    assert find["limit"] == 2
+    assert [e.id for e in page] == [entries[0].id]
+    assert page.next_cursor == encode_cursor(entries[0])
+
+
+async def test_filters_become_one_query(mongo_db, make_beanie_storage):
+    storage = await make_beanie_storage()
+
+    await storage.get_entries(
+        path_prefix="/items.v2/", status_min=400, status_max=499, user_id="u1"
+    )
+
+    (_, find) = mongo_db["audit_logs"].calls[-1]
+    assert find["filter"] == {
+        "$and": [
+            {"user_id": "u1"},
+            # Anchored and escaped, so "." is literal and the index is used
+            {"path": {"$regex": r"^/items\.v2/"}},
+            {"status_code": {"$gte": 400}},
+            {"status_code": {"$lte": 499}},
+        ]
+    }
+
+
+async def test_iter_entries_streams_the_driver_cursor(mongo_db, make_beanie_storage):
+    storage = await make_beanie_storage()
+    collection = mongo_db["audit_logs"]
+    entries = [make_entry(action="export") for _ in range(3)]
+    collection.results = [[as_document(e) for e in entries]]
+
+    streamed = [e async for e in storage.iter_entries(AuditFilters(action="export"), 2)]
+
+    (_, find) = collection.calls[-1]
+    assert find["filter"] == {"action": "export"}
+    assert find["sort"] == [("timestamp", -1), ("_id", -1)]
+    assert find["batch_size"] == 2
+    assert [e.id for e in streamed] == [e.id for e in entries]
+
+
+async def test_aggregate_runs_one_group_pipeline(mongo_db, make_beanie_storage):
+    storage = await make_beanie_storage()
+    collection = mongo_db["audit_logs"]
+    hour = datetime(2024, 1, 1, 10, tzinfo=UTC)
+    collection.results = [
+        [
+            {
+                "_id": {"path": "/items", "_bucket": hour},
+                "count": 4,
+                "errors": 1,
+                "avg": 12.5,
+                "percentiles": [10.0, 20.0, 30.0],
+            }
+        ]
+    ]
+
+    rows = await storage.aggregate(
+        AuditFilters(method="GET"), group_by=["path"], bucket="hour"
+    )
+
+    (_, pipeline) = collection.calls[-1]
+    match, group = pipeline
+    assert match == {"$match": {"method": "GET"}}
+    assert group["$group"]["_id"] == {
+        "path": "$path",
+        "_bucket": {"$dateTrunc": {"date": "$timestamp", "unit": "hour"}},
+    }
+    assert group["$group"]["percentiles"] == {
+        "$percentile": {
+            "input": "$duration_ms",
+            "p": [0.5, 0.95, 0.99],
+            "method": "approximate",
+        }
+    }
+    (row,) = rows
+    assert row.bucket == hour
+    assert row.group == {"path": "/items"}
+    assert (row.count, row.errors, row.error_rate) == (4, 1, 0.25)
+    assert (row.p50_duration_ms, row.p99_duration_ms) == (10.0, 30.0)
+
+
+async def test_rollups_upsert_with_inc(mongo_db, make_beanie_storage):
+    storage = await make_beanie_storage(rollups=True)
+    rollups = mongo_db["audit_logs_rollups"]
+    assert rollups.calls[0] == (
+        "create_index",
+        ([(name, 1) for name in ROLLUP_KEY], {"unique": True}),
+    )
+    rows = rollup_rows([make_entry(duration_ms=3.0), make_entry(duration_ms=7.0)])
+
+    await storage.save_rollups(rows)
+
+    kind, (requests, options) = rollups.calls[-1]
+    assert kind == "bulk_write"
+    assert options == {"ordered": False}
+    (row,) = rows
+    assert requests == [
+        UpdateOne(
+            {name: row[name] for name in ROLLUP_KEY},
+            {"$inc": {name: row[name] for name in COUNTER_COLUMNS}},
+            upsert=True,
+        )
+    ]
+    assert row["requests"] == 2
+    assert row["route"] == "<unmatched>"
+
+
+async def test_stored_ids_reads_only_ids(mongo_db, make_beanie_storage):
+    storage = await make_beanie_storage(rollups=True)
+    collection = mongo_db["audit_logs"]
+    stored, missing = uuid4(), uuid4()
+    collection.results = [[{"_id": stored}]]
+
+    assert await storage.stored_ids([stored, missing]) == {stored}
+
+    (_, find) = collection.calls[-1]
+    assert find["filter"] == {
+        "_id": {"$in": [Binary.from_uuid(stored), Binary.from_uuid(missing)]}
+    }
+    assert find["projection"] == {"_id": 1}
+
+
+async def test_route_stats_read_the_rollups(mongo_db, make_beanie_storage):
+    storage = await make_beanie_storage(rollups=True)
+    rollups = mongo_db["audit_logs_rollups"]
+    hour = datetime(2024, 1, 1, 10, tzinfo=UTC)
+    (row,) = rollup_rows([make_entry(duration_ms=3.0, timestamp=hour)])
+    row["_id"] = {"_bucket": hour, "route": row["route"]}
+    row["errors"] = 0
+    rollups.results = [[row]]
+
+    (stats,) = await storage.aggregate(group_by=["route"], bucket="hour")
+
+    (_, (match, group)) = rollups.calls[-1]
+    assert match == {"$match": {}}
+    assert group["$group"]["_id"] == {"route": "$route", "_bucket": "$bucket"}
+    assert stats.group == {"route": "<unmatched>"}
+    assert (stats.bucket, stats.count) == (hour, 1)
+
+
+async def test_fields_become_a_projection(mongo_db, make_beanie_storage):
+    storage = await make_beanie_storage()
+    collection = mongo_db["audit_logs"]
+    entry = make_entry()
+    collection.results = [
+        [{"_id": entry.id, "timestamp": entry.timestamp, "status_code": 200}]
+    ]
+
+    (projected,) = await storage.get_entries(fields=["status_code"])
+
+    (_, find) = collection.calls[-1]
+    assert find["projection"] == {"_id": 1, "timestamp": 1, "status_code": 1}
+    assert projected.model_fields_set == {"id", "timestamp", "status_code"}
+    assert projected.id == entry.id
+    assert projection_model(("id", "status_code")) is projection_model(
+        ("id", "status_code")
+    )
+
+
+async def test_get_entry_finds_by_id(mongo_db, make_beanie_storage):
+    storage = await make_beanie_storage()
+    collection = mongo_db["audit_logs"]
+    entry = make_entry(request_body={"name": "x"})
+    collection.results = [[as_document(entry)], []]
+
+    assert await storage.get_entry(entry.id) == entry
+    assert await storage.get_entry(uuid4()) is None
+    assert collection.calls[-2] == ("find_one", {"_id": Binary.from_uuid(entry.id)})
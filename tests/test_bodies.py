@@ -0,0 +1,78 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from auditlog_fastapi import AuditMiddleware
+from auditlog_fastapi.bodies import BodyCapture, CapturedBody, prepare_bodies
+from auditlog_fastapi.config import AuditConfig
+from auditlog_fastapi.filters import MASK_VALUE, Masker
+from auditlog_fastapi.models import AuditEntry
+
+
+def captured(payload: bytes, content_type: str = "application/json") -> CapturedBody:
+    capture = BodyCapture(10_000, content_type)
+    capture.feed(payload)
+    return capture.freeze(Masker(["password"]))
+
+
+def test_captured_body_render():
+    assert captured(b'{"password": "p", "a": 1}').render() == {
+        "password": MASK_VALUE,
+        "a": 1,
+    }
+    assert captured(b"plain text", "text/plain").render() == "plain text"
+    assert captured(b"\x89PNG", "image/png").render() == "<Binary: 4 bytes>"
+
+
+@pytest.mark.parametrize("pool", ["thread", "process"])
+async def test_prepare_bodies_offloads_large_bodies(pool):
+    executor = ProcessPoolExecutor(max_workers=1) if pool == "process" else None
+    entry = AuditEntry(
+        method="POST",
+        path="/",
+        request_body=captured(b'{"password": "p", "blob": "' + b"x" * 500 + b'"}'),
+        response_body=captured(b'{"ok": true}'),
+    )
+    await prepare_bodies([entry], offload_threshold=100, executor=executor)
+
+    assert entry.request_body["password"] == MASK_VALUE
+    assert entry.response_body == {"ok": True}
+    if executor is not None:
+        executor.shutdown()
+
+
+async def test_middleware_defers_body_processing_to_writer(memory_storage):
+    memory_storage.config = AuditConfig(
+        orm="sqlalchemy",
+        dsn="sqlite+aiosqlite:///:memory:",
+        batch_size=10,
+        batch_flush_interval=60,
+    )
+    app = FastAPI()
+    app.add_middleware(
+        AuditMiddleware,
+        storage=memory_storage,
+        log_request_body=True,
+        log_response_body=True,
+        defer_body_processing=True,
+    )
+
+    @app.post("/login")
+    async def login(data: dict):
+        return {"token": "t0k3n"}
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        await client.post("/login", json={"user": "u", "password": "p"})
+
+    pending = memory_storage.writer._pending[0]
+    assert isinstance(pending.request_body, CapturedBody)
+    assert pending.request_body.content_type == "application/json"
+
+    await memory_storage.shutdown()
+    entry = memory_storage.saved[0]
+    assert entry.request_body == {"user": "u", "password": MASK_VALUE}
+    assert entry.response_body == {"token": MASK_VALUE}
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import UTC, datetime
+
+import pytest
+
+from auditlog_fastapi import add_audit_log_routes, get_storage
+from auditlog_fastapi.cache import SingleFlightCache
+from auditlog_fastapi.config import _registry
+from auditlog_fastapi.exceptions import AuditNotConfiguredError
+from auditlog_fastapi.models import AuditEntry
+from auditlog_fastapi.query import AuditFilters
+
+
+class SlowLoader:
+    def __init__(self, value="rows", error: Exception | None = None):
+        self.calls = 0
+        self.value = value
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+async def test_concurrent_misses_share_one_load():
+    cache = SingleFlightCache(maxsize=8, ttl=60)
+    load = SlowLoader()
+    waiters = [asyncio.create_task(cache.get("latest", load)) for _ in range(5)]
+    await asyncio.sleep(0)
+    load.release.set()
+
+    assert await asyncio.gather(*waiters) == ["rows"] * 5
+    assert await cache.get("latest", load) == "rows"
+    assert load.calls == 1
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 5,
+        "size": 1,
+        "coalesced": 4,
+        "invalidations": 0,
+    }
+
+
+async def test_failed_load_reaches_every_caller_and_is_not_cached():
+    cache = SingleFlightCache()
+    load = SlowLoader(error=RuntimeError("db down"))
+    waiters = [asyncio.create_task(cache.get("k", load)) for _ in range(2)]
+    await asyncio.sleep(0)
+    load.release.set()
+
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert [str(r) for r in results] == ["db down", "db down"]
+    assert len(cache.cache) == 0
+
+
+async def test_invalidation_during_load_skips_caching_the_result():
+    cache = SingleFlightCache()
+    stale = SlowLoader("stale")
+    first = asyncio.create_task(cache.get("k", stale))
+    await asyncio.sleep(0)
+
+    assert cache.invalidate(lambda key: key == "k") == 0
+    fresh = SlowLoader("fresh")
+    fresh.release.set()
+    assert await cache.get("k", fresh) == "fresh"
+
+    stale.release.set()
+    assert await first == "stale"
+    assert await cache.get("k", fresh) == "fresh"
+    assert fresh.calls == 1
+
+
+@pytest.mark.parametrize(
+    ("filters", "matches"),
+    [
+        (AuditFilters(), True),
+        (AuditFilters(method="GET", path_prefix="/items/"), True),
+        (AuditFilters(status_min=500), False),
+        (AuditFilters(status_max=299, since=datetime(2024, 5, 1)), True),  # noqa: DTZ001
+        (AuditFilters(until=datetime(2024, 5, 1, 12, tzinfo=UTC)), False),
+        (AuditFilters(user_id="u1"), False),
+    ],
+)
+def test_filters_match_entries(filters, matches):
+    entry = AuditEntry(
+        timestamp=datetime(2024, 5, 1, 12, tzinfo=UTC),
+        method="GET",
+        path="/items/1",
+        status_code=200,
+    )
+    assert filters.matches(entry) is matches
+
+
+async def test_route_cache_is_invalidated_by_matching_writes(app, client):
+    cache = add_audit_log_routes(app, cache_ttl=60)
+    assert cache is not None
+    await client.get("/hello")
+
+    params = {"path": "/hello"}
+    first = await client.get("/audit-logs", params=params)
+    # The audit route's own entries do not match the filter
+    second = await client.get("/audit-logs", params=params)
+    assert len(first.json()) == len(second.json()) == 1
+    assert (cache.cache.hits, cache.cache.misses) == (1, 1)
+
+    await client.get("/hello")
+    third = await client.get("/audit-logs", params=params)
+    assert len(third.json()) == 2
+    assert cache.invalidations == 1
+    # Hooked up once, when the routes were added
+    assert len(get_storage().writer._listeners) == 1
+
+
+async def test_route_cache_needs_a_configured_storage(app):
+    _registry.clear()
+    with pytest.raises(AuditNotConfiguredError):
+        add_audit_log_routes(app, cache_ttl=60)
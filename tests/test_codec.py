@@ -0,0 +1,101 @@
+from datetime import UTC, datetime
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+
+from auditlog_fastapi.codec import JSONCodec, get_codec
+from auditlog_fastapi.config import AuditConfig
+from auditlog_fastapi.models import AuditEntry
+from auditlog_fastapi.storage.sqlalchemy_storage import SQLAlchemyStorage
+
+
+@pytest.fixture(params=["stdlib", "orjson", "msgspec"])
+def codec(request):
+    pytest.importorskip(request.param if request.param != "stdlib" else "json")
+    return get_codec(request.param)
+
+
+def test_round_trip(codec):
+    data = {"a": [1, 2.5, None, True], "nested": {"text": "héllo"}}
+    assert codec.loads(codec.dumps(data)) == data
+    assert codec.loads(codec.dumpb(data)) == data
+
+
+def test_extra_types(codec):
+    user_id = uuid4()
+    now = datetime(2024, 1, 2, 3, 4, 5, tzinfo=UTC)
+    value = codec.loads(codec.dumps({"id": user_id, "at": now, "n": Decimal("1.5")}))
+    assert value["id"] == str(user_id)
+    assert datetime.fromisoformat(value["at"]) == now
+    assert value["n"] in ("1.5", 1.5)
+
+
+def test_large_integers_fall_back(codec):
+    assert codec.loads(codec.dumps({"n": 2**70})) == {"n": 2**70}
+
+
+def test_auto_prefers_fast_library():
+    codec = get_codec("auto")
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        return
+    assert codec.name == "orjson"
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError, match="Unknown JSON codec"):
+        get_codec("simplejson")
+
+
+def test_missing_library_falls_back(monkeypatch):
+    import auditlog_fastapi.codec as codec_module
+
+    class Missing(JSONCodec):
+        name = "orjson"
+
+        def __init__(self):
+            raise ImportError("orjson")
+
+    monkeypatch.setitem(codec_module._CODECS, "orjson", Missing)
+    get_codec.cache_clear()
+    try:
+        with pytest.warns(UserWarning, match="not installed"):
+            codec = get_codec("orjson")
+        assert type(codec) is JSONCodec
+    finally:
+        get_codec.cache_clear()
+
+
+def test_codec_is_picklable(codec):
+    import pickle
+
+    assert pickle.loads(pickle.dumps(codec)) is codec
+
+
+@pytest.mark.parametrize("name", ["stdlib", "orjson"])
+async def test_sqlalchemy_uses_codec(name):
+    config = AuditConfig(
+        orm="sqlalchemy",
+        dsn="sqlite+aiosqlite:///:memory:",
+        json_codec=name,
+    )
+    storage = SQLAlchemyStorage(config)
+    await storage.startup()
+    try:
+        ref = uuid4()
+        await storage.save(
+            AuditEntry(
+                method="POST",
+                path="/orders",
+                request_body={"ref": ref, "items": [1, 2]},
+                extra={"at": datetime(2024, 1, 1, tzinfo=UTC)},
+                duration_ms=1.0,
+            )
+        )
+        [entry] = await storage.get_entries()
+        assert entry.request_body == {"ref": str(ref), "items": [1, 2]}
+        assert entry.extra == {"at": "2024-01-01T00:00:00+00:00"}
+    finally:
+        await storage.shutdown()
@@ -0,0 +1,175 @@
+import csv
+import io
+import json
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from auditlog_fastapi import add_audit_log_routes
+from auditlog_fastapi.codec import JSONCodec
+from auditlog_fastapi.export import export_chunks
+from auditlog_fastapi.models import ENTRY_FIELDS, AuditEntry
+from auditlog_fastapi.query import AuditFilters
+from auditlog_fastapi.storage.base import AuditStorage
+
+T0 = datetime(2024, 5, 1, tzinfo=UTC)
+
+
+def make_entries(count: int) -> list[AuditEntry]:
+    return [
+        AuditEntry(
+            timestamp=T0 + timedelta(seconds=i),
+            method="GET",
+            path=f"/items/{i}",
+            status_code=500 if i % 5 == 0 else 200,
+            query_params={"page": str(i)},
+        )
+        for i in range(count)
+    ]
+
+
+async def collect(iterator) -> list:
+    return [item async for item in iterator]
+
+
+@pytest.fixture
+async def storage(make_sql_storage):
+    storage = await make_sql_storage()
+    await storage.save_batch(make_entries(25))
+    return storage
+
+
+async def test_iter_entries_streams_everything(storage):
+    entries = await collect(storage.iter_entries(batch_size=4))
+    assert [e.path for e in entries] == [f"/items/{i}" for i in reversed(range(25))]
+    assert entries[0].query_params == {"page": "24"}
+
+    errors = await collect(storage.iter_entries(AuditFilters(status_min=500), 2))
+    assert len(errors) == 5
+
+
+async def test_keyset_fallback_matches_streaming(storage):
+    # The generic implementation pages through get_entries()
+    fallback = await collect(AuditStorage.iter_entries(storage, batch_size=7))
+    streamed = await collect(storage.iter_entries(batch_size=7))
+    assert [e.id for e in fallback] == [e.id for e in streamed]
+
+
+async def entries_of(items):
+    for item in items:
+        yield item
+
+
+async def test_export_ndjson_chunks():
+    entries = make_entries(5)
+    chunks = await collect(export_chunks(entries_of(entries), rows_per_chunk=2))
+    assert len(chunks) == 3
+    lines = "".join(chunks).splitlines()
+    assert [json.loads(line)["path"] for line in lines] == [e.path for e in entries]
+
+
+async def test_export_csv_with_limit():
+    chunks = await collect(export_chunks(entries_of(make_entries(5)), "csv", limit=3))
+    rows = list(csv.reader(io.StringIO("".join(chunks))))
+    assert rows[0] == list(ENTRY_FIELDS)
+    assert len(rows) == 4
+    record = dict(zip(rows[0], rows[1], strict=True))
+    assert record["path"] == "/items/0"
+    assert json.loads(record["query_params"]) == {"page": "0"}
+    assert record["user_id"] == ""
+
+
+async def test_export_closes_entries_stopped_early():
+    closed = []
+
+    async def entries():
+        try:
+            for entry in make_entries(5):
+                yield entry
+        finally:
+            closed.append(True)
+
+    stream = entries()
+    chunks = await collect(export_chunks(stream, limit=2))
+    assert len("".join(chunks).splitlines()) == 2
+    assert closed == [True]
+
+    # A client disconnect closes the export while it waits to send a chunk
+    stream = entries()
+    export = export_chunks(stream, rows_per_chunk=1)
+    await anext(export)
+    await export.aclose()
+    assert closed == [True, True]
+
+
+async def test_export_csv_neutralizes_formulas():
+    entry = AuditEntry(
+        method="GET",
+        path="/=cmd",
+        user_agent='=HYPERLINK("http://evil")',
+        username="@admin",
+        user_id="-1",
+        action="+sum",
+        resource_id="\tx",
+        status_code=200,
+    )
+    chunks = await collect(export_chunks(entries_of([entry]), "csv"))
+    header, row = csv.reader(io.StringIO("".join(chunks)))
+    record = dict(zip(header, row, strict=True))
+    assert record["path"] == "/=cmd"
+    assert record["user_agent"] == '\'=HYPERLINK("http://evil")'
+    assert record["username"] == "'@admin"
+    assert record["user_id"] == "'-1"
+    assert record["action"] == "'+sum"
+    assert record["resource_id"] == "'\tx"
+    assert record["status_code"] == "200"
+
+
+async def test_export_csv_uses_the_codec():
+    class Codec(JSONCodec):
+        def dumps(self, obj):
+            return "keys:" + ",".join(obj)
+
+    chunks = await collect(
+        export_chunks(entries_of(make_entries(1)), "csv", codec=Codec())
+    )
+    header, row = csv.reader(io.StringIO("".join(chunks)))
+    assert dict(zip(header, row, strict=True))["query_params"] == "keys:page"
+
+
+async def test_export_route(app, client):
+    add_audit_log_routes(app)
+    for _ in range(3):
+        await client.get("/hello")
+
+    response = await client.get("/audit-logs/export", params={"path": "/hello"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert len(response.text.splitlines()) == 3
+
+    response = await client.get(
+        "/audit-logs/export", params={"format": "csv", "limit": 2}
+    )
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="audit-logs.csv"' in response.headers["content-disposition"]
+    assert len(response.text.splitlines()) == 3
+
+
+async def test_asyncpg_iter_entries_uses_a_cursor(pg_conn, make_asyncpg_storage):
+    storage = make_asyncpg_storage()
+    pg_conn.rows = [
+        {**e.model_dump(), "query_params": None, "extra": None} for e in make_entries(3)
+    ]
+
+    entries = await collect(
+        storage.iter_entries(AuditFilters(user_id="u1"), batch_size=50)
+    )
+
+    assert [e.path for e in entries] == ["/items/0", "/items/1", "/items/2"]
+    assert pg_conn.calls == [
+        (
+            "cursor",
+            "SELECT * FROM audit_logs WHERE user_id = $1 "
+            "ORDER BY timestamp DESC, id DESC",
+            ("u1", 50),
+        )
+    ]
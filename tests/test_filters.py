@@ -1,4 +1,4 @@
-from auditlog_fastapi.filters import mask_sensitive_fields
+from auditlog_fastapi.filters import MASK_VALUE, Masker, mask_sensitive_fields
 
 
 def test_mask_sensitive_fields_top_level():
@@ -31,3 +31,62 @@ def test_mask_sensitive_fields_case_insensitive():
     masked = mask_sensitive_fields(data, ["password", "token"])
     assert masked["PASSWORD"] == "***REDACTED***"
     assert masked["Token"] == "***REDACTED***"
+
+
+def test_masker_json_path_rules():
+    masker = Masker(["user.card.number", "items[*].cvv", "items[0].pin"])
+    data = {
+        "user": {"card": {"number": "4111", "exp": "12/30"}, "number": "keep"},
+        "items": [{"cvv": "123", "pin": "1"}, {"cvv": "456", "pin": "2"}],
+        "number": "keep",
+    }
+    masked = masker.mask(data)
+
+    assert masked["user"]["card"] == {"number": MASK_VALUE, "exp": "12/30"}
+    assert masked["user"]["number"] == "keep"
+    assert masked["items"] == [
+        {"cvv": MASK_VALUE, "pin": MASK_VALUE},
+        {"cvv": MASK_VALUE, "pin": "2"},
+    ]
+    assert masked["number"] == "keep"
+
+
+def test_masker_is_copy_on_write():
+    masker = Masker(["password"])
+    clean = {"a": {"b": [1, 2, {"c": "d"}]}, "e": ["f"]}
+    assert masker.mask(clean) is clean
+
+    data = {"untouched": {"x": [1, 2]}, "login": {"password": "p", "user": "u"}}
+    masked = masker.mask(data)
+    assert masked is not data
+    assert masked["untouched"] is data["untouched"]
+    assert masked["login"] == {"password": MASK_VALUE, "user": "u"}
+    assert data["login"]["password"] == "p"
+
+
+def test_masker_leaves_plain_strings_unparsed():
+    masker = Masker(["token"])
+    assert masker.mask("a=b") == "a=b"
+    assert masker.mask("x==y") == "x==y"
+    assert masker.mask({"q": "token=abc"}) == {"q": "token=%2A%2A%2AREDACTED%2A%2A%2A"}
+
+
+async def test_middleware_masks_query_params(memory_storage):
+    from fastapi import FastAPI
+    from httpx import ASGITransport, AsyncClient
+
+    from auditlog_fastapi import AuditMiddleware
+
+    app = FastAPI()
+    app.add_middleware(AuditMiddleware, storage=memory_storage)
+
+    @app.get("/search")
+    async def search():
+        return []
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        await client.get("/search?q=shoes&api_key=abc")
+
+    assert memory_storage.saved[0].query_params == {"q": "shoes", "api_key": MASK_VALUE}
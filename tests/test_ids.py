@@ -0,0 +1,110 @@
+import time
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from auditlog_fastapi.config import AuditConfig
+from auditlog_fastapi.ids import get_id_factory, uuid7
+from auditlog_fastapi.models import AuditEntry
+from auditlog_fastapi.storage.sqlalchemy_storage import SQLAlchemyStorage
+
+
+def test_uuid7_layout():
+    before = time.time_ns() // 1_000_000
+    value = uuid7()
+    after = time.time_ns() // 1_000_000
+
+    assert value.version == 7
+    assert value.variant == "specified in RFC 4122"
+    assert before <= value.int >> 80 <= after + 1
+
+
+def test_uuid7_sorts_in_creation_order():
+    ids = [uuid7() for _ in range(20_000)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    # The text form used on SQLite/MySQL sorts the same way
+    assert [str(i) for i in ids] == sorted(str(i) for i in ids)
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError, match="Unknown id strategy"):
+        get_id_factory("snowflake")
+
+
+async def test_middleware_uses_configured_strategy(memory_storage):
+    from fastapi import FastAPI
+    from httpx import ASGITransport, AsyncClient
+
+    from auditlog_fastapi import AuditMiddleware
+
+    memory_storage.config = make_config(id_strategy="uuid7")
+    app = FastAPI()
+    app.add_middleware(AuditMiddleware, storage=memory_storage)
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        await client.get("/missing")
+
+    [entry] = memory_storage.saved
+    assert entry.id.version == 7
+
+
+def make_config(**kwargs) -> AuditConfig:
+    return AuditConfig(orm="sqlalchemy", dsn="sqlite+aiosqlite:///:memory:", **kwargs)
+
+
+@pytest.mark.parametrize("strategy", ["uuid4", "uuid7"])
+async def test_sqlalchemy_orders_newest_first(strategy):
+    storage = SQLAlchemyStorage(make_config(id_strategy=strategy))
+    await storage.startup()
+    try:
+        factory = get_id_factory(strategy)
+        start = datetime.now(UTC)
+        entries = [
+            AuditEntry(
+                id=factory(),
+                timestamp=start + timedelta(milliseconds=i),
+                method="GET",
+                path=f"/items/{i}",
+            )
+            for i in range(5)
+        ]
+        await storage.save_batch(entries)
+
+        stored = await storage.get_entries()
+        assert [e.id for e in stored] == [e.id for e in reversed(entries)]
+    finally:
+        await storage.shutdown()
+
+
+async def test_uuid7_listing_keeps_older_uuid4_rows_in_time_order():
+    storage = SQLAlchemyStorage(make_config(id_strategy="uuid7"))
+    await storage.startup()
+    try:
+        now = datetime.now(UTC)
+        old = [
+            AuditEntry(
+                timestamp=now - timedelta(days=1, seconds=i),
+                method="GET",
+                path=f"/old{i}",
+            )
+            for i in range(5)
+        ]
+        new = [
+            AuditEntry(
+                id=uuid7(),
+                timestamp=now + timedelta(seconds=i),
+                method="GET",
+                path="/new",
+            )
+            for i in range(5)
+        ]
+        await storage.save_batch([*old, *new])
+
+        stored = await storage.get_entries()
+        assert [e.path for e in stored[:5]] == ["/new"] * 5
+        assert [e.path for e in stored[5:]] == [f"/old{i}" for i in range(5)]
+    finally:
+        await storage.shutdown()
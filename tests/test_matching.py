@@ -0,0 +1,59 @@
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from auditlog_fastapi import AuditMiddleware
+from auditlog_fastapi.matching import PathMatcher
+
+
+def test_matcher_exact_paths():
+    matcher = PathMatcher(paths=["/health", "/metrics"])
+    assert matcher.matches("/health")
+    assert not matcher.matches("/health/live")
+    assert not matcher.matches("/users")
+
+
+def test_matcher_prefixes():
+    matcher = PathMatcher(prefixes=["/static", "/docs/", "/a"])
+    assert matcher.matches("/static/app.js")
+    assert matcher.matches("/staticfiles")
+    assert matcher.matches("/docs/index.html")
+    assert not matcher.matches("/docs")
+    assert not matcher.matches("/users")
+    assert not matcher.matches("")
+
+
+def test_matcher_route_templates():
+    matcher = PathMatcher(
+        routes=["/users/{id:int}", "/files/{path:path}", "/{tenant}/ping"]
+    )
+    assert matcher.matches("/users/42")
+    assert not matcher.matches("/users/me")
+    assert not matcher.matches("/users/42/orders")
+    assert matcher.matches("/files/a/b/c.txt")
+    assert matcher.matches("/acme/ping")
+    assert not matcher.matches("/acme/pong")
+
+
+@pytest.mark.asyncio
+async def test_middleware_skips_compiled_rules(memory_storage):
+    app = FastAPI()
+    app.add_middleware(
+        AuditMiddleware,
+        storage=memory_storage,
+        skip_paths=["/health"],
+        skip_path_prefixes=["/internal/"],
+        skip_routes=["/users/{user_id}/avatar"],
+    )
+
+    @app.get("/{full_path:path}")
+    async def catch_all(full_path: str):
+        return {"path": full_path}
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        for url in ["/health", "/internal/stats", "/users/7/avatar", "/users/7"]:
+            await client.get(url)
+
+    assert [e.path for e in memory_storage.saved] == ["/users/7"]
@@ -1,11 +1,13 @@
 import asyncio
 
 import pytest
-from fastapi import FastAPI
-from httpx import AsyncClient
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from httpx import ASGITransport, AsyncClient
 from sqlalchemy import select
 
 from auditlog_fastapi import (
+    AuditMiddleware,
     get_storage,
     set_audit_action,
     set_audit_extra,
@@ -99,3 +101,179 @@ async def test_context_helpers(client: AsyncClient, app: FastAPI):
 
         extra = json.loads(entry.extra)
         assert extra["foo"] == "bar"
+
+
+@pytest.mark.asyncio
+async def test_middleware_keeps_route_background_tasks(
+    client: AsyncClient, app: FastAPI
+):
+    from fastapi import BackgroundTasks
+
+    calls = []
+
+    @app.get("/with-background")
+    async def with_background(background_tasks: BackgroundTasks):
+        background_tasks.add_task(calls.append, "ran")
+        return {"status": "ok"}
+
+    response = await client.get("/with-background")
+    assert response.status_code == 200
+    await asyncio.sleep(0.1)
+
+    assert calls == ["ran"]
+    entries = await get_storage().get_entries(path="/with-background")
+    assert len(entries) == 1
+    assert entries[0].status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_middleware_passes_streaming_responses_through(
+    client: AsyncClient, app: FastAPI
+):
+    async def chunks():
+        for i in range(3):
+            yield f"chunk-{i};".encode()
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse(chunks(), status_code=202)
+
+    response = await client.get("/stream?page=2")
+    assert response.content == b"chunk-0;chunk-1;chunk-2;"
+    await asyncio.sleep(0.1)
+
+    entries = await get_storage().get_entries(path="/stream")
+    assert len(entries) == 1
+    assert entries[0].status_code == 202
+    assert entries[0].query_params == {"page": "2"}
+
+
+def make_app(storage, **options) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(AuditMiddleware, storage=storage, **options)
+
+    @app.post("/echo")
+    async def echo(data: dict):
+        return data
+
+    @app.get("/download")
+    async def download(media_type: str = "application/octet-stream"):
+        async def chunks():
+            for _ in range(10):
+                yield b"x" * 1000
+
+        return StreamingResponse(chunks(), media_type=media_type)
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        return {"size": len(await request.body())}
+
+    return app
+
+
+async def request(app: FastAPI, method: str, url: str, **kwargs):
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        return await client.request(method, url, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_middleware_captures_and_masks_response_body(memory_storage):
+    app = make_app(memory_storage, log_response_body=True)
+
+    data = {"name": "test-item", "token": "dont-log-me"}
+    response = await request(app, "POST", "/echo", json=data)
+    assert response.json() == data
+
+    entry = memory_storage.saved[0]
+    assert entry.response_body == {"name": "test-item", "token": MASK_VALUE}
+
+
+@pytest.mark.asyncio
+async def test_middleware_truncates_large_response_body(memory_storage):
+    app = make_app(memory_storage, log_response_body=True, max_body_size=5_000)
+
+    response = await request(app, "GET", "/download?media_type=text/plain")
+    assert len(response.content) == 10_000
+
+    entry = memory_storage.saved[0]
+    assert entry.response_body == "<Truncated: 10000 bytes>"
+
+
+@pytest.mark.asyncio
+async def test_middleware_does_not_decode_binary_response_body(memory_storage):
+    app = make_app(memory_storage, log_response_body=True)
+
+    await request(app, "GET", "/download")
+    assert memory_storage.saved[0].response_body == "<Binary: 10000 bytes>"
+
+
+@pytest.mark.asyncio
+async def test_middleware_streams_large_request_body(memory_storage):
+    app = make_app(memory_storage, log_request_body=True, max_body_size=100)
+
+    data = {"blob": "y" * 1_000}
+    response = await request(app, "POST", "/echo", json=data)
+    assert response.json() == data
+
+    entry = memory_storage.saved[0]
+    assert entry.request_body.startswith("<Truncated: ")
+
+
+@pytest.mark.asyncio
+async def test_middleware_does_not_parse_multipart_request_body(memory_storage):
+    app = make_app(memory_storage, log_request_body=True)
+
+    await request(app, "POST", "/upload", files={"file": ("a.bin", b"\x00" * 64)})
+    assert memory_storage.saved[0].request_body.startswith("<Binary: ")
+
+
+@pytest.mark.asyncio
+async def test_middleware_skips_response_body_by_default(memory_storage):
+    app = make_app(memory_storage)
+
+    await request(app, "POST", "/echo", json={"a": 1})
+    assert memory_storage.saved[0].response_body is None
+
+
+async def test_current_entry_changes_are_recorded(memory_storage):
+    from auditlog_fastapi.context import get_current_audit_entry
+    from auditlog_fastapi.models import AuditEntry
+
+    app = make_app(memory_storage)
+
+    @app.get("/annotated")
+    async def annotated():
+        entry = get_current_audit_entry()
+        assert isinstance(entry, AuditEntry)
+        assert entry.path == "/annotated"
+        entry.action = "report.view"
+        set_audit_resource("report", "7")
+        entry.extra["rows"] = 3
+        return {"status": "ok"}
+
+    await request(app, "GET", "/annotated")
+
+    [entry] = memory_storage.saved
+    assert entry.action == "report.view"
+    assert (entry.resource_type, entry.resource_id) == ("report", "7")
+    assert entry.extra == {"rows": 3}
+    assert entry.status_code == 200
+
+
+async def test_on_error_receives_audit_entry(memory_storage):
+    from auditlog_fastapi.models import AuditEntry
+
+    async def failing_save(entry):
+        raise RuntimeError("db down")
+
+    memory_storage.save = failing_save
+    errors = []
+    app = make_app(memory_storage, on_error=lambda _exc, entry: errors.append(entry))
+
+    await request(app, "GET", "/download")
+
+    [entry] = errors
+    assert isinstance(entry, AuditEntry)
+    assert entry.path == "/download"
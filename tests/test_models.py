@@ -0,0 +1,46 @@
+from auditlog_fastapi.models import (
+    ENTRY_FIELDS,
+    AuditEntry,
+    AuditRecord,
+    entry_values,
+)
+
+
+def test_record_round_trip():
+    record = AuditRecord("POST", "/orders", {"page": "1"}, "10.0.0.1", "curl")
+    record.status_code = 201
+    record.extra["k"] = "v"
+
+    entry = record.to_entry()
+    assert isinstance(entry, AuditEntry)
+    assert entry.id == record.id
+    assert (
+        entry.model_dump()
+        == AuditEntry.model_validate(entry_values(entry)).model_dump()
+    )
+    assert AuditRecord.from_entry(entry).as_dict() == record.as_dict()
+
+
+def test_record_has_no_instance_dict():
+    record = AuditRecord("GET", "/")
+    assert not hasattr(record, "__dict__")
+    assert set(record.as_dict()) == set(ENTRY_FIELDS)
+
+
+def test_entry_values_match_for_entries_and_records():
+    entry = AuditEntry(method="GET", path="/a", status_code=200)
+    assert entry_values(entry) == entry_values(AuditRecord.from_entry(entry))
+
+
+def test_view_changes_are_synced_back():
+    record = AuditRecord("GET", "/")
+    view = record.view()
+    assert record.view() is view
+
+    view.action = "item.read"
+    record.annotate(resource_type="item", resource_id="1")
+    assert view.resource_id == "1"
+
+    record.sync_view()
+    assert record.action == "item.read"
+    assert record.resource_id == "1"
@@ -0,0 +1,89 @@
+from datetime import UTC, datetime
+from uuid import uuid4
+
+import pytest
+
+from auditlog_fastapi import add_audit_log_routes
+from auditlog_fastapi.exceptions import InvalidCursorError
+from auditlog_fastapi.ids import uuid7
+from auditlog_fastapi.models import AuditEntry
+from auditlog_fastapi.pagination import decode_cursor, encode_cursor, make_page
+
+
+def test_cursor_round_trip():
+    entry = AuditEntry(method="GET", path="/")
+    cursor = encode_cursor(entry)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (entry.timestamp, entry.id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "bm90fGE"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
+
+
+def test_make_page_uses_the_extra_row():
+    rows = [AuditEntry(method="GET", path=f"/{i}") for i in range(3)]
+    assert make_page(rows[:2], limit=2).next_cursor is None
+    page = make_page(rows, limit=2)
+    assert page == rows[:2]
+    assert page.next_cursor == encode_cursor(rows[1])
+
+
+@pytest.fixture(params=["uuid4", "uuid7"])
+async def storage(request, make_sql_storage):
+    return await make_sql_storage(id_strategy=request.param)
+
+
+async def test_keyset_pages_cover_every_entry_once(storage):
+    # uuid7 tables still hold uuid4 rows (written before the switch)
+    uuid7_table = storage.config.id_strategy == "uuid7"
+    # Shared timestamps force the id tie-breaker to do its job
+    timestamps = [datetime(2024, 1, 1, 12, i // 4, tzinfo=UTC) for i in range(23)]
+    entries = [
+        AuditEntry(
+            id=uuid7() if uuid7_table and i % 2 else uuid4(),
+            timestamp=ts,
+            method="GET",
+            path="/items",
+        )
+        for i, ts in enumerate(timestamps)
+    ]
+    await storage.save_batch(entries)
+
+    expected = await storage.get_entries(limit=100)
+    seen, cursor, pages = [], None, 0
+    while True:
+        page = await storage.get_entries(limit=10, cursor=cursor)
+        seen.extend(e.id for e in page)
+        pages += 1
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert seen == [e.id for e in expected]
+    assert [e.timestamp.replace(tzinfo=None) for e in expected] == [
+        ts.replace(tzinfo=None) for ts in reversed(timestamps)
+    ]
+    assert len(set(seen)) == 23
+    assert expected.next_cursor is None
+
+
+async def test_route_returns_next_cursor_header(app, client):
+    add_audit_log_routes(app)
+    for _ in range(3):
+        await client.get("/hello")
+
+    first = await client.get("/audit-logs", params={"limit": 2})
+    assert first.status_code == 200
+    assert len(first.json()) == 2
+    cursor = first.headers["X-Next-Cursor"]
+
+    second = await client.get("/audit-logs", params={"limit": 2, "cursor": cursor})
+    assert [e["path"] for e in second.json()] == ["/hello"]
+    assert "X-Next-Cursor" not in second.headers
+
+    bad = await client.get("/audit-logs", params={"cursor": "garbage"})
+    assert bad.status_code == 400
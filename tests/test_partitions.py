@@ -0,0 +1,73 @@
+from datetime import date
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from auditlog_fastapi.db.sqlalchemy_table import idempotent_insert, make_audit_table
+from auditlog_fastapi.partitions import PartitionMaintainer, PartitionManager
+
+
+def test_monthly_partitions():
+    manager = PartitionManager("audit_logs", "month", premake=2)
+    starts = manager.upcoming(date(2024, 11, 20))
+    assert starts == [date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1)]
+    assert manager.name(starts[-1]) == "audit_logs_p202501"
+    assert manager.create_partition_sql(starts[1]) == (
+        "CREATE TABLE IF NOT EXISTS audit_logs_p202412 PARTITION OF audit_logs "
+        "FOR VALUES FROM ('2024-12-01 00:00:00+00') TO ('2025-01-01 00:00:00+00')"
+    )
+
+
+def test_daily_partitions():
+    manager = PartitionManager("audit_logs", "day", premake=1)
+    assert manager.upcoming(date(2024, 2, 29)) == [date(2024, 2, 29), date(2024, 3, 1)]
+    assert manager.parse_name("audit_logs_p20240229") == date(2024, 2, 29)
+    assert manager.parse_name("audit_logs_p202402") is None
+    assert manager.parse_name("audit_logs_default") is None
+
+
+def test_expired_partitions():
+    manager = PartitionManager("audit_logs", "month", retention_days=90)
+    names = [
+        "audit_logs_default",
+        "audit_logs_p202407",
+        "audit_logs_p202408",
+        "audit_logs_p202411",
+        "other_table_p202301",
+    ]
+    # Cutoff is 2024-08-17: only July has fully left the window
+    assert manager.expired(names, date(2024, 11, 15)) == ["audit_logs_p202407"]
+    assert PartitionManager("audit_logs").expired(names, date(2024, 11, 15)) == []
+
+
+async def test_maintainer_creates_and_drops_partitions():
+    executed = []
+
+    async def execute(sql):
+        executed.append(sql)
+
+    async def fetch_names(sql):
+        return ["audit_logs_default", "audit_logs_p20240101", "audit_logs_p20240301"]
+
+    manager = PartitionManager("audit_logs", "day", premake=1, retention_days=30)
+    maintainer = PartitionMaintainer(manager, execute, fetch_names)
+    dropped = await maintainer.run_once(today=date(2024, 3, 1))
+
+    assert dropped == ["audit_logs_p20240101"]
+    assert executed[0].endswith("PARTITION OF audit_logs DEFAULT")
+    assert "audit_logs_p20240302" in executed[2]
+    assert executed[-2:] == [
+        "ALTER TABLE audit_logs DETACH PARTITION audit_logs_p20240101",
+        "DROP TABLE audit_logs_p20240101",
+    ]
+
+
+def test_partitioned_sqlalchemy_table():
+    table = make_audit_table("audit_logs_partitioned", use_jsonb=True, partitioned=True)
+    ddl = str(CreateTable(table.__table__).compile(dialect=postgresql.dialect()))
+    assert "PARTITION BY RANGE (timestamp)" in ddl
+    assert "PRIMARY KEY (id, timestamp)" in ddl
+
+    insert = idempotent_insert(table, "postgresql", ("id", "timestamp"))
+    sql = str(insert.compile(dialect=postgresql.dialect()))
+    assert sql.endswith("ON CONFLICT (id, timestamp) DO NOTHING")
@@ -0,0 +1,105 @@
+from uuid import uuid4
+
+import pytest
+
+from auditlog_fastapi import add_audit_log_routes
+from auditlog_fastapi.models import AuditEntry, select_fields
+
+
+def make_entries(count: int) -> list[AuditEntry]:
+    return [
+        AuditEntry(
+            method="POST",
+            path=f"/items/{i}",
+            status_code=201,
+            request_body={"name": f"item {i}"},
+            response_body={"id": i},
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+async def storage(make_sql_storage):
+    storage = await make_sql_storage()
+    await storage.save_batch(make_entries(5))
+    return storage
+
+
+def test_select_fields():
+    assert select_fields(None, False) is None
+    assert select_fields(["status_code"], False) == ("id", "timestamp", "status_code")
+    columns = select_fields(None, True)
+    assert columns is not None
+    assert "request_body" not in columns
+    assert "response_body" not in columns
+    with pytest.raises(ValueError, match="password"):
+        select_fields(["password"], False)
+
+
+async def test_fields_read_only_the_selected_columns(storage):
+    page = await storage.get_entries(limit=2, fields=["status_code"])
+
+    assert len(page) == 2
+    assert page.next_cursor is not None
+    entry = page[0]
+    assert entry.model_fields_set == {"id", "timestamp", "status_code"}
+    assert entry.model_dump(exclude_unset=True).keys() == entry.model_fields_set
+
+    rest = await storage.get_entries(fields=["path"], cursor=page.next_cursor)
+    assert [e.path for e in rest] == ["/items/2", "/items/1", "/items/0"]
+
+
+async def test_exclude_bodies_and_get_entry(storage):
+    page = await storage.get_entries(limit=1, exclude_bodies=True)
+    entry = page[0]
+    assert entry.path == "/items/4"
+    assert "request_body" not in entry.model_fields_set
+    assert "response_body" not in entry.model_fields_set
+
+    full = await storage.get_entry(entry.id)
+    assert full is not None
+    assert full.request_body == {"name": "item 4"}
+    assert full.response_body == {"id": 4}
+    assert await storage.get_entry(uuid4()) is None
+
+
+async def test_get_entry_fallback_scans_the_entries(memory_storage):
+    entries = make_entries(3)
+    memory_storage.saved.extend(entries)
+
+    assert await memory_storage.get_entry(entries[1].id) is entries[1]
+    assert await memory_storage.get_entry(uuid4()) is None
+
+
+async def test_asyncpg_selects_only_the_requested_columns(
+    pg_conn, make_asyncpg_storage
+):
+    storage = make_asyncpg_storage()
+    entry = make_entries(1)[0]
+    pg_conn.rows = [{"id": entry.id, "timestamp": entry.timestamp}]
+
+    page = await storage.get_entries(fields=["timestamp"])
+
+    assert pg_conn.calls[0][1].startswith("SELECT id, timestamp FROM audit_logs")
+    assert page[0].model_fields_set == {"id", "timestamp"}
+
+
+async def test_projection_routes(app, client):
+    add_audit_log_routes(app)
+    await client.post("/echo", json={"name": "x"})
+
+    response = await client.get(
+        "/audit-logs", params={"fields": ["path", "method"], "exclude_bodies": True}
+    )
+    assert response.status_code == 200
+    item = response.json()[0]
+    assert set(item) == {"id", "timestamp", "method", "path"}
+
+    response = await client.get(f"/audit-logs/{item['id']}")
+    assert response.status_code == 200
+    assert response.json()["request_body"] == {"name": "x"}
+
+    assert (await client.get(f"/audit-logs/{uuid4()}")).status_code == 404
+    response = await client.get("/audit-logs", params={"fields": "password"})
+    assert response.status_code == 400
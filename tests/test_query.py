@@ -0,0 +1,131 @@
+from datetime import UTC, datetime, timedelta, timezone
+
+import pytest
+
+from auditlog_fastapi.models import AuditEntry
+from auditlog_fastapi.query import AuditFilters, like_prefix, prefix_upper_bound
+from auditlog_fastapi.storage.tortoise_storage import TortoiseStorage
+
+T0 = datetime(2024, 5, 1, 12, 0, tzinfo=UTC)
+
+
+def test_prefix_helpers():
+    assert like_prefix("/api/100%_off\\") == "/api/100\\%\\_off\\\\%"
+    assert prefix_upper_bound("/api/pay") == "/api/paz"
+
+
+def test_filters_normalize_to_utc():
+    local = datetime(2024, 5, 1, 14, 0, tzinfo=timezone(timedelta(hours=2)))
+    filters = AuditFilters(since=local, until=datetime(2024, 5, 2))  # noqa: DTZ001
+    assert filters.since == T0
+    assert filters.since.tzinfo is UTC
+    assert filters.until.tzinfo is None
+
+
+@pytest.fixture
+async def storage(make_sql_storage):
+    storage = await make_sql_storage()
+    rows = [
+        ("/api/payments/1", 201, "u1", "order", "7", 0),
+        ("/api/payments/2", 502, "u1", "order", "8", 1),
+        ("/api/PAYMENTS/3", 500, "u2", None, None, 2),
+        ("/api/pay_out", 503, "u2", None, None, 3),
+        ("/health", 0, None, None, None, 30),
+    ]
+    await storage.save_batch(
+        [
+            AuditEntry(
+                timestamp=T0 - timedelta(hours=hours),
+                method="POST",
+                path=path,
+                status_code=status,
+                user_id=user_id,
+                resource_type=resource_type,
+                resource_id=resource_id,
+            )
+            for path, status, user_id, resource_type, resource_id, hours in rows
+        ]
+    )
+    return storage
+
+
+async def paths(storage, **filters) -> list[str]:
+    return [e.path for e in await storage.get_entries(**filters)]
+
+
+async def test_time_range(storage):
+    since = T0 - timedelta(hours=2)
+    assert await paths(storage, since=since) == [
+        "/api/payments/1",
+        "/api/payments/2",
+        "/api/PAYMENTS/3",
+    ]
+    assert await paths(storage, since=since, until=T0) == [
+        "/api/payments/2",
+        "/api/PAYMENTS/3",
+    ]
+
+
+async def test_path_prefix_is_case_sensitive_and_literal(storage):
+    assert await paths(storage, path_prefix="/api/payments") == [
+        "/api/payments/1",
+        "/api/payments/2",
+    ]
+    # "_" is not a wildcard
+    assert await paths(storage, path_prefix="/api/pay_") == ["/api/pay_out"]
+
+
+async def test_status_class(storage):
+    assert await paths(
+        storage, path_prefix="/api/pay", status_min=500, status_max=599
+    ) == ["/api/payments/2", "/api/pay_out"]
+    # 0 is a value, not "no filter"
+    assert await paths(storage, status_code=0) == ["/health"]
+
+
+async def test_user_and_resource(storage):
+    day_ago = T0 - timedelta(hours=24)
+    assert await paths(storage, user_id="u2", since=day_ago) == [
+        "/api/PAYMENTS/3",
+        "/api/pay_out",
+    ]
+    assert await paths(storage, resource_type="order", resource_id="8") == [
+        "/api/payments/2"
+    ]
+
+
+def test_asyncpg_conditions(make_asyncpg_storage):
+    storage = make_asyncpg_storage()
+    params: list = []
+    conditions = storage._conditions(
+        AuditFilters(user_id="u1", path_prefix="/api/pay_", status_min=500, since=T0),
+        params,
+    )
+    assert conditions == [
+        "user_id = $1",
+        "path LIKE $2",
+        "status_code >= $3",
+        "timestamp >= $4",
+    ]
+    assert params == ["u1", "/api/pay\\_%", 500, T0]
+
+
+def test_tortoise_lookups():
+    kwargs = TortoiseStorage._filter_kwargs(
+        AuditFilters(
+            resource_type="order",
+            resource_id="7",
+            path_prefix="/api",
+            status_max=499,
+            until=T0,
+        )
+    )
+    assert kwargs == {
+        "resource_type": "order",
+        "resource_id": "7",
+        "path__startswith": "/api",
+        "status_code__lte": 499,
+        "timestamp__lt": T0,
+    }
+    sqlite = TortoiseStorage._filter_kwargs(AuditFilters(path_prefix="/api"), "sqlite")
+    assert sqlite == {"path__gte": "/api", "path__lt": "/apj"}
@@ -86,3 +86,67 @@ async def test_user_capture_from_object(app: FastAPI, client: AsyncClient):
     entry = entries[0]
     assert entry.user_id == "obj-id"
     assert entry.username == "obj-user"
+
+
+def make_user_app(storage=None, **options) -> FastAPI:
+    from auditlog_fastapi import AuditMiddleware
+
+    app = FastAPI()
+    if storage is not None:
+        app.add_middleware(AuditMiddleware, storage=storage, **options)
+
+    @app.get("/me")
+    async def me():
+        return {"ok": True}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_get_user_called_once_per_request(memory_storage):
+    from httpx import ASGITransport
+
+    calls = []
+
+    async def get_user(request: Request):
+        calls.append(request.url.path)
+        return {"user_id": "u1", "username": "alice"}
+
+    app = make_user_app(memory_storage, get_user=get_user)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        await client.get("/me")
+
+    assert calls == ["/me"]
+    assert memory_storage.saved[0].user_id == "u1"
+
+
+@pytest.mark.asyncio
+async def test_get_user_results_are_cached_by_credential(memory_storage):
+    from httpx import ASGITransport
+
+    calls = []
+
+    async def get_user(request: Request):
+        token = request.headers["authorization"]
+        calls.append(token)
+        return {"user_id": token.removeprefix("Bearer ")}
+
+    from auditlog_fastapi import AuditMiddleware
+
+    middleware = AuditMiddleware(
+        make_user_app(),
+        storage=memory_storage,
+        get_user=get_user,
+        user_cache_ttl=60,
+    )
+    async with AsyncClient(
+        transport=ASGITransport(app=middleware), base_url="http://test"
+    ) as client:
+        for token in ["a", "a", "b", "a"]:
+            await client.get("/me", headers={"Authorization": f"Bearer {token}"})
+
+    assert calls == ["Bearer a", "Bearer b"]
+    assert [e.user_id for e in memory_storage.saved] == ["a", "a", "b", "a"]
+    assert middleware.user_cache.stats() == {"hits": 2, "misses": 2, "size": 2}
@@ -0,0 +1,172 @@
+import asyncio
+
+import pytest
+
+from auditlog_fastapi.config import AuditConfig
+from auditlog_fastapi.exceptions import CircuitOpenError
+from auditlog_fastapi.models import AuditEntry
+from auditlog_fastapi.resilience import (
+    CircuitBreaker,
+    CircuitBreakerPolicy,
+    RetryBudget,
+    RetryPolicy,
+)
+from auditlog_fastapi.storage.sqlalchemy_storage import SQLAlchemyStorage
+
+
+def make_config(**kwargs) -> AuditConfig:
+    return AuditConfig(orm="sqlalchemy", dsn="sqlite+aiosqlite:///:memory:", **kwargs)
+
+
+def make_entry(i: int = 0) -> AuditEntry:
+    return AuditEntry(method="GET", path=f"/items/{i}")
+
+
+def flaky(calls: list, failures: int):
+    """A save function failing `failures` times before succeeding."""
+
+    async def save(payload):
+        calls.append(payload)
+        if len(calls) <= failures:
+            raise ConnectionError("connection reset")
+
+    return save
+
+
+def test_retry_delay_is_jittered_and_capped():
+    policy = RetryPolicy(base_delay=0.1, max_delay=0.3)
+    for retry in range(6):
+        assert 0 <= policy.delay(retry) <= min(0.3, 0.1 * 2**retry)
+
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=0.5, maximum=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_circuit_breaker_opens_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    # After the timeout exactly one trial goes through
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+async def test_writer_retries_transient_failures(memory_storage):
+    memory_storage.config = make_config(retry=RetryPolicy(attempts=3, base_delay=0))
+    calls = []
+    memory_storage.save = flaky(calls, failures=2)
+
+    await memory_storage.write(make_entry())
+    assert len(calls) == 3
+
+
+async def test_writer_gives_up_after_attempts(memory_storage):
+    memory_storage.config = make_config(retry=RetryPolicy(attempts=2, base_delay=0))
+    calls = []
+    memory_storage.save = flaky(calls, failures=5)
+
+    with pytest.raises(ConnectionError):
+        await memory_storage.write(make_entry())
+    assert len(calls) == 2
+
+
+async def test_open_circuit_short_circuits_writes(memory_storage):
+    memory_storage.config = make_config(
+        circuit_breaker=CircuitBreakerPolicy(failure_threshold=2, reset_timeout=60)
+    )
+    calls = []
+    memory_storage.save = flaky(calls, failures=10)
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await memory_storage.write(make_entry())
+    with pytest.raises(CircuitOpenError):
+        await memory_storage.write(make_entry())
+    assert len(calls) == 2
+
+
+async def test_cancelled_trial_write_reopens_the_circuit(memory_storage):
+    memory_storage.config = make_config(
+        circuit_breaker=CircuitBreakerPolicy(failure_threshold=1, reset_timeout=0)
+    )
+    started = asyncio.Event()
+
+    async def hang(payload):
+        started.set()
+        await asyncio.Event().wait()
+
+    memory_storage.save = flaky([], failures=1)
+    with pytest.raises(ConnectionError):
+        await memory_storage.write(make_entry(0))
+    breaker = memory_storage.writer.breaker
+    assert breaker is not None
+    assert breaker.state == "open"
+
+    # The trial write is cancelled, e.g. by a client disconnect
+    memory_storage.save = hang
+    trial = asyncio.create_task(memory_storage.write(make_entry(1)))
+    await started.wait()
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+    assert breaker.state == "open"
+
+    # After the reset timeout the next trial closes the circuit again
+    memory_storage.save = flaky([], failures=0)
+    await memory_storage.write(make_entry(2))
+    assert breaker.state == "closed"
+
+
+async def test_open_circuit_keeps_batches_queued(memory_storage):
+    errors = []
+    memory_storage.config = make_config(
+        batch_size=2,
+        batch_flush_interval=60,
+        circuit_breaker=CircuitBreakerPolicy(failure_threshold=1, reset_timeout=60),
+        on_storage_error=lambda _exc, entry: errors.append(entry),
+    )
+    calls = []
+    memory_storage.save_batch = flaky(calls, failures=1)
+    writer = memory_storage.writer
+
+    writer._pending.extend([make_entry(0), make_entry(1)])
+    await writer.flush()
+    assert len(errors) == 2
+
+    writer._pending.extend([make_entry(2), make_entry(3)])
+    await writer.flush()
+    assert writer.pending == 2
+    assert len(calls) == 1
+
+    # On shutdown whatever the circuit still holds back is reported
+    await writer.close()
+    assert len(errors) == 4
+
+
+async def test_sqlalchemy_inserts_are_idempotent():
+    storage = SQLAlchemyStorage(make_config())
+    await storage.startup()
+    try:
+        entries = [make_entry(i) for i in range(3)]
+        await storage.save_batch(entries)
+        await storage.save_batch(entries)
+        await storage.save(entries[0])
+
+        assert len(await storage.get_entries()) == 3
+    finally:
+        await storage.shutdown()
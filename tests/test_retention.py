@@ -0,0 +1,103 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from auditlog_fastapi.db.sqlalchemy_table import make_audit_table, purge_statement
+from auditlog_fastapi.models import AuditEntry
+from auditlog_fastapi.retention import PurgeResult, RetentionTask
+
+NOW = datetime(2024, 6, 1, tzinfo=UTC)
+
+
+def make_entries(old: int, recent: int) -> list[AuditEntry]:
+    return [
+        AuditEntry(timestamp=NOW - timedelta(days=40 + i), method="GET", path="/old")
+        for i in range(old)
+    ] + [
+        AuditEntry(timestamp=NOW - timedelta(days=i), method="GET", path="/recent")
+        for i in range(recent)
+    ]
+
+
+@pytest.fixture
+async def storage(make_sql_storage):
+    return await make_sql_storage(retention_days=30, retention_interval=3600)
+
+
+async def count_rows(storage) -> int:
+    return len([entry async for entry in storage.iter_entries()])
+
+
+async def test_purge_older_than_deletes_in_chunks(storage):
+    await storage.save_batch(make_entries(old=7, recent=3))
+
+    result = await storage.purge_older_than(NOW - timedelta(days=30), batch_size=3)
+
+    assert result.deleted == 7
+    assert result.batches == 3
+    assert result.duration_ms >= 0
+    assert await count_rows(storage) == 3
+    entries = await storage.get_entries()
+    assert {e.path for e in entries} == {"/recent"}
+
+
+async def test_scheduled_purge_uses_retention_days(storage):
+    assert storage._retention is not None
+    await storage.save_batch(make_entries(old=2, recent=2))
+
+    result = await storage._retention.run_once(now=NOW)
+
+    assert result.deleted == 2
+    assert storage._retention.last_result == result
+    assert await count_rows(storage) == 2
+
+
+async def test_retention_task_cutoff():
+    calls = []
+
+    async def purge(cutoff, batch_size):
+        calls.append((cutoff, batch_size))
+        return PurgeResult()
+
+    task = RetentionTask(purge, retention_days=7, batch_size=100)
+    await task.run_once(now=NOW)
+    assert calls == [(NOW - timedelta(days=7), 100)]
+
+
+def compile_purge(dialect, partitioned=False) -> str:
+    table = make_audit_table("purge_audit_logs")
+    stmt = purge_statement(
+        table, dialect.name, NOW, 500, partitioned=partitioned
+    ).compile(dialect=dialect)
+    return " ".join(str(stmt).split())
+
+
+def test_purge_statement_per_dialect():
+    pg = compile_purge(postgresql.dialect())
+    assert pg.startswith("DELETE FROM purge_audit_logs WHERE ctid IN (SELECT ctid")
+    assert "LIMIT" in pg
+
+    partitioned = compile_purge(postgresql.dialect(), partitioned=True)
+    assert "(purge_audit_logs.id, purge_audit_logs.timestamp) IN" in partitioned
+
+    my = compile_purge(mysql.dialect())
+    assert my.endswith("WHERE purge_audit_logs.timestamp < %s LIMIT 500")
+
+    lite = compile_purge(sqlite.dialect())
+    assert "WHERE purge_audit_logs.id IN (SELECT purge_audit_logs.id" in lite
+
+
+async def test_asyncpg_purge_batches(pg_conn, make_asyncpg_storage):
+    storage = make_asyncpg_storage()
+    pg_conn.statuses = ["DELETE 100", "DELETE 100", "DELETE 40"]
+
+    result = await storage.purge_older_than(NOW, batch_size=100)
+
+    assert (result.deleted, result.batches) == (240, 3)
+    _, sql, args = pg_conn.calls[0]
+    assert "WHERE ctid IN (SELECT ctid FROM audit_logs" in sql
+    assert args == (NOW, 100)
+
+    partitioned = make_asyncpg_storage(partition_interval="day")
+    assert "WHERE (id, timestamp) IN" in partitioned._purge_sql
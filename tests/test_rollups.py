@@ -0,0 +1,225 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from auditlog_fastapi import AuditMiddleware
+from auditlog_fastapi.config import AuditConfig
+from auditlog_fastapi.exceptions import AuditConfigurationError, RollupError
+from auditlog_fastapi.models import AuditEntry, AuditRecord
+from auditlog_fastapi.query import AuditFilters
+from auditlog_fastapi.registry import resolve_storage
+from auditlog_fastapi.resilience import CircuitBreakerPolicy, RetryPolicy
+from auditlog_fastapi.rollups import (
+    HISTOGRAM_COLUMNS,
+    UNMATCHED_ROUTE,
+    histogram_percentile,
+    rollup_rows,
+    rollups_cover,
+)
+from auditlog_fastapi.spool import Spool
+
+T0 = datetime(2024, 5, 1, 12, 0, tzinfo=UTC)
+
+
+def make_entry(
+    minutes: int,
+    path: str = "/items/1",
+    status: int = 200,
+    ms=10.0,
+    route: str | None = "/items/{item_id}",
+) -> AuditRecord:
+    record = AuditRecord.from_entry(
+        AuditEntry(
+            timestamp=T0 + timedelta(minutes=minutes),
+            method="GET",
+            path=path,
+            status_code=status,
+            duration_ms=ms,
+        )
+    )
+    record.route = route
+    return record
+
+
+def test_rollup_rows_count_per_hour_route_method_and_status_class():
+    rows = rollup_rows(
+        [
+            make_entry(90, status=503, ms=40_000.0),
+            make_entry(0),
+            make_entry(30, status=204, ms=20.0),
+            make_entry(5, path="/wp-login.php", status=404, ms=3.0, route=None),
+        ]
+    )
+
+    assert [(r["bucket"], r["route"], r["status_class"]) for r in rows] == [
+        (T0, "/items/{item_id}", 2),
+        (T0, UNMATCHED_ROUTE, 4),
+        (T0 + timedelta(hours=1), "/items/{item_id}", 5),
+    ]
+    first = rows[0]
+    assert (first["requests"], first["duration_sum"]) == (2, 30.0)
+    assert (first["h3"], first["h4"]) == (1, 1)  # <= 10 ms and <= 25 ms
+    assert rows[2][HISTOGRAM_COLUMNS[-1]] == 1  # above the last bound
+
+
+def test_histogram_percentile():
+    counts = [0] * len(HISTOGRAM_COLUMNS)
+    counts[3] = 4  # 4 requests between 5 and 10 ms
+    assert histogram_percentile(counts, 0.5) == 7.5
+    counts[-1] = 96
+    assert histogram_percentile(counts, 0.99) == 30000.0
+    assert histogram_percentile([0] * len(HISTOGRAM_COLUMNS), 0.5) is None
+
+
+@pytest.mark.parametrize(
+    ("filters", "group_by", "bucket", "error_status", "covered"),
+    [
+        (AuditFilters(), ("route", "method"), "hour", 500, True),
+        (AuditFilters(method="GET", since=T0, until=T0), (), "day", 400, True),
+        (AuditFilters(), ("route",), None, 500, True),
+        (AuditFilters(), ("route",), "minute", 500, False),
+        (AuditFilters(), ("path",), "hour", 500, False),
+        (AuditFilters(), (), "hour", 404, False),
+        (AuditFilters(user_id="u1"), (), "hour", 500, False),
+        (AuditFilters(since=T0 + timedelta(minutes=1)), (), "hour", 500, False),
+    ],
+)
+def test_rollups_cover(filters, group_by, bucket, error_status, covered):
+    assert rollups_cover(filters, group_by, bucket, error_status) is covered
+
+
+def test_tortoise_rejects_rollups():
+    config = AuditConfig(orm="tortoise", dsn="sqlite://:memory:", rollups=True)
+    with pytest.raises(AuditConfigurationError, match="Rollups"):
+        resolve_storage(config)
+
+
+async def test_middleware_records_route_template(memory_storage):
+    app = FastAPI()
+    app.add_middleware(AuditMiddleware, storage=memory_storage)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        await client.get("/items/7")
+        await client.get("/missing")
+
+    assert [(e.path, e.route) for e in memory_storage.saved] == [
+        ("/items/7", "/items/{item_id}"),
+        ("/missing", None),
+    ]
+
+
+@pytest.fixture
+async def storage(make_sql_storage):
+    return await make_sql_storage(batch_size=10, batch_flush_interval=60, rollups=True)
+
+
+async def test_writer_maintains_rollups(storage):
+    # Two flushes hitting the same rollup rows add up
+    for batch in ([0, 10, 70], [20, 80]):
+        for minutes in batch:
+            await storage.write(
+                make_entry(minutes, status=500 if minutes > 60 else 200)
+            )
+        await storage.writer.flush()
+
+    rows = await storage.aggregate(group_by=["route"], bucket="hour")
+    assert [(r.bucket, r.group, r.count, r.errors) for r in rows] == [
+        (T0, {"route": "/items/{item_id}"}, 3, 0),
+        (T0 + timedelta(hours=1), {"route": "/items/{item_id}"}, 2, 2),
+    ]
+    assert rows[0].avg_duration_ms == 10.0
+    assert rows[0].p50_duration_ms == 7.5  # estimated from the histogram
+
+    # Same counts as the entries themselves, which answer minute buckets
+    [day] = await storage.aggregate(AuditFilters(method="GET", since=T0), bucket="day")
+    raw = await storage.aggregate(bucket="minute")
+    assert (day.count, day.errors) == (sum(r.count for r in raw), 2)
+
+
+async def test_spool_replay_counts_each_entry_once(make_sql_storage, tmp_path):
+    entries = [make_entry(minutes) for minutes in range(3)]
+    Spool(tmp_path).append(entries)
+    storage = await make_sql_storage(
+        batch_size=10, rollups=True, spool_dir=str(tmp_path)
+    )
+    await storage.writer._replay_task
+    [row] = await storage.aggregate(group_by=["route"])
+    assert (row.group, row.count) == ({"route": "/items/{item_id}"}, 3)
+
+    # A crash before the segment was removed replays it again after restart
+    Spool(tmp_path).append(entries)
+    assert await storage.writer.replay() == 3
+    [row] = await storage.aggregate(group_by=["route"])
+    assert row.count == 3
+
+
+async def test_failed_rollup_update_is_reported_not_retried(make_sql_storage):
+    errors = []
+    storage = await make_sql_storage(
+        batch_size=10,
+        batch_flush_interval=60,
+        rollups=True,
+        retry=RetryPolicy(attempts=3, base_delay=0),
+        circuit_breaker=CircuitBreakerPolicy(failure_threshold=1),
+        on_storage_error=lambda exc, entry: errors.append((exc, entry)),
+    )
+    calls = []
+
+    async def save_rollups(rows):
+        calls.append(rows)
+        raise TimeoutError("commit acknowledgement lost")
+
+    storage.save_rollups = save_rollups
+    for minutes in range(2):
+        await storage.write(make_entry(minutes))
+    await storage.writer.flush()
+
+    assert len(calls) == 1
+    assert [type(exc) for exc, _ in errors] == [RollupError, RollupError]
+    assert storage.writer.breaker.state == "closed"
+    assert len(await storage.get_entries()) == 2
+
+
+async def test_route_grouping_needs_covering_rollups(storage):
+    with pytest.raises(ValueError, match="route"):
+        await storage.aggregate(AuditFilters(user_id="u1"), group_by=["route"])
+
+
+async def test_asyncpg_rollup_sql(pg_conn, make_asyncpg_storage):
+    storage = make_asyncpg_storage(rollups=True)
+    histogram = {h: 4 if h == "h3" else 0 for h in HISTOGRAM_COLUMNS}
+    pg_conn.rows = [{"b": T0, "requests": 4, "errors": 1, "sum": 40.0, **histogram}]
+
+    await storage.save_rollups(rollup_rows([make_entry(0)]))
+    [row] = await storage.aggregate(AuditFilters(since=T0), bucket="day")
+
+    (_, upsert, [record]), (_, select, args) = pg_conn.calls
+    assert upsert.startswith("INSERT INTO audit_logs_rollups (bucket, route, ")
+    assert upsert.endswith(
+        "ON CONFLICT (bucket, route, method, status_class) DO UPDATE SET "
+        "requests = audit_logs_rollups.requests + EXCLUDED.requests, "
+        "duration_sum = audit_logs_rollups.duration_sum + EXCLUDED.duration_sum, "
+        + ", ".join(
+            f"{h} = audit_logs_rollups.{h} + EXCLUDED.{h}" for h in HISTOGRAM_COLUMNS
+        )
+    )
+    assert record[:5] == (T0, "/items/{item_id}", "GET", 2, 1)
+    assert select.startswith(
+        "SELECT date_trunc('day', bucket AT TIME ZONE 'UTC'), sum(requests), "
+        "sum(requests) FILTER (WHERE status_class >= $2), sum(duration_sum), "
+    )
+    assert select.endswith(
+        "FROM audit_logs_rollups WHERE bucket >= $1 "
+        "GROUP BY date_trunc('day', bucket AT TIME ZONE 'UTC')"
+    )
+    assert args == (T0, 5)
+    assert (row.count, row.errors, row.avg_duration_ms) == (4, 1, 10.0)
+    assert row.p50_duration_ms == 7.5
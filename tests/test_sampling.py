@@ -0,0 +1,79 @@
+import pytest
+from fastapi import FastAPI, HTTPException
+from httpx import ASGITransport, AsyncClient
+
+from auditlog_fastapi import AuditMiddleware, SamplingPolicy
+from auditlog_fastapi.models import AuditEntry
+from auditlog_fastapi.sampling import SAMPLE_RATE_KEY
+
+
+def test_head_rate_precedence():
+    policy = SamplingPolicy(
+        default_rate=0.5,
+        method_rates={"GET": 0.1},
+        route_rates={"/users/{id}": 0.2, "/static/*": 0.0},
+    )
+    assert policy.head_rate("POST", "/users/1") == 1.0
+    assert policy.head_rate("GET", "/users/1") == 0.2
+    assert policy.head_rate("GET", "/static/app.js") == 0.0
+    assert policy.head_rate("GET", "/orders") == 0.1
+    assert policy.head_rate("HEAD", "/orders") == 0.5
+
+
+def test_tail_rules():
+    policy = SamplingPolicy(keep_slower_than_ms=500)
+    assert policy.keep(AuditEntry(method="GET", path="/", status_code=503))
+    assert policy.keep(AuditEntry(method="GET", path="/", error="boom"))
+    assert policy.keep(AuditEntry(method="GET", path="/", duration_ms=800))
+    assert not policy.keep(AuditEntry(method="GET", path="/", status_code=200))
+
+
+def make_app(storage, policy: SamplingPolicy) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(
+        AuditMiddleware, storage=storage, sampling=policy, log_request_body=True
+    )
+
+    @app.get("/items")
+    async def items(fail: bool = False):
+        if fail:
+            raise HTTPException(status_code=404)
+        return []
+
+    @app.post("/items")
+    async def create_item(data: dict):
+        return data
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_middleware_applies_sampling_policy(memory_storage):
+    app = make_app(memory_storage, SamplingPolicy(method_rates={"GET": 0.0}))
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        await client.get("/items")
+        await client.get("/items?fail=true")
+        await client.post("/items", json={"name": "x"})
+
+    kept = [(e.method, e.status_code) for e in memory_storage.saved]
+    assert kept == [("GET", 404), ("POST", 200)]
+    # Tail-kept entries were not body-captured and carry no sample weight
+    assert memory_storage.saved[0].request_body is None
+    assert SAMPLE_RATE_KEY not in memory_storage.saved[0].extra
+    assert memory_storage.saved[1].request_body == {"name": "x"}
+
+
+@pytest.mark.asyncio
+async def test_middleware_records_sample_rate(memory_storage, monkeypatch):
+    monkeypatch.setattr("auditlog_fastapi.sampling.random.random", lambda: 0.1)
+    app = make_app(memory_storage, SamplingPolicy(route_rates={"/items": 0.25}))
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        await client.get("/items")
+
+    assert memory_storage.saved[0].extra[SAMPLE_RATE_KEY] == 0.25
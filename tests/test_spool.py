@@ -0,0 +1,198 @@
+import threading
+
+import pytest
+
+import auditlog_fastapi.spool as spool_module
+from auditlog_fastapi.config import AuditConfig
+from auditlog_fastapi.exceptions import SpoolFullError
+from auditlog_fastapi.models import AuditEntry, AuditRecord
+from auditlog_fastapi.spool import Spool
+
+
+def make_entry(i: int = 0) -> AuditEntry:
+    return AuditEntry(method="POST", path=f"/items/{i}", request_body={"n": i})
+
+
+def drain(spool: Spool) -> list[AuditEntry]:
+    entries = []
+    for segment in spool.segments():
+        entries.extend(spool.read(segment))
+        spool.remove(segment)
+    return entries
+
+
+def test_round_trip(tmp_path):
+    spool = Spool(tmp_path)
+    entries = [make_entry(i) for i in range(3)]
+    spool.append(entries)
+    spool.append([AuditRecord.from_entry(make_entry(3))])
+
+    restored = drain(spool)
+    assert [e.model_dump() for e in restored[:3]] == [e.model_dump() for e in entries]
+    assert restored[3].request_body == {"n": 3}
+    assert not spool.pending
+    assert spool.size == 0
+
+
+def test_round_trip_keeps_the_route_template(tmp_path):
+    spool = Spool(tmp_path)
+    record = AuditRecord.from_entry(make_entry(1))
+    record.route = "/items/{item_id}"
+    spool.append([record, make_entry(2)])
+
+    replayed, plain = drain(spool)
+    assert isinstance(replayed, AuditRecord)
+    assert (replayed.path, replayed.route) == ("/items/1", "/items/{item_id}")
+    assert isinstance(plain, AuditEntry)
+
+
+def test_rotates_segments(tmp_path):
+    spool = Spool(tmp_path, segment_bytes=200)
+    for i in range(5):
+        spool.append([make_entry(i)])
+
+    segments = spool.segments()
+    assert len(segments) == 5
+    assert [e.path for e in drain(spool)] == [f"/items/{i}" for i in range(5)]
+
+
+def test_survives_restart_and_torn_write(tmp_path):
+    spool = Spool(tmp_path, fsync="always")
+    spool.append([make_entry(1), make_entry(2)])
+    spool.close()
+    [segment] = list(tmp_path.iterdir())
+    with segment.open("ab") as f:
+        f.write(b"\x00\x00\x01\x00garbage")
+
+    reopened = Spool(tmp_path)
+    assert reopened.pending
+    assert [e.path for e in drain(reopened)] == ["/items/1", "/items/2"]
+
+
+def test_disk_budget(tmp_path):
+    spool = Spool(tmp_path)
+    spool.append([make_entry(0)])
+    spool.max_bytes = spool.size * 2
+
+    spool.append([make_entry(1)])
+    with pytest.raises(SpoolFullError):
+        spool.append([make_entry(2)])
+    assert len(drain(spool)) == 2
+
+
+def test_skips_records_already_drained(tmp_path):
+    spool = Spool(tmp_path)
+    spool.append([make_entry(i) for i in range(4)])
+    [segment] = spool.segments()
+    spool.mark_drained(segment, 3)
+    assert [e.path for e in spool.read(segment)] == ["/items/3"]
+
+
+def test_interval_fsync_covers_the_tail_of_a_burst(tmp_path, monkeypatch):
+    synced = threading.Event()
+    monkeypatch.setattr(spool_module.os, "fsync", lambda _fd: synced.set())
+    spool = Spool(tmp_path, fsync="interval", fsync_interval=0.2)
+
+    spool.append([make_entry(1)])
+    assert not synced.is_set()
+    # No further append arrives; the timer syncs the record anyway
+    assert synced.wait(timeout=5)
+    spool.close()
+
+
+def test_close_syncs_the_active_segment(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(spool_module.os, "fsync", calls.append)
+    spool = Spool(tmp_path, fsync="interval", fsync_interval=60)
+    spool.append([make_entry(1)])
+    assert calls == []
+
+    spool.close()
+    assert len(calls) == 1
+
+
+def with_spool(storage, tmp_path, **kwargs):
+    storage.config = AuditConfig(
+        orm="sqlalchemy",
+        dsn="sqlite+aiosqlite:///:memory:",
+        spool_dir=str(tmp_path),
+        **kwargs,
+    )
+    return storage
+
+
+async def test_writer_spools_failed_batches_and_replays(memory_storage, tmp_path):
+    errors = []
+    storage = with_spool(
+        memory_storage,
+        tmp_path,
+        batch_size=10,
+        batch_flush_interval=60,
+        on_storage_error=lambda exc, _entry: errors.append(exc),
+    )
+    save_batch = storage.save_batch
+
+    async def failing(entries):
+        raise ConnectionError("database is down")
+
+    storage.save_batch = failing
+    await storage.startup()
+    for i in range(3):
+        await storage.write(make_entry(i))
+    await storage.writer.flush()
+
+    assert errors == []
+    assert storage.writer.spool.pending
+
+    storage.save_batch = save_batch
+    assert await storage.writer.replay() == 3
+    assert sorted(e.path for e in storage.saved) == [f"/items/{i}" for i in range(3)]
+    assert not storage.writer.spool.pending
+    await storage.shutdown()
+
+
+async def test_writer_spools_when_queue_is_full(memory_storage, tmp_path):
+    storage = with_spool(
+        memory_storage,
+        tmp_path,
+        batch_size=3,
+        batch_max_queue_size=3,
+        batch_flush_interval=60,
+    )
+    await storage.startup()
+    # The flush loop does not get to run between these writes
+    for i in range(4):
+        await storage.write(make_entry(i))
+
+    assert storage.writer.spool.pending
+    [spooled] = storage.writer.spool.read(storage.writer.spool.segments()[0])
+    assert spooled.path == "/items/3"
+    await storage.shutdown()
+
+
+async def test_startup_replays_spool(memory_storage, tmp_path):
+    Spool(tmp_path).append([make_entry(7)])
+
+    storage = with_spool(memory_storage, tmp_path)
+    await storage.startup()
+    await storage.writer._replay_task
+
+    assert [e.path for e in storage.saved] == ["/items/7"]
+    await storage.shutdown()
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_direct_save_falls_back_to_spool(memory_storage, tmp_path):
+    storage = with_spool(memory_storage, tmp_path)
+
+    async def failing(entry):
+        raise ConnectionError("database is down")
+
+    storage.save = failing
+    await storage.startup()
+    await storage.write(make_entry(1))
+
+    assert storage.writer.spool.pending
+    assert await storage.writer.replay() == 1
+    assert [e.path for e in storage.saved] == ["/items/1"]
+    await storage.shutdown()
@@ -0,0 +1,125 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from auditlog_fastapi import add_audit_log_routes
+from auditlog_fastapi.models import AuditEntry
+from auditlog_fastapi.query import AuditFilters
+from auditlog_fastapi.stats import (
+    check_aggregate,
+    normalize_bucket,
+    percentile_cont,
+    truncate,
+)
+from auditlog_fastapi.storage.base import AuditStorage
+
+T0 = datetime(2024, 5, 1, 12, 0, tzinfo=UTC)
+
+
+def test_helpers():
+    ts = datetime(2024, 5, 1, 12, 34, 56, 789, tzinfo=UTC)
+    assert truncate(ts, "minute") == datetime(2024, 5, 1, 12, 34, tzinfo=UTC)
+    assert truncate(ts, "day") == datetime(2024, 5, 1, tzinfo=UTC)
+    assert normalize_bucket("2024-05-01 12:00:00") == T0
+    assert percentile_cont([1.0, 2.0, 3.0, 4.0], 0.5) == 2.5
+    assert percentile_cont([], 0.5) is None
+    assert check_aggregate(["path", "path", "method"], "hour") == ("path", "method")
+    with pytest.raises(ValueError, match="group"):
+        check_aggregate(["path; DROP TABLE x"], None)
+    with pytest.raises(ValueError, match="bucket"):
+        check_aggregate([], "week")
+
+
+@pytest.fixture
+async def storage(make_sql_storage):
+    storage = await make_sql_storage()
+    # Two hours of traffic on two paths; every third request fails
+    await storage.save_batch(
+        [
+            AuditEntry(
+                timestamp=T0 + timedelta(minutes=15 * i),
+                method="GET",
+                path=f"/p{i % 2}",
+                status_code=503 if i % 3 == 0 else 200,
+                duration_ms=float(10 * (i + 1)),
+            )
+            for i in range(8)
+        ]
+    )
+    return storage
+
+
+async def test_aggregate_in_database(storage):
+    rows = await storage.aggregate(group_by=["path"], bucket="hour")
+
+    assert [(r.bucket, r.group["path"], r.count) for r in rows] == [
+        (T0, "/p0", 2),
+        (T0, "/p1", 2),
+        (T0 + timedelta(hours=1), "/p0", 2),
+        (T0 + timedelta(hours=1), "/p1", 2),
+    ]
+    first = rows[0]  # durations 10 and 30; the first one failed
+    assert (first.errors, first.error_rate, first.avg_duration_ms) == (1, 0.5, 20.0)
+    # Nearest-rank percentiles outside PostgreSQL
+    assert (first.p50_duration_ms, first.p99_duration_ms) == (10.0, 30.0)
+
+
+async def test_aggregate_matches_python_fallback(storage):
+    filters = AuditFilters(since=T0 + timedelta(minutes=30))
+    in_db = await storage.aggregate(filters, group_by=["status_code"])
+    in_python = await AuditStorage._aggregate(
+        storage, filters, ("status_code",), None, 500
+    )
+
+    def summary(rows):
+        return [(r.group, r.count, r.errors, r.avg_duration_ms) for r in rows]
+
+    assert summary(in_db) == summary(in_python)
+    assert [r.group["status_code"] for r in in_db] == [200, 503]
+
+
+async def test_aggregate_everything(storage):
+    [row] = await storage.aggregate()
+    assert (row.bucket, row.group, row.count, row.errors) == (None, {}, 8, 3)
+
+
+async def test_stats_route(app, client):
+    add_audit_log_routes(app)
+    for _ in range(2):
+        await client.get("/hello")
+
+    response = await client.get(
+        "/audit-logs/stats",
+        params={"group_by": ["path", "method"], "bucket": "day", "path": "/hello"},
+    )
+    [row] = response.json()
+    assert row["group"] == {"path": "/hello", "method": "GET"}
+    assert row["count"] == 2
+    assert row["error_rate"] == 0.0
+
+    bad = await client.get("/audit-logs/stats", params={"group_by": "user_agent"})
+    assert bad.status_code == 422
+
+
+async def test_asyncpg_aggregate_sql(pg_conn, make_asyncpg_storage):
+    storage = make_asyncpg_storage()
+    bucket = datetime(2024, 5, 1, 12)  # noqa: DTZ001 - timestamp without time zone
+    pg_conn.rows = [{"b": bucket, "path": "/a", "c": 4, "e": 1, "avg": 2.5,
+                     "p": [2.0, 4.0, 4.0]}]  # fmt: skip
+
+    [row] = await storage.aggregate(
+        AuditFilters(user_id="u1"), ["path"], "hour", error_status=400
+    )
+
+    [(_, sql, args)] = pg_conn.calls
+    assert sql == (
+        "SELECT date_trunc('hour', timestamp AT TIME ZONE 'UTC'), path, count(*), "
+        "count(*) FILTER (WHERE status_code >= $2), avg(duration_ms), "
+        "percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY duration_ms) "
+        "FROM audit_logs WHERE user_id = $1 "
+        "GROUP BY date_trunc('hour', timestamp AT TIME ZONE 'UTC'), path"
+    )
+    assert args == ("u1", 400)
+    assert row.bucket == T0
+    assert row.group == {"path": "/a"}
+    assert (row.count, row.error_rate, row.p95_duration_ms) == (4, 0.25, 4.0)
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from auditlog_fastapi.config import AuditConfig
+from auditlog_fastapi.exceptions import StorageError
+from auditlog_fastapi.models import AuditEntry
+from auditlog_fastapi.storage.sqlalchemy_storage import SQLAlchemyStorage
+
+
+def make_config(**kwargs) -> AuditConfig:
+    return AuditConfig(orm="sqlalchemy", dsn="sqlite+aiosqlite:///:memory:", **kwargs)
+
+
+def with_config(storage, config: AuditConfig):
+    storage.config = config
+    return storage
+
+
+def make_entry(i: int = 0) -> AuditEntry:
+    return AuditEntry(method="GET", path=f"/items/{i}")
+
+
+async def test_writer_saves_directly_when_batching_disabled(memory_storage):
+    storage = with_config(memory_storage, make_config())
+    await storage.startup()
+    await storage.write(make_entry())
+
+    assert len(storage.saved) == 1
+    assert storage.batches == []
+    await storage.shutdown()
+
+
+async def test_writer_flushes_when_batch_size_reached(memory_storage):
+    storage = with_config(
+        memory_storage, make_config(batch_size=3, batch_flush_interval=60)
+    )
+    await storage.startup()
+
+    for i in range(3):
+        await storage.write(make_entry(i))
+    await asyncio.sleep(0.01)
+
+    assert [len(b) for b in storage.batches] == [3]
+    await storage.shutdown()
+
+
+async def test_writer_flushes_on_interval(memory_storage):
+    storage = with_config(
+        memory_storage, make_config(batch_size=100, batch_flush_interval=0.05)
+    )
+    await storage.startup()
+
+    await storage.write(make_entry())
+    assert storage.saved == []
+    await asyncio.sleep(0.1)
+
+    assert len(storage.saved) == 1
+    await storage.shutdown()
+
+
+async def test_writer_flushes_pending_entries_on_shutdown(memory_storage):
+    storage = with_config(
+        memory_storage, make_config(batch_size=100, batch_flush_interval=60)
+    )
+    await storage.startup()
+
+    for i in range(5):
+        await storage.write(make_entry(i))
+    await storage.shutdown()
+
+    assert [len(b) for b in storage.batches] == [5]
+    assert storage.writer.pending == 0
+
+
+async def test_writer_rejects_entries_when_queue_is_full(memory_storage):
+    storage = with_config(
+        memory_storage,
+        make_config(batch_size=2, batch_flush_interval=60, batch_max_queue_size=2),
+    )
+    storage.writer._wakeup.set = lambda: None  # keep the flush loop asleep
+    await storage.startup()
+
+    await storage.write(make_entry(0))
+    await storage.write(make_entry(1))
+    with pytest.raises(StorageError, match="queue is full"):
+        await storage.write(make_entry(2))
+    await storage.shutdown()
+
+
+async def test_writer_reports_failed_batches(memory_storage):
+    errors = []
+    config = make_config(
+        batch_size=2,
+        batch_flush_interval=60,
+        on_storage_error=lambda exc, entry: errors.append((exc, entry)),
+    )
+    storage = with_config(memory_storage, config)
+
+    async def failing_save_batch(entries):
+        raise RuntimeError("db down")
+
+    storage.save_batch = failing_save_batch
+    await storage.startup()
+    await storage.write(make_entry(0))
+    await storage.write(make_entry(1))
+    await storage.shutdown()
+
+    assert len(errors) == 2
+    assert all(str(exc) == "db down" for exc, _ in errors)
+
+
+async def test_sqlalchemy_storage_batches_writes():
+    storage = SQLAlchemyStorage(make_config(batch_size=10, batch_flush_interval=60))
+    await storage.startup()
+
+    for i in range(4):
+        await storage.write(make_entry(i))
+    assert await storage.get_entries() == []
+
+    await storage.writer.flush()
+    entries = await storage.get_entries()
+    assert len(entries) == 4
+    await storage.shutdown()